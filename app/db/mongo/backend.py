@@ -0,0 +1,63 @@
+"""
+The database interface `MongoHelper` is written against: the subset of
+Motor's API the helpers call. Two backends implement it, picked by
+DB.BACKEND in `connect_to_mongodb`:
+
+- "motor": a real MongoDB server through Motor (AsyncIOMotorDatabase)
+- "memory": InMemoryDatabase (app/db/mongo/memory.py), in-process lists
+
+Anything else that quacks the same way can be installed with
+`use_database()`, e.g. by the load-test harness.
+"""
+from typing import Any, AsyncIterator, Dict, List, Optional, Protocol, Sequence
+
+
+class Cursor(Protocol):
+    def skip(self, n: int) -> "Cursor": ...
+
+    def limit(self, n: int) -> "Cursor": ...
+
+    def sort(self, keys: Sequence[tuple]) -> "Cursor": ...
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]: ...
+
+    def __aiter__(self) -> AsyncIterator[Dict[str, Any]]: ...
+
+
+class Collection(Protocol):
+    async def find_one(self, query: Dict[str, Any], projection: Optional[Dict[str, int]] = None,
+                       session: Any = None) -> Optional[Dict[str, Any]]: ...
+
+    def find(self, query: Dict[str, Any], projection: Optional[Dict[str, int]] = None,
+             session: Any = None, batch_size: Optional[int] = None) -> Cursor: ...
+
+    async def insert_one(self, document: Dict[str, Any], session: Any = None) -> Any: ...
+
+    async def insert_many(self, documents: List[Dict[str, Any]], session: Any = None) -> Any: ...
+
+    async def update_one(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False,
+                         session: Any = None) -> Any: ...
+
+    async def find_one_and_update(self, query: Dict[str, Any], update: Dict[str, Any],
+                                  projection: Optional[Dict[str, int]] = None, return_document: Any = None,
+                                  session: Any = None) -> Optional[Dict[str, Any]]: ...
+
+    async def delete_one(self, query: Dict[str, Any]) -> Any: ...
+
+    def aggregate(self, pipeline: List[Dict[str, Any]]) -> Cursor: ...
+
+    async def bulk_write(self, operations: List[Any], ordered: bool = False, session: Any = None) -> Any: ...
+
+    async def count_documents(self, query: Dict[str, Any]) -> int: ...
+
+    async def create_index(self, keys: Any, **kwargs) -> str: ...
+
+
+class Database(Protocol):
+    client: Any  # start_session(), whose session has with_transaction(), and close()
+
+    def __getitem__(self, name: str) -> Collection: ...
+
+    async def command(self, name: str, *args, **kwargs) -> Dict[str, Any]: ...
+
+    async def list_collection_names(self) -> List[str]: ...
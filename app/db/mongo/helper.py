@@ -1,30 +1,81 @@
 # --- app/db/mongo/helper.py ---
 import time
-from typing import Optional, List, Dict, Any
-from app.db.mongo.mongodb import get_database
+from functools import wraps
+from typing import Optional, List, Dict, Any, AsyncIterator, Awaitable, Callable, TypeVar
+from pymongo import ReturnDocument
+from app.db.mongo.mongodb import get_database, transactions_enabled
+from app.utils.config import settings
+from app.utils.tracing import KIND_CLIENT, tracer
+
+T = TypeVar("T")
+
+
+def _traced(operation: str):
+    """Record a client span around a helper call when an update is being traced."""
+    name = f"mongo {operation}"
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            if tracer.current() is None:
+                return await func(*args, **kwargs)
+            attributes = {
+                "db.system": "mongodb",
+                "db.operation": operation,
+                "db.collection.name": args[0] if args else kwargs.get("collection"),
+            }
+            with tracer.span(name, KIND_CLIENT, **attributes):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
 
 class MongoHelper:
 
     @staticmethod
+    async def transaction(work: Callable[[Any], Awaitable[T]]) -> T:
+        """
+        Run `await work(session)` in one multi-document transaction and
+        return its result; `work` passes the session to the helpers below.
+
+        A transaction failing with a TransientTransactionError, such as a
+        write conflict with a concurrent trade on the same wallet, is aborted
+        and `work` runs again; an unknown commit result is retried as well
+        (pymongo's with_transaction). `work` must therefore keep its state in
+        locals. When transactions are off (standalone server, see
+        DB.USE_TRANSACTIONS) it runs once with session None and the
+        operations simply run one after another.
+        """
+        if not transactions_enabled():
+            return await work(None)
+        db = get_database()
+        async with await db.client.start_session() as session:
+            return await session.with_transaction(work)
+
+    @staticmethod
+    @_traced("find_one")
     async def find_one(
         collection: str,
         query: Dict[str, Any],
-        projection: Optional[Dict[str, int]] = None
+        projection: Optional[Dict[str, int]] = None,
+        session=None
     ) -> Optional[Dict[str, Any]]:
         db = get_database()
-        return await db[collection].find_one(query, projection)
+        return await db[collection].find_one(query, projection, session=session)
 
     @staticmethod
+    @_traced("find_many")
     async def find_many(
         collection: str, 
         query: Dict[str, Any], 
         skip: int = 0, 
         limit: int = 100,
         sort: List[tuple] = None,
-        projection: Optional[Dict[str, int]] = None
+        projection: Optional[Dict[str, int]] = None,
+        session=None
     ) -> List[Dict[str, Any]]:
         db = get_database()
-        cursor = db[collection].find(query, projection).skip(skip).limit(limit)
+        cursor = db[collection].find(query, projection, session=session).skip(skip).limit(limit)
         
         if sort:
             cursor = cursor.sort(sort)
@@ -32,30 +83,90 @@ class MongoHelper:
         return await cursor.to_list(length=limit)
 
     @staticmethod
+    async def iterate(
+        collection: str,
+        query: Dict[str, Any],
+        sort: List[tuple] = None,
+        projection: Optional[Dict[str, int]] = None,
+        batch_size: int = 500
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield matching documents one at a time. The cursor fetches them from
+        the server `batch_size` at a time, so memory does not grow with the
+        size of the result.
+        """
+        # Not made current: the generator is resumed from the caller's context
+        span = tracer.start_span("mongo iterate", KIND_CLIENT, **{
+            "db.system": "mongodb", "db.operation": "iterate", "db.collection.name": collection,
+        })
+        try:
+            db = get_database()
+            cursor = db[collection].find(query, projection, batch_size=batch_size)
+            if sort:
+                cursor = cursor.sort(sort)
+            async for document in cursor:
+                yield document
+        finally:
+            tracer.end(span)
+
+    @staticmethod
+    @_traced("insert_one")
     async def insert_one(
         collection: str, 
-        document: Dict[str, Any]
+        document: Dict[str, Any],
+        session=None
     ) -> str:
         db = get_database()
-        result = await db[collection].insert_one(document)
+        result = await db[collection].insert_one(document, session=session)
         return str(result.inserted_id)
 
     @staticmethod
+    @_traced("insert_many")
+    async def insert_many(
+        collection: str,
+        documents: List[Dict[str, Any]],
+        session=None
+    ) -> int:
+        if not documents:
+            return 0
+        db = get_database()
+        result = await db[collection].insert_many(documents, session=session)
+        return len(result.inserted_ids)
+
+    @staticmethod
+    @_traced("update_one")
     async def update_one(
         collection: str, 
         query: Dict[str, Any], 
         update: Dict[str, Any],
-        upsert: bool = False
+        upsert: bool = False,
+        session=None
     ) -> int:
         db = get_database()
-        result = await db[collection].update_one(query, update, upsert=upsert)
+        result = await db[collection].update_one(query, update, upsert=upsert, session=session)
 
         if result.modified_count > 0:
-            await db[collection].update_one(query, {"$set": {"updated_at": int(time.time())}})
+            await db[collection].update_one(query, {"$set": {"updated_at": int(time.time())}}, session=session)
             
         return result.modified_count
 
     @staticmethod
+    @_traced("find_one_and_update")
+    async def find_one_and_update(
+        collection: str,
+        query: Dict[str, Any],
+        update: Dict[str, Any],
+        projection: Optional[Dict[str, int]] = None,
+        session=None
+    ) -> Optional[Dict[str, Any]]:
+        """Apply `update` to the first match and return the document as it is afterwards."""
+        db = get_database()
+        return await db[collection].find_one_and_update(
+            query, update, projection=projection, return_document=ReturnDocument.AFTER, session=session
+        )
+
+    @staticmethod
+    @_traced("delete_one")
     async def delete_one(
         collection: str, 
         query: Dict[str, Any]
@@ -65,6 +176,7 @@ class MongoHelper:
         return result.deleted_count
 
     @staticmethod
+    @_traced("aggregate")
     async def aggregate(
         collection: str, 
         pipeline: List[Dict[str, Any]]
@@ -73,6 +185,27 @@ class MongoHelper:
         return await db[collection].aggregate(pipeline).to_list(length=None)
 
     @staticmethod
+    @_traced("bulk_write")
+    async def bulk_write(
+        collection: str,
+        operations: List[Any],
+        ordered: bool = False,
+        session=None
+    ) -> int:
+        """
+        Run many write operations (pymongo UpdateOne etc.) in one round trip.
+
+        Unlike update_one, it does not stamp `updated_at` on what it modifies
+        or upserts: operations that need it set it themselves.
+        """
+        if not operations:
+            return 0
+        db = get_database()
+        result = await db[collection].bulk_write(operations, ordered=ordered, session=session)
+        return result.modified_count
+
+    @staticmethod
+    @_traced("count_documents")
     async def count_documents(collection: str, query: dict) -> int:
         db = get_database()
         return await db[collection].count_documents(query)
\ No newline at end of file
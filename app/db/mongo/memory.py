@@ -0,0 +1,329 @@
+"""
+In-process Mongo backend (DB.BACKEND=memory).
+
+An async, Motor-compatible database kept in plain Python lists, covering
+the query, update, projection, sort and aggregation subset `MongoHelper`
+and the services use. Operators outside that subset raise
+NotImplementedError instead of being silently ignored, so a new query
+fails loudly here before it is trusted in a benchmark.
+
+Nothing is persisted, indices are not enforced and sessions are no-ops:
+`transaction()` runs its operations one after another without isolation or
+rollback. Meant for load tests, micro-benchmarks and running the bot
+without a MongoDB server.
+
+Every operation is counted in `ops`; subclasses can override `record` to
+attribute operations differently.
+"""
+import copy
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+from pymongo import UpdateOne
+
+def _get(doc: Dict[str, Any], path: str) -> Any:
+    value: Any = doc
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _values(doc: Any, path: str) -> List[Any]:
+    """All values at `path`, descending into arrays like Mongo does."""
+    head, _, rest = path.partition(".")
+    if isinstance(doc, list):
+        return [v for item in doc for v in _values(item, path)]
+    if not isinstance(doc, dict):
+        return [None]
+    value = doc.get(head)
+    if not rest:
+        return list(value) + [value] if isinstance(value, list) else [value]
+    return _values(value, rest)
+
+
+def _matches(doc: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    for field, cond in query.items():
+        if field == "$or":
+            if not any(_matches(doc, sub) for sub in cond):
+                return False
+            continue
+        values = _values(doc, field)
+        if field.startswith("$"):
+            raise NotImplementedError(f"Query operator {field} is not supported by the in-memory backend")
+        if isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+            for op, arg in cond.items():
+                if not _compare(op, arg, values):
+                    return False
+        elif cond not in values:
+            return False
+    return True
+
+
+def _compare(op: str, arg: Any, values: List[Any]) -> bool:
+    present = [v for v in values if v is not None]
+    if op == "$gte":
+        return any(v >= arg for v in present)
+    if op == "$gt":
+        return any(v > arg for v in present)
+    if op == "$lte":
+        return any(v <= arg for v in present)
+    if op == "$lt":
+        return any(v < arg for v in present)
+    if op == "$in":
+        return any(v in arg for v in values)
+    if op == "$all":
+        return all(a in values for a in arg)
+    if op == "$nin":
+        return not any(v in arg for v in values)
+    if op == "$ne":
+        return arg not in values
+    if op == "$exists":
+        return bool(present) == bool(arg)
+    raise NotImplementedError(f"Query operator {op} is not supported by the in-memory backend")
+
+
+_UPDATE_OPERATORS = frozenset({"$set", "$inc", "$push", "$pull"})
+
+
+def _apply_update(doc: Dict[str, Any], update: Dict[str, Any]) -> None:
+    unsupported = update.keys() - _UPDATE_OPERATORS
+    if unsupported:
+        raise NotImplementedError(f"Update operators {sorted(unsupported)} are not supported by the in-memory backend")
+    for field, value in update.get("$set", {}).items():
+        doc[field] = copy.deepcopy(value)
+    for field, value in update.get("$inc", {}).items():
+        doc[field] = doc.get(field, 0) + value
+    for field, value in update.get("$push", {}).items():
+        doc.setdefault(field, []).append(copy.deepcopy(value))
+    for field, cond in update.get("$pull", {}).items():
+        doc[field] = [item for item in doc.get(field, []) if not _matches(item, cond)]
+
+
+def _project(doc: Dict[str, Any], projection: Optional[Dict[str, int]]) -> Dict[str, Any]:
+    if not projection:
+        return copy.deepcopy(doc)
+    if not any(projection.values()):
+        return {k: copy.deepcopy(v) for k, v in doc.items() if k not in projection}
+    out = {k: copy.deepcopy(doc[k]) for k, v in projection.items() if v and k in doc}
+    if projection.get("_id", 1) and "_id" in doc:
+        out["_id"] = doc["_id"]
+    return out
+
+
+def _group(docs: List[Dict[str, Any]], spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    key_spec = spec["_id"]
+    groups: Dict[Any, Dict[str, Any]] = {}
+    for doc in docs:
+        key = _get(doc, key_spec[1:]) if isinstance(key_spec, str) else key_spec
+        out = groups.setdefault(key, {"_id": key})
+        for field, acc in spec.items():
+            if field == "_id":
+                continue
+            if set(acc) != {"$sum"}:
+                raise NotImplementedError(f"Accumulator {acc} is not supported by the in-memory backend")
+            arg = acc["$sum"]
+            value = _get(doc, arg[1:]) if isinstance(arg, str) else arg
+            out[field] = out.get(field, 0) + (value or 0)
+    return list(groups.values())
+
+
+class _Result:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class _Cursor:
+    def __init__(self, docs: List[Dict[str, Any]]):
+        self._docs = docs
+        self._skip = 0
+        self._limit = 0
+
+    def skip(self, n: int) -> "_Cursor":
+        self._skip = n
+        return self
+
+    def limit(self, n: int) -> "_Cursor":
+        self._limit = n
+        return self
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in await self.to_list():
+            yield doc
+
+    def sort(self, keys) -> "_Cursor":
+        for field, direction in reversed(list(keys)):
+            self._docs.sort(key=lambda d: (_get(d, field) is None, _get(d, field)), reverse=direction < 0)
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        docs = self._docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        return docs[:length] if length else docs
+
+
+class InMemoryCollection:
+    def __init__(self, db: "InMemoryDatabase", name: str):
+        self._db = db
+        self.name = name
+        self.docs: List[Dict[str, Any]] = []
+
+    def _count(self, op: str) -> None:
+        self._db.record(op)
+
+    async def find_one(self, query, projection=None, session=None):
+        self._count("find_one")
+        for doc in self.docs:
+            if _matches(doc, query):
+                return _project(doc, projection)
+        return None
+
+    def find(self, query, projection=None, session=None, batch_size=None) -> _Cursor:
+        self._count("find")
+        return _Cursor([_project(d, projection) for d in self.docs if _matches(d, query)])
+
+    async def insert_one(self, document, session=None):
+        self._count("insert_one")
+        document.setdefault("_id", uuid.uuid4().hex)
+        self.docs.append(copy.deepcopy(document))
+        return _Result(inserted_id=document["_id"])
+
+    async def insert_many(self, documents, session=None):
+        self._count("insert_many")
+        for document in documents:
+            document.setdefault("_id", uuid.uuid4().hex)
+            self.docs.append(copy.deepcopy(document))
+        return _Result(inserted_ids=[d["_id"] for d in documents])
+
+    async def update_one(self, query, update, upsert=False, session=None):
+        self._count("update_one")
+        for doc in self.docs:
+            if _matches(doc, query):
+                _apply_update(doc, update)
+                return _Result(modified_count=1, matched_count=1, upserted_id=None)
+        if upsert:
+            return _Result(modified_count=0, matched_count=0, upserted_id=self._upsert(query, update))
+        return _Result(modified_count=0, matched_count=0, upserted_id=None)
+
+    def _upsert(self, query, update):
+        doc = {k: v for k, v in query.items() if not isinstance(v, dict)}
+        _apply_update(doc, update)
+        doc["_id"] = uuid.uuid4().hex
+        self.docs.append(doc)
+        return doc["_id"]
+
+    async def find_one_and_update(self, query, update, projection=None, return_document=None, session=None):
+        self._count("find_one_and_update")
+        for doc in self.docs:
+            if _matches(doc, query):
+                before = _project(doc, projection)
+                _apply_update(doc, update)
+                return _project(doc, projection) if return_document else before
+        return None
+
+    async def bulk_write(self, operations, ordered=False, session=None):
+        """
+        UpdateOne operations only; any other kind raises NotImplementedError.
+        Like MongoHelper.bulk_write, nothing is added to the updates: an
+        upserted or modified document only gets the `updated_at` they set.
+        """
+        self._count("bulk_write")
+        for op in operations:
+            if not isinstance(op, UpdateOne):
+                raise NotImplementedError(f"bulk_write operation {type(op).__name__}")
+        modified = 0
+        for op in operations:
+            for doc in self.docs:
+                if _matches(doc, op._filter):
+                    _apply_update(doc, op._doc)
+                    modified += 1
+                    break
+            else:
+                if op._upsert:
+                    self._upsert(op._filter, op._doc)
+        return _Result(modified_count=modified)
+
+    async def delete_one(self, query):
+        self._count("delete_one")
+        for i, doc in enumerate(self.docs):
+            if _matches(doc, query):
+                del self.docs[i]
+                return _Result(deleted_count=1)
+        return _Result(deleted_count=0)
+
+    async def count_documents(self, query):
+        self._count("count_documents")
+        return sum(1 for d in self.docs if _matches(d, query))
+
+    def aggregate(self, pipeline):
+        self._count("aggregate")
+        cursor = _Cursor([copy.deepcopy(d) for d in self.docs])
+        for stage in pipeline:
+            if "$match" in stage:
+                cursor._docs = [d for d in cursor._docs if _matches(d, stage["$match"])]
+            elif "$sort" in stage:
+                cursor.sort(list(stage["$sort"].items()))
+            elif "$limit" in stage:
+                cursor._docs = cursor._docs[:stage["$limit"]]
+            elif "$project" in stage:
+                cursor._docs = [_project(d, stage["$project"]) for d in cursor._docs]
+            elif "$group" in stage:
+                cursor._docs = _group(cursor._docs, stage["$group"])
+            else:
+                raise NotImplementedError(f"Pipeline stage {list(stage)} is not supported by the in-memory backend")
+        return cursor
+
+    async def create_index(self, *args, **kwargs):
+        return "index"
+
+
+class _Session:
+    """No-op stand-in for a client session: nothing is isolated or rolled back."""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def start_transaction(self):
+        return self
+
+    async def with_transaction(self, callback):
+        return await callback(self)
+
+
+class _Client:
+    async def start_session(self) -> _Session:
+        return _Session()
+
+    def close(self) -> None:
+        pass
+
+
+class InMemoryDatabase:
+    client = _Client()
+
+    def __init__(self):
+        self._collections: Dict[str, InMemoryCollection] = {}
+        self.ops: Counter = Counter()
+
+    def record(self, op: str) -> None:
+        """Called once per collection operation."""
+        self.ops[op] += 1
+
+    def __getitem__(self, name: str) -> InMemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = InMemoryCollection(self, name)
+        return self._collections[name]
+
+    async def command(self, name: str, *args, **kwargs):
+        return {"ok": 1}
+
+    async def list_collection_names(self) -> List[str]:
+        return list(self._collections)
@@ -1,8 +1,10 @@
 import logging
 from typing import Optional
 import motor.motor_asyncio
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+from app.db.mongo.backend import Database
+from app.db.mongo.memory import InMemoryDatabase
 from app.utils.config import settings
 
 # Get logger
@@ -10,18 +12,36 @@ logger = logging.getLogger(__name__)
 
 # Global database client and connection
 _db_client: Optional[AsyncIOMotorClient] = None
-_db: Optional[AsyncIOMotorDatabase] = None
+_db: Optional[Database] = None
+_use_transactions = False
+
+def use_database(db: Database) -> None:
+    """Install an already built database, e.g. an InMemoryDatabase in a benchmark."""
+    global _db_client, _db, _use_transactions
+    _db = db
+    _db_client = db.client
+    # Sessions of the in-memory backend are no-ops; keep them on so benchmarks run the same code path
+    _use_transactions = settings.DB.USE_TRANSACTIONS is not False
+
+def transactions_enabled() -> bool:
+    """Whether MongoHelper.transaction() opens a real transaction (see DB.USE_TRANSACTIONS)."""
+    return _use_transactions
 
 async def connect_to_mongodb() -> None:
     """
     Connect to MongoDB using static values.
     This should be called once at application startup.
     """
-    global _db_client, _db
+    global _db_client, _db, _use_transactions
 
     if _db_client is not None:
         logger.warning("MongoDB connection already established")
         return
+
+    if settings.DB.BACKEND == "memory":
+        use_database(InMemoryDatabase())
+        logger.warning("Using the in-memory database backend: nothing is persisted")
+        return
     
     # Get MongoDB settings from config
     mongo_settings = {
@@ -45,11 +65,14 @@ async def connect_to_mongodb() -> None:
         # Get database instance
         _db = _db_client[settings.DB.DB_NAME]
 
-        logger.info(f"Connected to MongoDB. Database: {settings.DB.DB_NAME}")
+        # Transactions only exist on replica set members and mongos routers
+        _use_transactions = settings.DB.USE_TRANSACTIONS
+        if _use_transactions is None:
+            hello = await _db_client.admin.command('hello')
+            _use_transactions = "setName" in hello or hello.get("msg") == "isdbgrid"
 
-        # Log available collections
-        collection_names = await _db.list_collection_names()
-        logger.debug(f"Available collections: {', '.join(collection_names)}")
+        logger.info("Connected to MongoDB. Database: %s, transactions %s",
+                    settings.DB.DB_NAME, "on" if _use_transactions else "off")
 
     except (ConnectionFailure, ServerSelectionTimeoutError) as e:
         logger.critical(f"Failed to connect to MongoDB: {str(e)}")
@@ -71,13 +94,13 @@ async def close_mongodb_connection() -> None:
     _db_client = None
     logger.info("MongoDB connection closed")
 
-def get_database() -> AsyncIOMotorDatabase:
+def get_database() -> Database:
     """
     Get the database instance.
     This function can be used as a dependency in FastAPI.
 
     Returns:
-        AsyncIOMotorDatabase: MongoDB database instance
+        Database: the Motor database, or the in-memory one (DB.BACKEND)
 
     Raises:
         RuntimeError: If database connection hasn't been established
@@ -89,17 +112,40 @@ def get_database() -> AsyncIOMotorDatabase:
         )
     return _db
 
-async def initialize_collections() -> None:
+async def ensure_unique_indexes() -> None:
     """
-    Initialize collections and create indices.
-    This runs once during application startup.
+    Create the unique indices that upserts and ledger appends rely on to
+    never write a duplicate. Awaited at startup before any update is served;
+    on every boot but the first they already exist and this returns at once.
     """
     db = get_database()
 
     try:
         await db[settings.DB_TABLE.USERS].create_index("telegram_id", unique=True)
+        await db[settings.DB_TABLE.WALLET_LEDGER].create_index([("wallet_id", 1), ("seq", 1)], unique=True)
+        await db[settings.DB_TABLE.DAILY_ROLLUPS].create_index([("user_id", 1), ("day", 1)], unique=True)
+        await db[settings.DB_TABLE.POSITION_BOOKS].create_index("user_id", unique=True)
+        logger.info("MongoDB unique indices ensured")
+    except Exception as e:
+        logger.error("Error creating MongoDB unique indices: %s", e)
+        raise
+
+async def initialize_collections() -> None:
+    """
+    Initialize collections and create the remaining, non-unique indices.
+    This runs once during application startup, in the background: they only
+    speed up reads, so updates are served without waiting for them.
+    """
+    db = get_database()
+
+    try:
+        collection_names = await db.list_collection_names()
+        logger.debug(f"Available collections: {', '.join(collection_names)}")
+        await db[settings.DB_TABLE.WALLET_SNAPSHOTS].create_index([("wallet_id", 1), ("seq", -1)])
+        # Bulk closes read back the transactions they closed by batch id
+        await db[settings.DB_TABLE.TRANSACTIONS].create_index("close_batch", sparse=True)
         # await db[settings.DB_TABLE.ORDER_TRANSACTIONS].create_index("phone_number", unique=True)
         logger.info("MongoDB collections and indices initialized")
     except Exception as e:
         logger.error(f"Error initializing MongoDB collections: {str(e)}")
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+
+
+class DailyRollup(BaseModel):
+    user_id: str
+    day: str  # YYYY-MM-DD in IST
+    trades: int = 0  # opens and closes executed that day
+    buy_grams: float = 0.0
+    sell_grams: float = 0.0
+    notional: float = 0.0  # sum of grams * price over those trades
+    realized_pnl: float = 0.0
+    updated_at: int
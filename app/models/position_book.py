@@ -0,0 +1,24 @@
+from pydantic import BaseModel, Field
+from typing import List, Literal
+
+
+class PositionLot(BaseModel):
+    uuid: str  # transaction UUID that opened the lot
+    side: Literal["BUY", "SELL"]
+    grams: float
+    price: float
+    opened_at: int
+
+
+class PositionBook(BaseModel):
+    uuid: str
+    user_id: str
+    long_grams: float = 0.0
+    long_cost: float = 0.0  # sum of grams * price over open BUY lots
+    short_grams: float = 0.0
+    short_cost: float = 0.0  # sum of grams * price over open SELL lots
+    net_grams: float = 0.0  # long_grams - short_grams
+    realized_pnl: float = 0.0
+    lots: List[PositionLot] = Field(default_factory=list)
+    created_at: int
+    updated_at: int
@@ -0,0 +1,223 @@
+"""
+Slotted record types mirroring the Pydantic models on hot paths.
+
+A record validates its arguments once, when it is constructed, and turns
+into a BSON-ready dict with a single zip, so code that creates documents in
+bulk skips Pydantic's per-instance machinery. Each `__init__` spells out a
+class test per field and hands anything unexpected to the full check built
+from the Pydantic model named in `MODEL`; defining a record verifies that
+its fields and defaults still match that model, the definition of the schema.
+
+    doc = TransactionRecord(uuid=..., user_id=..., buy_grams=1.5, ...).to_doc()
+"""
+import inspect
+import typing
+from enum import Enum
+from operator import attrgetter
+from typing import Any, Dict, Type
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+from app.models.position_book import PositionLot
+from app.models.transaction import Transaction, TxStatus
+from app.models.user import UserLink
+from app.models.wallet import Wallet
+from app.models.wallet_ledger import WalletLedgerEntry
+
+_REQUIRED = object()
+
+# Classes an optional field accepts without the full check
+_OPT_STR = frozenset({str, type(None)})
+_OPT_INT = frozenset({int, type(None)})
+_OPT_FLOAT = frozenset({float, type(None)})
+
+
+class _FieldSpec:
+    __slots__ = ("name", "types", "optional", "choices", "enum", "default")
+
+    def __init__(self, name: str, annotation: Any, default: Any):
+        self.name = name
+        self.default = _REQUIRED if default is PydanticUndefined else default
+        self.optional = False
+        self.choices = None
+        self.enum = None
+        args = typing.get_args(annotation)
+        if typing.get_origin(annotation) is typing.Union:
+            self.optional = type(None) in args
+            annotation = next(a for a in args if a is not type(None))
+            args = typing.get_args(annotation)
+        if typing.get_origin(annotation) is typing.Literal:
+            self.choices = frozenset(args)
+            self.types = tuple({type(a) for a in args})
+        elif isinstance(annotation, type) and issubclass(annotation, Enum):
+            self.enum = annotation
+            self.choices = frozenset(member.value for member in annotation)
+            self.types = (annotation, str)
+        elif annotation is float:
+            self.types = (float, int)
+        else:
+            self.types = (annotation,)
+        if isinstance(self.default, Enum):
+            self.default = self.default.value
+
+    def check(self, value: Any) -> Any:
+        """Full validation of a value whose class the record does not take as it is."""
+        if value is None:
+            if self.optional:
+                return None
+            raise ValueError(f"{self.name} may not be None")
+        if not isinstance(value, self.types) or (isinstance(value, bool) and bool not in self.types):
+            raise TypeError(f"{self.name} must be {' or '.join(t.__name__ for t in self.types)}, "
+                            f"got {type(value).__name__}")
+        if self.enum is not None:
+            return self.enum(value).value
+        if self.choices is not None and value not in self.choices:
+            raise ValueError(f"{self.name} must be one of {sorted(self.choices)}, got {value!r}")
+        if self.types[0] is float:
+            return float(value)
+        return value
+
+
+class Record:
+    """Base class; subclasses set `MODEL`, `__slots__ = tuple(MODEL.model_fields)` and `__init__`."""
+
+    __slots__ = ()
+    MODEL: Type[BaseModel]
+    _specs: Dict[str, _FieldSpec] = {}
+    _values: attrgetter
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = cls.MODEL.model_fields
+        if tuple(fields) != cls.__slots__:
+            raise TypeError(f"{cls.__name__}.__slots__ must match the fields of {cls.MODEL.__name__}")
+        cls._specs = {name: _FieldSpec(name, field.annotation, field.default) for name, field in fields.items()}
+        params = list(inspect.signature(cls.__init__).parameters.values())[1:]
+        expected = [(name, spec.default) for name, spec in cls._specs.items()]
+        if [(p.name, _REQUIRED if p.default is p.empty else p.default) for p in params] != expected:
+            raise TypeError(f"{cls.__name__}.__init__ must take the fields and defaults of {cls.MODEL.__name__}")
+        cls._values = attrgetter(*cls.__slots__)
+
+    def _check(self, name: str, value: Any) -> Any:
+        return self._specs[name].check(value)
+
+    def _to_doc(self) -> Dict[str, Any]:
+        return dict(zip(self.__slots__, self._values(self)))
+
+    def to_doc(self, exclude_none: bool = False) -> Dict[str, Any]:
+        """The record as a plain dict, ready to insert."""
+        doc = self._to_doc()
+        if exclude_none:
+            return {k: v for k, v in doc.items() if v is not None}
+        return doc
+
+    def __eq__(self, other: Any) -> bool:
+        return type(other) is type(self) and self._to_doc() == other._to_doc()
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={value!r}" for name, value in self._to_doc().items())
+        return f"{type(self).__name__}({fields})"
+
+
+_TX_STATUSES = frozenset(status.value for status in TxStatus)
+_LINK_STATUSES = frozenset({"PENDING", "APPROVED", "REJECTED"})
+_LOT_SIDES = frozenset({"BUY", "SELL"})
+
+
+class TransactionRecord(Record):
+    MODEL = Transaction
+    __slots__ = tuple(Transaction.model_fields)
+
+    def __init__(self, *, uuid, user_id, buy_at=None, buy_grams=None, buy_price=None, buy_price_type=None,
+                 total_buy_amount=None, sell_at=None, sell_grams=None, sell_price=None, sell_price_type=None,
+                 total_sell_amount=None, status="OPEN", pnl=0, updated_at=None, stop_loss=None, take_profit=None,
+                 trigger_chat_id=None):
+        self.uuid = uuid if uuid.__class__ is str else self._check("uuid", uuid)
+        self.user_id = user_id if user_id.__class__ is str else self._check("user_id", user_id)
+        self.buy_at = buy_at if buy_at.__class__ in _OPT_INT else self._check("buy_at", buy_at)
+        self.buy_grams = buy_grams if buy_grams.__class__ in _OPT_FLOAT else self._check("buy_grams", buy_grams)
+        self.buy_price = buy_price if buy_price.__class__ in _OPT_FLOAT else self._check("buy_price", buy_price)
+        self.buy_price_type = (buy_price_type if buy_price_type.__class__ in _OPT_STR
+                               else self._check("buy_price_type", buy_price_type))
+        self.total_buy_amount = (total_buy_amount if total_buy_amount.__class__ in _OPT_FLOAT
+                                 else self._check("total_buy_amount", total_buy_amount))
+        self.sell_at = sell_at if sell_at.__class__ in _OPT_INT else self._check("sell_at", sell_at)
+        self.sell_grams = sell_grams if sell_grams.__class__ in _OPT_FLOAT else self._check("sell_grams", sell_grams)
+        self.sell_price = sell_price if sell_price.__class__ in _OPT_FLOAT else self._check("sell_price", sell_price)
+        self.sell_price_type = (sell_price_type if sell_price_type.__class__ in _OPT_STR
+                                else self._check("sell_price_type", sell_price_type))
+        self.total_sell_amount = (total_sell_amount if total_sell_amount.__class__ in _OPT_FLOAT
+                                  else self._check("total_sell_amount", total_sell_amount))
+        # TxStatus members are stored as their plain string value
+        self.status = (status if status.__class__ is str and status in _TX_STATUSES
+                       else self._check("status", status))
+        self.pnl = pnl if pnl.__class__ in _OPT_FLOAT else self._check("pnl", pnl)
+        self.updated_at = updated_at if updated_at.__class__ in _OPT_INT else self._check("updated_at", updated_at)
+        self.stop_loss = stop_loss if stop_loss.__class__ in _OPT_FLOAT else self._check("stop_loss", stop_loss)
+        self.take_profit = (take_profit if take_profit.__class__ in _OPT_FLOAT
+                            else self._check("take_profit", take_profit))
+        self.trigger_chat_id = (trigger_chat_id if trigger_chat_id.__class__ in _OPT_INT
+                                else self._check("trigger_chat_id", trigger_chat_id))
+
+
+class UserLinkRecord(Record):
+    MODEL = UserLink
+    __slots__ = tuple(UserLink.model_fields)
+
+    def __init__(self, *, uuid, telegram_id=None, username=None, first_name=None, last_name=None,
+                 phone_number=None, status="PENDING", link_code=None, created_at):
+        self.uuid = uuid if uuid.__class__ is str else self._check("uuid", uuid)
+        self.telegram_id = telegram_id if telegram_id.__class__ in _OPT_INT else self._check("telegram_id", telegram_id)
+        self.username = username if username.__class__ in _OPT_STR else self._check("username", username)
+        self.first_name = first_name if first_name.__class__ in _OPT_STR else self._check("first_name", first_name)
+        self.last_name = last_name if last_name.__class__ in _OPT_STR else self._check("last_name", last_name)
+        self.phone_number = (phone_number if phone_number.__class__ in _OPT_STR
+                             else self._check("phone_number", phone_number))
+        self.status = (status if status.__class__ is str and status in _LINK_STATUSES
+                       else self._check("status", status))
+        self.link_code = link_code if link_code.__class__ in _OPT_STR else self._check("link_code", link_code)
+        self.created_at = created_at if created_at.__class__ is int else self._check("created_at", created_at)
+
+
+class WalletRecord(Record):
+    MODEL = Wallet
+    __slots__ = tuple(Wallet.model_fields)
+
+    def __init__(self, *, uuid, user_id, balance=0.0, status="ACTIVE", currency="USD", ledger_seq=0,
+                 created_at, updated_at):
+        self.uuid = uuid if uuid.__class__ is str else self._check("uuid", uuid)
+        self.user_id = user_id if user_id.__class__ is str else self._check("user_id", user_id)
+        self.balance = balance if balance.__class__ is float else self._check("balance", balance)
+        self.status = status if status.__class__ is str else self._check("status", status)
+        self.currency = currency if currency.__class__ is str else self._check("currency", currency)
+        self.ledger_seq = ledger_seq if ledger_seq.__class__ is int else self._check("ledger_seq", ledger_seq)
+        self.created_at = created_at if created_at.__class__ is int else self._check("created_at", created_at)
+        self.updated_at = updated_at if updated_at.__class__ is int else self._check("updated_at", updated_at)
+
+
+class WalletLedgerEntryRecord(Record):
+    MODEL = WalletLedgerEntry
+    __slots__ = tuple(WalletLedgerEntry.model_fields)
+
+    def __init__(self, *, uuid, wallet_id, user_id, seq, kind, amount, balance_after, reference=None, created_at):
+        self.uuid = uuid if uuid.__class__ is str else self._check("uuid", uuid)
+        self.wallet_id = wallet_id if wallet_id.__class__ is str else self._check("wallet_id", wallet_id)
+        self.user_id = user_id if user_id.__class__ is str else self._check("user_id", user_id)
+        self.seq = seq if seq.__class__ is int else self._check("seq", seq)
+        self.kind = kind if kind.__class__ is str else self._check("kind", kind)
+        self.amount = amount if amount.__class__ is float else self._check("amount", amount)
+        self.balance_after = (balance_after if balance_after.__class__ is float
+                              else self._check("balance_after", balance_after))
+        self.reference = reference if reference.__class__ in _OPT_STR else self._check("reference", reference)
+        self.created_at = created_at if created_at.__class__ is int else self._check("created_at", created_at)
+
+
+class PositionLotRecord(Record):
+    MODEL = PositionLot
+    __slots__ = tuple(PositionLot.model_fields)
+
+    def __init__(self, *, uuid, side, grams, price, opened_at):
+        self.uuid = uuid if uuid.__class__ is str else self._check("uuid", uuid)
+        self.side = side if side.__class__ is str and side in _LOT_SIDES else self._check("side", side)
+        self.grams = grams if grams.__class__ is float else self._check("grams", grams)
+        self.price = price if price.__class__ is float else self._check("price", price)
+        self.opened_at = opened_at if opened_at.__class__ is int else self._check("opened_at", opened_at)
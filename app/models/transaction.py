@@ -24,4 +24,7 @@ class Transaction(BaseModel):
     total_sell_amount: Optional[float] = None
     status: TxStatus = TxStatus.OPEN
     pnl: Optional[float] = 0  # Profit and Loss, can be calculated later
-    updated_at: Optional[int] = None  # Timestamp of last update
\ No newline at end of file
+    updated_at: Optional[int] = None  # Timestamp of last update
+    stop_loss: Optional[float] = None  # Auto-close levels, see TriggerEngine
+    take_profit: Optional[float] = None
+    trigger_chat_id: Optional[int] = None  # Chat notified when a level triggers
\ No newline at end of file
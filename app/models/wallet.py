@@ -9,5 +9,6 @@ class Wallet(BaseModel):
     balance: float = 0.0
     status: str = "ACTIVE"
     currency: str = "USD"
+    ledger_seq: int = 0  # seq of the last wallet ledger entry
     created_at: int
     updated_at: int
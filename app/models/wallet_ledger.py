@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from typing import Optional
+
+
+class WalletLedgerEntry(BaseModel):
+    uuid: str
+    wallet_id: str
+    user_id: str
+    seq: int  # per-wallet sequence, matches the wallet's ledger_seq after the change
+    kind: str  # BUY, SELL, CLOSE, ...
+    amount: float  # signed: credits positive, debits negative
+    balance_after: float
+    reference: Optional[str] = None  # transaction or batch the change belongs to
+    created_at: int
+
+
+class WalletSnapshot(BaseModel):
+    uuid: str
+    wallet_id: str
+    user_id: str
+    seq: int  # last ledger entry included in `balance`
+    balance: float
+    taken_at: int
@@ -11,17 +11,20 @@ class BuyService:
 
     @staticmethod
     async def create_buy_order_for_linked_user(telegram_id: int, grams: float, custom_price: float = None):
+        link = await TelegramService.get_link_for_telegram(telegram_id)
+        if not link:
+            logger.info("user not linked for telegram id : %s", telegram_id)
+            return None
+        return await BuyService.create_buy_order(link["uuid"], grams, custom_price=custom_price)
+
+    @staticmethod
+    async def create_buy_order(user_uuid: str, grams: float, custom_price: float = None, quoted_price: float = None):
         try:
-            link = await TelegramService.get_link_for_telegram(telegram_id)
-            if not link:
-                logger.info(f"user not linked for telegram id : {telegram_id}")
-                raise RuntimeError("telegram not linked")
-            rate = await get_current_price()
             buy_at = int(time.time())
 
             if custom_price is None:
-                # Immediate market order
-                price_per_gram = rate
+                # Immediate market order, at the price quoted to the user if there is one
+                price_per_gram = quoted_price if quoted_price is not None else await get_current_price()
                 price_type = "MARKET"
             else:
                 # Limit order (pending)
@@ -31,7 +34,7 @@ class BuyService:
             buy_price_total = grams * price_per_gram
 
             buy_transaction_payload = {
-                "user_uuid": link["uuid"],
+                "user_uuid": user_uuid,
                 "buy_at": buy_at,
                 "grams": grams,
                 "buy_price": price_per_gram,
@@ -42,4 +45,4 @@ class BuyService:
             return await TransactionService.create_transaction(buy_transaction_payload)
         
         except Exception as e:
-            logger.error(f"Error while creating buy order for user with telegram id : {telegram_id} = {str(e)}")
\ No newline at end of file
+            logger.error("Error while creating buy order for user : %s = %s", user_uuid, e)
\ No newline at end of file
@@ -0,0 +1,121 @@
+import heapq
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from app.db.mongo.helper import MongoHelper
+from app.utils.config import settings
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+EPSILON = 1e-9
+DEFAULT_TOP_N = 10
+
+
+class ExposureMonitor:
+    """
+    Running view of the grams customers hold long/short, i.e. what the house
+    is exposed to.
+
+    Per-user long/short grams and the platform totals are adjusted on every
+    open and close, so nothing is re-aggregated from the transactions
+    collection after startup. The top-users ranking is cached until the next
+    trade, and notionals are priced at read time, so a price tick costs a
+    snapshot nothing beyond a few multiplications.
+    """
+
+    def __init__(self):
+        self.long_grams = 0.0
+        self.short_grams = 0.0
+        self.price = 0.0
+        # user uuid -> [long grams, short grams]
+        self._users: Dict[str, list] = {}
+        self._version = 0
+        self._top_key: Optional[Tuple[int, int]] = None
+        self._top: List[Tuple[str, float, float]] = []
+
+    def apply(self, user_uuid: str, side: str, grams: float, sign: int = 1) -> None:
+        """Add (sign=1) or remove (sign=-1) an open position of `grams` on `side`."""
+        totals = self._users.setdefault(user_uuid, [0.0, 0.0])
+        delta = grams * sign
+        if side == "BUY":
+            totals[0] += delta
+            self.long_grams += delta
+        else:
+            totals[1] += delta
+            self.short_grams += delta
+        if abs(totals[0]) < EPSILON and abs(totals[1]) < EPSILON:
+            del self._users[user_uuid]
+        self._version += 1
+
+    def apply_lot(self, user_uuid: str, lot: Dict[str, Any], sign: int = 1) -> None:
+        """Apply a position book lot (see PositionBookService)."""
+        self.apply(user_uuid, lot["side"], lot["grams"], sign)
+
+    def on_price(self, price: float) -> None:
+        """Price listener."""
+        if price > 0:
+            self.price = price
+
+    def _top_users(self, top_n: int) -> List[Tuple[str, float, float]]:
+        """(user uuid, long grams, short grams) of the `top_n` users by absolute net grams; cached per position change."""
+        key = (self._version, top_n)
+        if key != self._top_key:
+            top = heapq.nlargest(top_n, self._users.items(), key=lambda item: abs(item[1][0] - item[1][1]))
+            self._top = [(user_uuid, long_grams, short_grams) for user_uuid, (long_grams, short_grams) in top]
+            self._top_key = key
+        return self._top
+
+    def snapshot(self, top_n: int = DEFAULT_TOP_N) -> Dict[str, Any]:
+        """Current exposure figures and the `top_n` users by absolute net grams."""
+        net = self.long_grams - self.short_grams
+        gross = self.long_grams + self.short_grams
+        return {
+            "price": self.price,
+            "customer_long_grams": round(self.long_grams, 6),
+            "customer_short_grams": round(self.short_grams, 6),
+            "net_grams": round(net, 6),
+            "house_net_grams": round(-net, 6),
+            "gross_grams": round(gross, 6),
+            "net_notional": round(net * self.price, 2),
+            "gross_notional": round(gross * self.price, 2),
+            "users_with_positions": len(self._users),
+            "top_users": [
+                {
+                    "user_id": user_uuid,
+                    "long_grams": round(long_grams, 6),
+                    "short_grams": round(short_grams, 6),
+                    "net_grams": round(long_grams - short_grams, 6),
+                    "net_notional": round((long_grams - short_grams) * self.price, 2),
+                }
+                for user_uuid, long_grams, short_grams in self._top_users(top_n)
+            ],
+            "generated_at": int(time.time()),
+        }
+
+    async def load(self) -> int:
+        """Rebuild the aggregate from the OPEN transactions in Mongo."""
+        rows = await MongoHelper.aggregate(
+            collection=settings.DB_TABLE.TRANSACTIONS,
+            pipeline=[
+                {"$match": {"status": "OPEN"}},
+                {"$group": {"_id": "$user_id", "long_grams": {"$sum": "$buy_grams"},
+                            "short_grams": {"$sum": "$sell_grams"}}},
+            ],
+        )
+        self._users = {}
+        self.long_grams = 0.0
+        self.short_grams = 0.0
+        for row in rows:
+            long_grams = row.get("long_grams") or 0.0
+            short_grams = row.get("short_grams") or 0.0
+            if long_grams < EPSILON and short_grams < EPSILON:
+                continue
+            self._users[row["_id"]] = [long_grams, short_grams]
+            self.long_grams += long_grams
+            self.short_grams += short_grams
+        self._version += 1
+        logger.info("Exposure monitor loaded %s users with open positions", len(self._users))
+        return len(self._users)
+
+
+exposure = ExposureMonitor()
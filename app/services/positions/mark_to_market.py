@@ -0,0 +1,160 @@
+from typing import Dict, List, Optional
+import numpy as np
+from app.db.mongo.helper import MongoHelper
+from app.utils.config import settings
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+LONG = 1
+SHORT = -1
+
+
+class MarkToMarketStore:
+    """
+    Columnar store of every open position on the platform.
+
+    Each open lot is one row across parallel NumPy arrays (side, grams,
+    entry price, user index, unrealized PnL). A price tick recomputes the
+    PnL column for all rows in a single vectorized pass. Rows are appended on
+    open and removed on close by moving the last row into the freed slot, so
+    the live rows always occupy `[0, len)` without gaps.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._size = 0
+        self._side = np.zeros(capacity, dtype=np.int8)
+        self._grams = np.zeros(capacity, dtype=np.float64)
+        self._entry = np.zeros(capacity, dtype=np.float64)
+        self._user = np.zeros(capacity, dtype=np.int32)
+        self._pnl = np.zeros(capacity, dtype=np.float64)
+        # position uuid <-> row
+        self._row_of: Dict[str, int] = {}
+        self._position_at: List[str] = []
+        # user uuid <-> small integer, so per-user sums are one bincount
+        self._user_index: Dict[str, int] = {}
+        self._users: List[str] = []
+        self.price: float = 0.0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, position_uuid: str) -> bool:
+        return position_uuid in self._row_of
+
+    def _grow(self) -> None:
+        capacity = max(2 * len(self._side), 16)
+        for name in ("_side", "_grams", "_entry", "_user", "_pnl"):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            setattr(self, name, grown)
+
+    def _user_id(self, user_uuid: str) -> int:
+        index = self._user_index.get(user_uuid)
+        if index is None:
+            index = len(self._users)
+            self._user_index[user_uuid] = index
+            self._users.append(user_uuid)
+        return index
+
+    def insert(self, position_uuid: str, user_uuid: str, side: int, grams: float, price: float) -> None:
+        """Add an open position (or overwrite it if it is already tracked)."""
+        row = self._row_of.get(position_uuid)
+        if row is None:
+            if self._size == len(self._side):
+                self._grow()
+            row = self._size
+            self._size += 1
+            self._row_of[position_uuid] = row
+            self._position_at.append(position_uuid)
+        self._side[row] = side
+        self._grams[row] = grams
+        self._entry[row] = price
+        self._user[row] = self._user_id(user_uuid)
+        self._pnl[row] = side * (self.price - price) * grams if self.price > 0 else 0.0
+
+    def delete(self, position_uuid: str) -> bool:
+        """Remove a position; the last row is moved into its slot."""
+        row = self._row_of.pop(position_uuid, None)
+        if row is None:
+            return False
+        last = self._size - 1
+        if row != last:
+            moved = self._position_at[last]
+            for column in (self._side, self._grams, self._entry, self._user, self._pnl):
+                column[row] = column[last]
+            self._position_at[row] = moved
+            self._row_of[moved] = row
+        self._position_at.pop()
+        self._size = last
+        return True
+
+    def clear(self) -> None:
+        self._size = 0
+        self._row_of.clear()
+        self._position_at.clear()
+
+    def insert_lot(self, user_uuid: str, lot: Dict) -> None:
+        """Insert a position book lot (see PositionBookService)."""
+        side = LONG if lot["side"] == "BUY" else SHORT
+        self.insert(lot["uuid"], user_uuid, side, lot["grams"], lot["price"])
+
+    def mark(self, price: float) -> None:
+        """Revalue every open position at `price`."""
+        if price <= 0:
+            return
+        self.price = price
+        n = self._size
+        np.subtract(price, self._entry[:n], out=self._pnl[:n])
+        self._pnl[:n] *= self._grams[:n]
+        self._pnl[:n] *= self._side[:n]
+
+    def on_price(self, price: float) -> None:
+        """Price listener."""
+        self.mark(price)
+
+    def position_pnl(self, position_uuid: str) -> Optional[float]:
+        row = self._row_of.get(position_uuid)
+        return float(self._pnl[row]) if row is not None else None
+
+    def total_pnl(self) -> float:
+        return float(self._pnl[:self._size].sum())
+
+    def pnl_by_user(self) -> Dict[str, float]:
+        """Unrealized PnL summed per user, for users with open positions."""
+        n = self._size
+        totals = np.bincount(self._user[:n], weights=self._pnl[:n], minlength=len(self._users))
+        counts = np.bincount(self._user[:n], minlength=len(self._users))
+        return {self._users[i]: float(totals[i]) for i in np.flatnonzero(counts)}
+
+    def user_pnl(self, user_uuid: str) -> float:
+        index = self._user_index.get(user_uuid)
+        if index is None:
+            return 0.0
+        n = self._size
+        return float(self._pnl[:n][self._user[:n] == index].sum())
+
+    async def load(self) -> int:
+        """Rebuild the store from the OPEN transactions in Mongo."""
+        # Imported here: the book service hooks into this module
+        from app.services.positions.position_book_service import PositionBookService
+
+        txns = await MongoHelper.aggregate(
+            collection=settings.DB_TABLE.TRANSACTIONS,
+            pipeline=[
+                {"$match": {"status": "OPEN"}},
+                {"$project": {"_id": 0, "uuid": 1, "user_id": 1, "buy_at": 1, "buy_grams": 1, "buy_price": 1,
+                              "sell_at": 1, "sell_grams": 1, "sell_price": 1}},
+            ],
+        )
+        self.clear()
+        for txn in txns:
+            self.insert_lot(txn["user_id"], PositionBookService.lot_from_transaction(txn))
+        if self.price > 0:
+            self.mark(self.price)
+        logger.info("Mark-to-market store loaded %s open positions", self._size)
+        return self._size
+
+
+mark_to_market = MarkToMarketStore()
@@ -0,0 +1,214 @@
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+from pymongo import UpdateOne
+from app.db.mongo.helper import MongoHelper
+from app.models.position_book import PositionBook
+from app.models.records import PositionLotRecord
+from app.services.positions.exposure import exposure
+from app.services.positions.mark_to_market import mark_to_market
+from app.utils.common import generate_uuid
+from app.utils.config import settings
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class PositionBookService:
+    """
+    One compact document per user holding the open lots, running long/short
+    cost and realized PnL.
+
+    The book is maintained incrementally as trades execute (`record_open`,
+    `record_close`), so the open positions and wallet views read a single
+    document instead of scanning the user's transactions. If the book is
+    missing or out of step with the transactions it is rebuilt from them.
+    """
+
+    @staticmethod
+    def lot_from_transaction(txn: Dict[str, Any]) -> Dict[str, Any]:
+        """Turn an OPEN transaction document into a book lot."""
+        is_buy = (txn.get("buy_grams") or 0) > 0 and (txn.get("buy_price") or 0) > 0
+        if is_buy:
+            lot = PositionLotRecord(uuid=txn["uuid"], side="BUY", grams=txn["buy_grams"],
+                                    price=txn["buy_price"], opened_at=txn.get("buy_at") or 0)
+        else:
+            lot = PositionLotRecord(uuid=txn["uuid"], side="SELL", grams=txn.get("sell_grams") or 0,
+                                    price=txn.get("sell_price") or 0, opened_at=txn.get("sell_at") or 0)
+        return lot.to_doc()
+
+    @staticmethod
+    def lot_as_position(lot: Dict[str, Any]) -> Dict[str, Any]:
+        """Expose a lot in the transaction field layout the close flow works with."""
+        is_buy = lot["side"] == "BUY"
+        return {
+            "uuid": lot["uuid"],
+            "buy_at": lot["opened_at"] if is_buy else 0,
+            "buy_grams": lot["grams"] if is_buy else 0,
+            "buy_price": lot["price"] if is_buy else 0,
+            "sell_at": 0 if is_buy else lot["opened_at"],
+            "sell_grams": 0 if is_buy else lot["grams"],
+            "sell_price": 0 if is_buy else lot["price"],
+        }
+
+    @staticmethod
+    def unrealized_pnl(position: Dict[str, Any], current_price: float) -> float:
+        """Mark-to-market PnL of an open position (transaction layout)."""
+        if (position.get("buy_price") or 0) > 0:
+            return (current_price - position["buy_price"]) * (position.get("buy_grams") or 0)
+        return ((position.get("sell_price") or 0) - current_price) * (position.get("sell_grams") or 0)
+
+    @staticmethod
+    def _lot_increments(lot: Dict[str, Any], sign: int) -> Dict[str, float]:
+        grams = lot["grams"] * sign
+        cost = lot["grams"] * lot["price"] * sign
+        if lot["side"] == "BUY":
+            return {"long_grams": grams, "long_cost": cost, "net_grams": grams}
+        return {"short_grams": grams, "short_cost": cost, "net_grams": -grams}
+
+    @staticmethod
+    async def get_book(user_uuid: str) -> Dict[str, Any]:
+        """Return the user's book with derived average costs, rebuilding it if missing."""
+        book = await MongoHelper.find_one(
+            collection=settings.DB_TABLE.POSITION_BOOKS,
+            query={"user_id": user_uuid},
+            projection={"_id": 0},
+        )
+        if book is None:
+            book = await PositionBookService.rebuild_book(user_uuid)
+        return PositionBookService._with_averages(book)
+
+    @staticmethod
+    async def record_open(user_uuid: str, txn: Dict[str, Any]) -> None:
+        """Add the lot opened by `txn` to the user's book."""
+        lot = PositionBookService.lot_from_transaction(txn)
+        modified = await MongoHelper.update_one(
+            collection=settings.DB_TABLE.POSITION_BOOKS,
+            query={"user_id": user_uuid, "lots.uuid": {"$ne": lot["uuid"]}},
+            update={
+                "$push": {"lots": lot},
+                "$inc": PositionBookService._lot_increments(lot, 1),
+                "$set": {"updated_at": int(time.time())},
+            },
+        )
+        if modified == 0:
+            # No book yet (or the lot is already there): derive it from transactions
+            await PositionBookService.rebuild_book(user_uuid)
+        if lot["uuid"] not in mark_to_market:
+            exposure.apply_lot(user_uuid, lot, 1)
+        mark_to_market.insert_lot(user_uuid, lot)
+
+    @staticmethod
+    async def record_close(user_uuid: str, position: Dict[str, Any], pnl: float) -> None:
+        """Remove a closed position's lot from the book and book its realized PnL."""
+        await PositionBookService.record_closes([(user_uuid, position, pnl)])
+
+    @staticmethod
+    async def record_closes(closed: List[Tuple[str, Dict[str, Any], float]]) -> None:
+        """
+        `record_close` for many (user_uuid, position, pnl) at once: one book
+        update per user, all sent in a single bulk write.
+        """
+        by_user: Dict[str, List[Tuple[Dict[str, Any], float]]] = defaultdict(list)
+        for user_uuid, position, pnl in closed:
+            by_user[user_uuid].append((PositionBookService.lot_from_transaction(position), pnl))
+        now = int(time.time())
+        ops = []
+        for user_uuid, lots in by_user.items():
+            increments: Dict[str, float] = defaultdict(float)
+            for lot, pnl in lots:
+                for field, value in PositionBookService._lot_increments(lot, -1).items():
+                    increments[field] += value
+                increments["realized_pnl"] += pnl
+            uuids = [lot["uuid"] for lot, _ in lots]
+            ops.append(UpdateOne(
+                # Only a book holding every one of the lots is adjusted in place
+                {"user_id": user_uuid, "lots.uuid": {"$all": uuids}},
+                {"$pull": {"lots": {"uuid": {"$in": uuids}}}, "$inc": dict(increments), "$set": {"updated_at": now}},
+            ))
+        modified = await MongoHelper.bulk_write(settings.DB_TABLE.POSITION_BOOKS, ops)
+        if modified < len(ops):
+            # Books that are missing or out of step were left alone: derive them from transactions
+            books = await MongoHelper.find_many(
+                collection=settings.DB_TABLE.POSITION_BOOKS,
+                query={"user_id": {"$in": list(by_user)}},
+                projection={"user_id": 1, "lots": 1},
+                limit=len(by_user),
+            )
+            held = {book["user_id"]: {lot["uuid"] for lot in book.get("lots", [])} for book in books}
+            for user_uuid, lots in by_user.items():
+                if user_uuid not in held or any(lot["uuid"] in held[user_uuid] for lot, _ in lots):
+                    await PositionBookService.rebuild_book(user_uuid)
+        for user_uuid, lots in by_user.items():
+            for lot, _ in lots:
+                if mark_to_market.delete(lot["uuid"]):
+                    exposure.apply_lot(user_uuid, lot, -1)
+
+    @staticmethod
+    async def rebuild_book(user_uuid: str) -> Dict[str, Any]:
+        """Recompute a user's book from the transactions collection and store it."""
+        logger.info("Rebuilding position book for user %s", user_uuid)
+        open_txns = await MongoHelper.aggregate(
+            collection=settings.DB_TABLE.TRANSACTIONS,
+            pipeline=[
+                {"$match": {"user_id": user_uuid, "status": "OPEN"}},
+                {"$sort": {"updated_at": 1}},
+                {"$project": {"_id": 0, "uuid": 1, "buy_at": 1, "buy_grams": 1, "buy_price": 1,
+                              "sell_at": 1, "sell_grams": 1, "sell_price": 1}},
+            ],
+        )
+        realized = await MongoHelper.aggregate(
+            collection=settings.DB_TABLE.TRANSACTIONS,
+            pipeline=[
+                {"$match": {"user_id": user_uuid, "status": "CLOSED"}},
+                {"$group": {"_id": None, "pnl": {"$sum": "$pnl"}}},
+            ],
+        )
+
+        now = int(time.time())
+        existing = await MongoHelper.find_one(
+            collection=settings.DB_TABLE.POSITION_BOOKS,
+            query={"user_id": user_uuid},
+            projection={"uuid": 1, "created_at": 1},
+        )
+        book = PositionBook(
+            uuid=existing["uuid"] if existing else await generate_uuid(),
+            user_id=user_uuid,
+            realized_pnl=realized[0]["pnl"] if realized else 0.0,
+            created_at=existing["created_at"] if existing else now,
+            updated_at=now,
+        )
+        doc = book.model_dump()
+        for txn in open_txns:
+            lot = PositionBookService.lot_from_transaction(txn)
+            doc["lots"].append(lot)
+            for field, value in PositionBookService._lot_increments(lot, 1).items():
+                doc[field] += value
+
+        await MongoHelper.update_one(
+            collection=settings.DB_TABLE.POSITION_BOOKS,
+            query={"user_id": user_uuid},
+            update={"$set": doc},
+            upsert=True,
+        )
+        return doc
+
+    @staticmethod
+    def _with_averages(book: Dict[str, Any]) -> Dict[str, Any]:
+        long_grams = book.get("long_grams") or 0
+        short_grams = book.get("short_grams") or 0
+        book["long_avg_cost"] = book.get("long_cost", 0) / long_grams if long_grams > 1e-9 else 0.0
+        book["short_avg_cost"] = book.get("short_cost", 0) / short_grams if short_grams > 1e-9 else 0.0
+        net = book.get("net_grams") or 0
+        if net > 1e-9:
+            book["avg_cost"] = book["long_avg_cost"]
+        elif net < -1e-9:
+            book["avg_cost"] = book["short_avg_cost"]
+        else:
+            book["avg_cost"] = 0.0
+        return book
+
+    @staticmethod
+    def open_positions(book: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Open lots of a book in transaction layout, oldest first."""
+        return [PositionBookService.lot_as_position(lot) for lot in book.get("lots", [])]
@@ -1,5 +1,17 @@
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+from pymongo import UpdateOne
 from app.db.mongo.helper import MongoHelper
+from app.services.positions.position_book_service import PositionBookService
+from app.services.transaction.rollup_service import DailyRollupService
+from app.services.wallet.wallet_service import WalletService
+from app.utils.common import generate_uuid
 from app.utils.config import settings
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
 
 class PositionService:
 
@@ -54,4 +66,244 @@ class PositionService:
             return (f"{index}. BUY {pos['buy_grams']}g @ ${pos['buy_price']:.2f} (ID:{pos['uuid'][:5]})")
         if pos.get("sell_price", 0) > 0 and pos.get("sell_grams", 0) > 0:
             return (f"{index}. SELL {pos['sell_grams']}g @ ${pos['sell_price']:.2f} (ID:{pos['uuid'][:5]})")
-        return f"{index}. Position ID {pos['uuid'][:8]} (Unknown Type)"
\ No newline at end of file
+        return f"{index}. Position ID {pos['uuid'][:8]} (Unknown Type)"
+
+    @staticmethod
+    def build_close(position: Dict[str, Any], current_price: float, now_ts: int) -> Tuple[Dict[str, Any], float, float]:
+        """
+        Work out how to close an open position at `current_price`.
+
+        Returns:
+            (transaction update, realized pnl, amount to credit to the wallet)
+        """
+        is_buy = position.get("buy_price", 0) > 0
+        buy_grams = position.get("buy_grams", 0)
+        buy_price = position.get("buy_price", 0)
+        sell_grams = position.get("sell_grams", 0)
+        sell_price = position.get("sell_price", 0)
+
+        if is_buy:
+            pnl = (current_price * buy_grams) - (buy_price * buy_grams)
+            update = {
+                "$set": {
+                    "sell_at": now_ts,
+                    "sell_grams": buy_grams,
+                    "sell_price": current_price,
+                    "sell_price_type": "MARKET",
+                    "total_sell_amount": current_price * buy_grams,
+                    "status": "CLOSED",
+                    "pnl": pnl,
+                    "updated_at": now_ts
+                }
+            }
+            credit_amount = (buy_price * buy_grams) + pnl
+        else:
+            pnl = (sell_price * sell_grams) - (current_price * sell_grams)
+            update = {
+                "$set": {
+                    "buy_at": now_ts,
+                    "buy_grams": sell_grams,
+                    "buy_price": current_price,
+                    "buy_price_type": "MARKET",
+                    "total_buy_amount": current_price * sell_grams,
+                    "status": "CLOSED",
+                    "pnl": pnl,
+                    "updated_at": now_ts
+                }
+            }
+            credit_amount = (sell_price * sell_grams) + pnl
+        return update, pnl, credit_amount
+
+    @staticmethod
+    def rollback_fields(position: Dict[str, Any]) -> Dict[str, Any]:
+        """Values that undo `build_close`: the closing leg back to how a new transaction has it."""
+        leg = "sell" if position.get("buy_price", 0) > 0 else "buy"
+        return {
+            f"{leg}_at": 0,
+            f"{leg}_grams": 0,
+            f"{leg}_price": 0,
+            f"{leg}_price_type": "",
+            f"total_{leg}_amount": 0,
+            "status": "OPEN",
+            "pnl": 0,
+        }
+
+    @staticmethod
+    async def close_position(user_uuid: str, position: Dict[str, Any], current_price: float) -> Dict[str, float]:
+        """
+        Close one open position at `current_price` and credit the wallet.
+
+        Returns:
+            dict with the realized "pnl" and the new wallet "balance"
+
+        Raises:
+            ValueError: If the user's wallet does not exist (the close is rolled back).
+            RuntimeError: If the transaction update fails.
+        """
+        now_ts = int(time.time())
+        update, pnl, credit_amount = PositionService.build_close(position, current_price, now_ts)
+
+        async def close(session) -> dict:
+            txn_affected = await MongoHelper.update_one(
+                collection=settings.DB_TABLE.TRANSACTIONS,
+                query={"uuid": position.get("uuid"), "status": "OPEN"},
+                update=update,
+                session=session
+            )
+            if txn_affected == 0:
+                raise RuntimeError("Failed to update transaction status")
+
+            try:
+                updated_wallet = await WalletService.change_balance(
+                    user_uuid, credit_amount, kind="CLOSE", reference=position.get("uuid"), session=session
+                )
+                if not updated_wallet:
+                    raise ValueError("Wallet not found")
+                await PositionService._record_rollups([(user_uuid, position, pnl)], current_price, now_ts, session)
+            except Exception:
+                if session is None:
+                    # No transaction to abort: undo the close by hand
+                    await MongoHelper.update_one(
+                        collection=settings.DB_TABLE.TRANSACTIONS,
+                        query={"uuid": position.get("uuid")},
+                        update={"$set": PositionService.rollback_fields(position)}
+                    )
+                raise
+            return updated_wallet
+
+        updated_wallet = await MongoHelper.transaction(close)
+        await PositionService._after_close([(user_uuid, position, pnl)])
+        return {"pnl": pnl, "balance": updated_wallet.get("balance", 0)}
+
+    @staticmethod
+    async def close_positions(closes: List[Tuple[str, Dict[str, Any]]], current_price: float,
+                              all_or_nothing: bool = False) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        Close many positions at one price with one bulk write, crediting the
+        wallets in the same Mongo transaction.
+
+        Each transaction is only closed if it is still OPEN. By default
+        positions that were closed elsewhere in the meantime are skipped, and
+        positions of users without an active wallet are put back to OPEN;
+        with `all_or_nothing` the whole batch is undone instead. Wallet
+        credits are combined into one change per user.
+
+        Args:
+            closes: (user_uuid, position) pairs, positions in transaction layout.
+            current_price: Price every position is closed at.
+            all_or_nothing: Fail the batch if any position or wallet cannot be updated.
+
+        Returns:
+            (closed, unfunded): {"user_uuid", "position", "pnl", "credit", "balance"} for the
+            positions closed, and the uuids of the positions left open for lack of a wallet
+
+        Raises:
+            RuntimeError: all_or_nothing and a position was no longer open.
+            ValueError: all_or_nothing and a user has no active wallet.
+        """
+        if not closes:
+            return [], []
+        now_ts = int(time.time())
+        batch_id = await generate_uuid()
+        planned: Dict[str, Dict[str, Any]] = {}
+        txn_ops = []
+        for user_uuid, position in closes:
+            update, pnl, credit_amount = PositionService.build_close(position, current_price, now_ts)
+            update["$set"]["close_batch"] = batch_id
+            txn_ops.append(UpdateOne({"uuid": position["uuid"], "status": "OPEN"}, update))
+            planned[position["uuid"]] = {"user_uuid": user_uuid, "position": position, "pnl": pnl, "credit": credit_amount}
+
+        # Runs again from the top if the transaction hits a write conflict
+        async def close(session) -> Tuple[List[Dict[str, Any]], Dict[str, dict], List[str]]:
+            unfunded: List[str] = []
+            await MongoHelper.bulk_write(settings.DB_TABLE.TRANSACTIONS, txn_ops, session=session)
+            closed = await MongoHelper.find_many(
+                collection=settings.DB_TABLE.TRANSACTIONS,
+                query={"close_batch": batch_id},
+                projection={"uuid": 1},
+                limit=len(txn_ops),
+                session=session,
+            )
+            results = [planned[doc["uuid"]] for doc in closed]
+            credits: Dict[str, float] = defaultdict(float)
+            wallets: Dict[str, dict] = {}
+            try:
+                if len(results) < len(closes):
+                    logger.info("Batch close %s: %s positions were no longer open", batch_id, len(closes) - len(results))
+                    if all_or_nothing:
+                        raise RuntimeError("Some positions are no longer open")
+
+                for result in results:
+                    credits[result["user_uuid"]] += result["credit"]
+                wallets = await WalletService.change_balances(
+                    [(user_uuid, amount, "CLOSE", batch_id) for user_uuid, amount in credits.items()],
+                    session=session,
+                )
+                missing = credits.keys() - wallets.keys()
+                for user_uuid in missing:
+                    logger.error("Batch close %s: no active wallet to credit for user %s", batch_id, user_uuid)
+                if missing and all_or_nothing:
+                    raise ValueError("Wallet not found")
+                if missing:
+                    # Nothing was credited for these users: keep their positions open
+                    reverted = [r for r in results if r["user_uuid"] in missing]
+                    await MongoHelper.bulk_write(
+                        settings.DB_TABLE.TRANSACTIONS,
+                        [UpdateOne({"uuid": r["position"]["uuid"]}, {"$set": PositionService.rollback_fields(r["position"])})
+                         for r in reverted],
+                        session=session,
+                    )
+                    unfunded = [r["position"]["uuid"] for r in reverted]
+                    results = [r for r in results if r["user_uuid"] not in missing]
+                await PositionService._record_rollups(
+                    [(r["user_uuid"], r["position"], r["pnl"]) for r in results], current_price, now_ts, session
+                )
+            except Exception:
+                if session is None:
+                    # No transaction to abort: undo the credits and closes by hand
+                    if wallets:
+                        await WalletService.change_balances(
+                            [(user_uuid, -credits[user_uuid], "CLOSE_REVERSAL", batch_id) for user_uuid in wallets]
+                        )
+                    await MongoHelper.bulk_write(
+                        settings.DB_TABLE.TRANSACTIONS,
+                        [UpdateOne({"uuid": r["position"]["uuid"]}, {"$set": PositionService.rollback_fields(r["position"])})
+                         for r in results],
+                    )
+                raise
+            return results, wallets, unfunded
+
+        results, wallets, unfunded = await MongoHelper.transaction(close)
+        for result in results:
+            wallet = wallets.get(result["user_uuid"])
+            result["balance"] = wallet.get("balance", 0) if wallet else None
+        await PositionService._after_close([(r["user_uuid"], r["position"], r["pnl"]) for r in results])
+        return results, unfunded
+
+    @staticmethod
+    async def _after_close(closed: List[Tuple[str, Dict[str, Any], float]]) -> None:
+        # Imported here: the trigger engine closes positions through this service
+        from app.services.positions.triggers import trigger_engine
+
+        for _, position, _ in closed:
+            trigger_engine.cancel(position["uuid"])
+        try:
+            await PositionBookService.record_closes(closed)
+        except Exception as e:
+            logger.error("Position book update failed for %s closed positions: %s", len(closed), e)
+
+    @staticmethod
+    async def _record_rollups(closed: List[Tuple[str, Dict[str, Any], float]], price: float, now_ts: int,
+                              session) -> None:
+        if not closed:
+            return
+        try:
+            await DailyRollupService.record([
+                (user_uuid, now_ts, DailyRollupService.closing_trade(position, price, pnl))
+                for user_uuid, position, pnl in closed
+            ], session=session)
+        except Exception as e:
+            if session is not None:
+                # Abort the close with its rollups rather than commit one without the other
+                raise
+            logger.error("Daily rollup update failed for %s closed positions: %s", len(closed), e)
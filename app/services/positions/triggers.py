@@ -0,0 +1,350 @@
+import asyncio
+import math
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from app.db.mongo.helper import MongoHelper
+from app.services.positions.position_service import PositionService
+from app.services.price.price_service import add_price_listener, remove_price_listener
+from app.utils.config import settings
+from app.utils.logging import get_logger
+from app.utils.metrics import trade_outcomes
+
+logger = get_logger(__name__)
+
+CLOSE_BATCH_SIZE = 500       # positions per bulk close
+MAX_SENDS_PER_SECOND = 25    # stay under Telegram's global bot limit
+MAX_RETRY_BACKOFF = 60.0     # seconds before failed closes are armed again, at most
+
+
+@dataclass
+class TriggerOrder:
+    position: Dict[str, Any]  # open position in transaction layout
+    user_uuid: str
+    chat_id: int
+    stop_loss: Optional[float] = None
+    take_profit: Optional[float] = None
+
+    @property
+    def uuid(self) -> str:
+        return self.position["uuid"]
+
+    @property
+    def is_long(self) -> bool:
+        return self.position.get("buy_price", 0) > 0
+
+
+class _TriggerSide:
+    """
+    Price levels that fire when the price crosses them in one direction.
+
+    Entries are kept sorted so the levels that fire first sit at the end of
+    the list: a tick is one bisect plus cutting off the fired tail, i.e.
+    O(log n + k) for k fired levels. Levels that fire on a rise are stored
+    negated so both directions share the same layout.
+    """
+
+    def __init__(self, fires_on_drop: bool):
+        self._sign = 1 if fires_on_drop else -1
+        self._entries: List[Tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, level: float, position_uuid: str) -> None:
+        insort(self._entries, (self._sign * level, position_uuid))
+
+    def remove(self, level: float, position_uuid: str) -> None:
+        entry = (self._sign * level, position_uuid)
+        i = bisect_left(self._entries, entry)
+        if i < len(self._entries) and self._entries[i] == entry:
+            del self._entries[i]
+
+    def level(self, key: float) -> float:
+        return self._sign * key
+
+    def fire(self, price: float) -> List[Tuple[float, str]]:
+        """Cut off and return the raw entries crossed by `price` (see `level`)."""
+        i = bisect_left(self._entries, (self._sign * price,))
+        if i == len(self._entries):
+            return []
+        fired = self._entries[i:]
+        del self._entries[i:]
+        return fired
+
+    def keep(self, is_live) -> None:
+        """Drop entries for which `is_live(level, position_uuid)` is false."""
+        self._entries = [(key, uuid) for key, uuid in self._entries if is_live(self._sign * key, uuid)]
+
+
+class TriggerEngine:
+    """
+    Stop-loss / take-profit levels on open positions.
+
+    The price listener only cuts the crossed levels off the books and queues
+    them, so a flash move that hits thousands of stops costs the feed one
+    bisect and one slice per book. A background worker claims the fired
+    orders, closes them in bulk at the trigger price and hands the
+    confirmations to a rate-limited notifier.
+    """
+
+    def __init__(self):
+        self._orders: Dict[str, TriggerOrder] = {}
+        self._drops = _TriggerSide(fires_on_drop=True)   # long SL, short TP
+        self._rises = _TriggerSide(fires_on_drop=False)  # long TP, short SL
+        # Levels left behind in the books by triggered positions, see on_price
+        self._stale = 0
+        # Orders whose close failed, waiting out the backoff before they are armed again
+        self._retrying: Dict[str, TriggerOrder] = {}
+        self._failures = 0
+        self._fired: asyncio.Queue = asyncio.Queue()
+        self._notifications: asyncio.Queue = asyncio.Queue()
+        # Set by sharded workers so each arms only the levels of its own chats
+        self.owns_chat: Optional[Callable[[Optional[int]], bool]] = None
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    @staticmethod
+    def validate(position: Dict[str, Any], price: float, stop_loss: Optional[float],
+                 take_profit: Optional[float]) -> Optional[str]:
+        """Return an error message if the levels would not make sense at `price`."""
+        is_long = position.get("buy_price", 0) > 0
+        # NaN compares false with everything: it would pass the checks below and break the sorted levels
+        if any(level is not None and not math.isfinite(level) for level in (stop_loss, take_profit)):
+            return "Levels must be finite prices."
+        if stop_loss is not None:
+            if stop_loss <= 0:
+                return "Stop-loss must be a positive price."
+            if is_long and stop_loss >= price:
+                return f"Stop-loss for a BUY position must be below the current price (${price:.2f})."
+            if not is_long and stop_loss <= price:
+                return f"Stop-loss for a SELL position must be above the current price (${price:.2f})."
+        if take_profit is not None:
+            if take_profit <= 0:
+                return "Take-profit must be a positive price."
+            if is_long and take_profit <= price:
+                return f"Take-profit for a BUY position must be above the current price (${price:.2f})."
+            if not is_long and take_profit >= price:
+                return f"Take-profit for a SELL position must be below the current price (${price:.2f})."
+        return None
+
+    def levels(self, position_uuid: str) -> Optional[Tuple[Optional[float], Optional[float]]]:
+        order = self._orders.get(position_uuid) or self._retrying.get(position_uuid)
+        return (order.stop_loss, order.take_profit) if order else None
+
+    def _sides(self, order: TriggerOrder):
+        # (side the stop-loss lives in, side the take-profit lives in)
+        if order.is_long:
+            return self._drops, self._rises
+        return self._rises, self._drops
+
+    def arm(self, order: TriggerOrder) -> None:
+        """Track `order` in memory, replacing earlier levels of the same position."""
+        self.cancel(order.uuid)
+        if order.stop_loss is None and order.take_profit is None:
+            return
+        sl_side, tp_side = self._sides(order)
+        if order.stop_loss is not None:
+            sl_side.add(order.stop_loss, order.uuid)
+        if order.take_profit is not None:
+            tp_side.add(order.take_profit, order.uuid)
+        self._orders[order.uuid] = order
+
+    def cancel(self, position_uuid: str) -> bool:
+        if self._retrying.pop(position_uuid, None):
+            return True
+        order = self._orders.pop(position_uuid, None)
+        if not order:
+            return False
+        sl_side, tp_side = self._sides(order)
+        if order.stop_loss is not None:
+            sl_side.remove(order.stop_loss, order.uuid)
+        if order.take_profit is not None:
+            tp_side.remove(order.take_profit, order.uuid)
+        return True
+
+    async def set_levels(self, order: TriggerOrder) -> bool:
+        """Persist the levels on the transaction and arm them. False if the position is no longer open."""
+        affected = await MongoHelper.update_one(
+            collection=settings.DB_TABLE.TRANSACTIONS,
+            query={"uuid": order.uuid, "status": "OPEN"},
+            update={"$set": {
+                "stop_loss": order.stop_loss,
+                "take_profit": order.take_profit,
+                "trigger_chat_id": order.chat_id,
+            }},
+        )
+        if affected == 0:
+            return False
+        self.arm(order)
+        return True
+
+    def _is_live(self, level: float, position_uuid: str) -> bool:
+        order = self._orders.get(position_uuid)
+        return order is not None and level in (order.stop_loss, order.take_profit)
+
+    def on_price(self, price: float) -> None:
+        """Price listener: cut the crossed levels off both books and queue them."""
+        if price <= 0 or not self._orders:
+            return
+        drops = self._drops.fire(price)
+        rises = self._rises.fire(price)
+        if drops or rises:
+            self._fired.put_nowait((price, [(self._drops, drops), (self._rises, rises)]))
+
+    def _claim(self, side: _TriggerSide, key: float, position_uuid: str) -> Optional[TriggerOrder]:
+        """Take the order behind a fired entry, unless it was changed or cancelled since."""
+        if not self._is_live(side.level(key), position_uuid):
+            self._stale = max(0, self._stale - 1)
+            return None
+        order = self._orders.pop(position_uuid)
+        if order.stop_loss is not None and order.take_profit is not None:
+            # The other level stays in its book until it fires or the books are
+            # compacted; removing it here would shift the list once per position
+            self._stale += 1
+        return order
+
+    def _compact(self) -> None:
+        self._drops.keep(self._is_live)
+        self._rises.keep(self._is_live)
+        self._stale = 0
+
+    async def load(self) -> int:
+        """Arm the levels stored on OPEN transactions."""
+        txns = await MongoHelper.aggregate(
+            collection=settings.DB_TABLE.TRANSACTIONS,
+            pipeline=[
+                {"$match": {"status": "OPEN", "$or": [{"stop_loss": {"$gt": 0}}, {"take_profit": {"$gt": 0}}]}},
+                {"$project": {"_id": 0, "uuid": 1, "user_id": 1, "buy_at": 1, "buy_grams": 1, "buy_price": 1,
+                              "sell_at": 1, "sell_grams": 1, "sell_price": 1,
+                              "stop_loss": 1, "take_profit": 1, "trigger_chat_id": 1}},
+            ],
+        )
+        for txn in txns:
+            if self.owns_chat is not None and not self.owns_chat(txn.get("trigger_chat_id")):
+                continue
+            self.arm(TriggerOrder(
+                position={k: txn.get(k, 0) for k in ("uuid", "buy_at", "buy_grams", "buy_price",
+                                                     "sell_at", "sell_grams", "sell_price")},
+                user_uuid=txn["user_id"],
+                chat_id=txn.get("trigger_chat_id"),
+                stop_loss=txn.get("stop_loss"),
+                take_profit=txn.get("take_profit"),
+            ))
+        logger.info("Armed stop-loss/take-profit levels on %s positions", len(self._orders))
+        return len(self._orders)
+
+    async def run(self, bot: Bot) -> None:
+        """Background worker closing triggered positions."""
+        try:
+            await self.load()
+        except Exception as e:
+            logger.error("Failed to load stop-loss/take-profit levels: %s", e)
+        add_price_listener(self.on_price)
+        notifier = asyncio.create_task(self._notify_loop(bot))
+        logger.info("Trigger engine started")
+        try:
+            while True:
+                price, fired = await self._fired.get()
+                orders = []
+                for side, entries in fired:
+                    for key, position_uuid in entries:
+                        order = self._claim(side, key, position_uuid)
+                        if order:
+                            orders.append(order)
+                        if len(orders) == CLOSE_BATCH_SIZE:
+                            await self._close_batch(price, orders)
+                            orders = []
+                if orders:
+                    await self._close_batch(price, orders)
+                if self._stale > max(1024, len(self._orders)):
+                    self._compact()
+        finally:
+            remove_price_listener(self.on_price)
+            notifier.cancel()
+
+    def _retry(self, orders: List[TriggerOrder]) -> None:
+        """Arm claimed orders again once a backoff that grows with consecutive failures has passed."""
+        for order in orders:
+            if order.stop_loss is not None and order.take_profit is not None:
+                # _claim left the level that did not fire in its book; drop it so arm adds it only once
+                sl_side, tp_side = self._sides(order)
+                sl_side.remove(order.stop_loss, order.uuid)
+                tp_side.remove(order.take_profit, order.uuid)
+                self._stale = max(0, self._stale - 1)
+            self._retrying[order.uuid] = order
+        self._failures += 1
+        delay = min(MAX_RETRY_BACKOFF, 2 ** self._failures)
+        asyncio.get_running_loop().call_later(delay, self._rearm, [o.uuid for o in orders])
+
+    def _rearm(self, position_uuids: List[str]) -> None:
+        for position_uuid in position_uuids:
+            # Gone if the levels were cancelled or replaced in the meantime
+            order = self._retrying.pop(position_uuid, None)
+            if order:
+                self.arm(order)
+
+    async def _close_batch(self, price: float, orders: List[TriggerOrder]) -> None:
+        try:
+            results, unfunded = await PositionService.close_positions(
+                [(o.user_uuid, o.position) for o in orders], price
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Triggered close of %s positions at $%.2f failed: %s", len(orders), price, e)
+            trade_outcomes.labels("TRIGGER", "error").inc()
+            self._retry(orders)
+            return
+
+        logger.info("Closed %s triggered positions at $%.2f", len(results), price)
+        trade_outcomes.labels("TRIGGER", "filled").inc(len(results))
+        by_uuid = {o.uuid: o for o in orders}
+        if unfunded:
+            logger.error("%s triggered positions stay open: their users have no active wallet", len(unfunded))
+            trade_outcomes.labels("TRIGGER", "no_wallet").inc(len(unfunded))
+            self._retry([by_uuid[position_uuid] for position_uuid in unfunded])
+        else:
+            self._failures = 0
+        for result in results:
+            order = by_uuid[result["position"]["uuid"]]
+            if order.chat_id:
+                self._notifications.put_nowait((order.chat_id, self._describe(order, price, result["pnl"])))
+
+    @staticmethod
+    def _describe(order: TriggerOrder, price: float, pnl: float) -> str:
+        pos = order.position
+        if order.is_long:
+            position_desc = f"BUY {pos.get('buy_grams', 0)}g @ ${pos.get('buy_price', 0):.2f}"
+            hit_stop = order.stop_loss is not None and price <= order.stop_loss
+        else:
+            position_desc = f"SELL {pos.get('sell_grams', 0)}g @ ${pos.get('sell_price', 0):.2f}"
+            hit_stop = order.stop_loss is not None and price >= order.stop_loss
+        reason = "🛑 Stop-loss" if hit_stop else "🎯 Take-profit"
+        return (
+            f"{reason} triggered — position closed.\n\n"
+            f"{position_desc}\n"
+            f"Closed at: ${price:.2f}\n"
+            f"PnL Realized: ${pnl:.2f}"
+        )
+
+    async def _notify_loop(self, bot: Bot) -> None:
+        while True:
+            chat_id, text = await self._notifications.get()
+            try:
+                await bot.send_message(chat_id, text)
+            except TelegramRetryAfter as e:
+                logger.warning("Trigger notifications rate limited, backing off %ss", e.retry_after)
+                await asyncio.sleep(e.retry_after)
+                self._notifications.put_nowait((chat_id, text))
+            except TelegramForbiddenError:
+                pass
+            except Exception as e:
+                logger.error("Failed to notify chat %s about a triggered close: %s", chat_id, e)
+            await asyncio.sleep(1 / MAX_SENDS_PER_SECOND)
+
+
+trigger_engine = TriggerEngine()
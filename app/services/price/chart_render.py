@@ -0,0 +1,70 @@
+"""
+Price chart rendering; runs inside the chart process pool.
+
+Kept apart from price_chart.py so a pool process imports only the tick store,
+numpy and matplotlib, not aiogram; that is also why the time zone is passed
+in. The tick history is read here as well, straight from the memory-mapped
+day files, so the bot's event loop never touches it.
+"""
+import io
+import time
+from datetime import tzinfo
+from typing import List, Optional, Tuple
+import numpy as np
+from app.services.price.tick_store import DAY_MS, TickSlice, tick_store
+
+MAX_POINTS = 720  # plotted points per chart, whatever the number of ticks
+
+
+def _sample(slices: List[TickSlice], start_ms: int, end_ms: int) -> Tuple[np.ndarray, np.ndarray]:
+    """The last tick at or before each of MAX_POINTS evenly spaced instants, without repeats."""
+    edges = np.linspace(start_ms, end_ms, MAX_POINTS + 1, dtype=np.int64)[1:]
+    times, prices = [], []
+    for day in slices:
+        inside = edges[(edges >= day.base_ms) & (edges < day.base_ms + DAY_MS)]
+        # Search with the column's own dtype so the mapped offsets are not copied
+        rows = np.searchsorted(day.offsets_ms, (inside - day.base_ms).astype(np.uint32), side="right") - 1
+        rows = np.unique(rows[rows >= 0])
+        times.append(day.offsets_ms[rows].astype(np.int64) + day.base_ms)
+        prices.append(np.asarray(day.prices[rows]))
+    return np.concatenate(times), np.concatenate(prices)
+
+
+def render_chart(label: str, seconds: int, date_format: str, tz: tzinfo) -> Optional[Tuple[bytes, str]]:
+    """PNG and caption for the last `seconds` of ticks, or None without any ticks in that window."""
+    end_ms = time.time_ns() // 1_000_000
+    start_ms = end_ms - seconds * 1000
+    slices = tick_store.query(start_ms / 1000, end_ms / 1000 + 0.001)
+    if not slices:
+        return None
+    times, prices = _sample(slices, start_ms, end_ms)
+    first, last = float(slices[0].prices[0]), float(slices[-1].prices[-1])
+    high = max(float(day.prices.max()) for day in slices)
+    low = min(float(day.prices.min()) for day in slices)
+
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib import dates
+    from matplotlib.figure import Figure
+
+    # A bare Figure keeps clear of pyplot's global figure registry
+    fig = Figure(figsize=(8, 4.5), dpi=100)
+    ax = fig.add_subplot()
+    x = times.astype("datetime64[ms]")
+    ax.plot(x, prices, color="#c9a227", linewidth=1.5)
+    ax.fill_between(x, prices, low, color="#c9a227", alpha=0.15)
+    ax.set_title(f"Gold price, last {label}")
+    ax.set_ylabel("USD per gram")
+    ax.set_ylim(low - (high - low) * 0.05 - 0.01, high + (high - low) * 0.05 + 0.01)
+    ax.grid(alpha=0.3)
+    ax.xaxis.set_major_formatter(dates.DateFormatter(date_format, tz=tz))
+    fig.autofmt_xdate()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+
+    change = (last - first) / first * 100 if first else 0.0
+    caption = (
+        f"📈 Gold, last {label}: ${last:.2f} per gram ({change:+.2f}%)\n"
+        f"High ${high:.2f} · Low ${low:.2f}"
+    )
+    return buffer.getvalue(), caption
@@ -0,0 +1,127 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from aiogram import Bot
+from aiogram.types import BufferedInputFile, InlineKeyboardButton, InlineKeyboardMarkup
+from app.services.price.chart_render import render_chart
+from app.utils.common import IST
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+REFRESH_INTERVAL = 60.0  # seconds a rendered chart is served before it is drawn again
+RENDER_WORKERS = 1       # processes drawing charts; a render takes a few hundred ms of CPU
+
+CHART_CALLBACK_PREFIX = "chart:"
+
+# timeframe -> (caption label, seconds of history, x axis date format)
+TIMEFRAMES = {
+    "1h": ("hour", 3600, "%H:%M"),
+    "1d": ("day", 86400, "%H:%M"),
+    "1w": ("week", 7 * 86400, "%d %b"),
+}
+
+
+def chart_timeframe_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text=timeframe, callback_data=f"{CHART_CALLBACK_PREFIX}{timeframe}")
+        for timeframe in TIMEFRAMES
+    ]])
+
+
+@dataclass
+class Chart:
+    png: Optional[bytes]  # None when there was no price history to draw
+    caption: str
+    rendered_at: float
+    file_id: Optional[str] = None  # set after the first upload; later sends reuse Telegram's copy
+    upload_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class PriceChartService:
+    """
+    Serves the price chart of each timeframe from a cache.
+
+    A chart is drawn at most once per REFRESH_INTERVAL, in a separate process
+    so matplotlib never holds the event loop; requests that arrive while it is
+    being drawn wait for that same render. Finding no history is cached the
+    same way, so taps before the first tick do not each start a render. The
+    first upload of a render records Telegram's `file_id`; sends racing that
+    upload wait for it, and everyone else gets the chart resent by `file_id`
+    with nothing uploaded.
+    """
+
+    def __init__(self, refresh_interval: float = REFRESH_INTERVAL, workers: int = RENDER_WORKERS):
+        self.refresh_interval = refresh_interval
+        self.workers = workers
+        self._charts: Dict[str, Chart] = {}
+        self._rendering: Dict[str, asyncio.Task] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking would copy the loop, the logging thread and open sockets
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def _render(self, timeframe: str) -> Optional[Chart]:
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        pool = self._executor()
+        try:
+            result = await loop.run_in_executor(pool, render_chart, *TIMEFRAMES[timeframe], IST)
+        except BrokenProcessPool:
+            # A render process died (OOM kill, crash); start a fresh pool on the next request
+            logger.error("Chart render pool broke while drawing the %s chart, replacing it", timeframe)
+            if self._pool is pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            raise
+        if result is None:
+            self._charts[timeframe] = Chart(None, "", time.monotonic())
+            return None
+        png, caption = result
+        chart = self._charts[timeframe] = Chart(png, caption, time.monotonic())
+        logger.info("Rendered %s price chart in %.0fms", timeframe, (time.perf_counter() - started) * 1000)
+        return chart
+
+    async def get(self, timeframe: str) -> Optional[Chart]:
+        """The current chart for `timeframe`, or None while there is no price history for it."""
+        chart = self._charts.get(timeframe)
+        if chart is not None and time.monotonic() - chart.rendered_at < self.refresh_interval:
+            return chart if chart.png is not None else None
+        task = self._rendering.get(timeframe)
+        if task is None:
+            task = self._rendering[timeframe] = asyncio.create_task(self._render(timeframe))
+            task.add_done_callback(lambda _: self._rendering.pop(timeframe, None))
+        # One caller giving up must not cancel the render the others wait on
+        return await asyncio.shield(task)
+
+    async def send(self, bot: Bot, chat_id: int, timeframe: str) -> bool:
+        """Send the `timeframe` chart to `chat_id`. False if there is no price history for it yet."""
+        chart = await self.get(timeframe)
+        if chart is None:
+            return False
+        if chart.file_id is None:
+            async with chart.upload_lock:
+                if chart.file_id is None:
+                    sent = await bot.send_photo(
+                        chat_id, BufferedInputFile(chart.png, filename=f"gold-{timeframe}.png"), caption=chart.caption
+                    )
+                    chart.file_id = sent.photo[-1].file_id
+                    logger.info("Uploaded %s price chart", timeframe)
+                    return True
+        await bot.send_photo(chat_id, chart.file_id, caption=chart.caption)
+        return True
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+price_charts = PriceChartService()
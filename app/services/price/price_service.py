@@ -1,16 +1,51 @@
 import asyncio
 import json
+import time
+from typing import Callable, List
 import websockets
+from app.utils.logging import get_logger
+from app.utils.metrics import price_feed_errors, price_last, price_last_tick, price_listener_errors, price_ticks
+
+logger = get_logger(__name__)
 
 # Shared global variable to store latest gold price
 _latest_gold_price = 0  # fallback initial price
 
+# Callbacks invoked synchronously on every tick; they must not block.
+_price_listeners: List[Callable[[float], None]] = []
+
 async def get_current_price() -> float:
     """Return the latest gold price."""
     return _latest_gold_price
 
-async def _websocket_price_updater():
+def add_price_listener(listener: Callable[[float], None]) -> None:
+    """Register a callback that receives every new gold price."""
+    if listener not in _price_listeners:
+        _price_listeners.append(listener)
+
+def remove_price_listener(listener: Callable[[float], None]) -> None:
+    if listener in _price_listeners:
+        _price_listeners.remove(listener)
+
+def _notify_price_listeners(price: float) -> None:
+    for listener in _price_listeners:
+        try:
+            listener(price)
+        except Exception as e:
+            # A faulty listener must never break the feed
+            price_listener_errors.inc()
+            logger.error("Price listener %s failed: %s", listener, e)
+
+def publish_price(price: float) -> None:
+    """Make `price` the latest gold price and pass it to the listeners."""
     global _latest_gold_price
+    _latest_gold_price = price
+    price_ticks.inc()
+    price_last.set(price)
+    price_last_tick.set(time.time())
+    _notify_price_listeners(price)
+
+async def _websocket_price_updater():
     uri = "wss://api.goldvault.app/ws/live-prices"
     while True:
         try:
@@ -19,9 +54,10 @@ async def _websocket_price_updater():
                     data = json.loads(message)
                     gold = data.get("gold")
                     if gold and "price" in gold and "Bid" in gold["price"]:
-                        _latest_gold_price = float(gold["price"]["Bid"])
+                        publish_price(float(gold["price"]["Bid"]))
                         # Optional: log or print updated price
                         # print(f"[PriceUpdater] Updated gold price: {_latest_gold_price}")
         except Exception as e:
             # print(f"[PriceUpdater] Connection error: {e}. Reconnecting in 5 seconds.")
-            await asyncio.sleep(5)
\ No newline at end of file
+            price_feed_errors.inc()
+            await asyncio.sleep(5)
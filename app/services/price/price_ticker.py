@@ -0,0 +1,186 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from app.services.price.price_service import add_price_listener, get_current_price, remove_price_listener
+from app.utils.common import format_timestamp
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+WATCH_TIMEOUT = 300          # seconds a watch stays alive
+REFRESH_INTERVAL = 2.0       # seconds between render/edit rounds
+PER_CHAT_MIN_INTERVAL = 3.0  # never edit the same chat more often than this
+MAX_EDITS_PER_SECOND = 25    # stay under Telegram's global bot limit
+MAX_CONCURRENT_EDITS = 10
+
+STOP_CALLBACK = "price:stop"
+
+
+def stop_watch_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="⏹ Stop watching", callback_data=STOP_CALLBACK)]
+    ])
+
+
+@dataclass
+class PriceWatch:
+    message_id: int
+    expires_at: float
+    last_edit: float = 0.0
+    last_text: str = ""
+
+
+class PriceTicker:
+    """
+    Keeps one "live price" message per chat up to date.
+
+    Price ticks only store the latest value. Every REFRESH_INTERVAL the ticker
+    renders the text once and pushes it to the watchers that are due, oldest
+    first, within a global edit budget, so thousands of watchers share one
+    render per interval and any number of ticks in between collapse into a
+    single edit per chat.
+    """
+
+    def __init__(
+        self,
+        watch_timeout: int = WATCH_TIMEOUT,
+        refresh_interval: float = REFRESH_INTERVAL,
+        per_chat_interval: float = PER_CHAT_MIN_INTERVAL,
+        max_edits_per_second: int = MAX_EDITS_PER_SECOND,
+    ):
+        self.watch_timeout = watch_timeout
+        self.refresh_interval = refresh_interval
+        self.per_chat_interval = per_chat_interval
+        self.max_edits_per_second = max_edits_per_second
+        # chat_id -> watch; least recently edited first
+        self._watches: "OrderedDict[int, PriceWatch]" = OrderedDict()
+        self._price: float = 0.0
+        self._rendered_price: Optional[float] = None
+        self._text: str = ""
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENT_EDITS)
+
+    def __len__(self) -> int:
+        return len(self._watches)
+
+    def on_price(self, price: float) -> None:
+        """Price listener: O(1), just remembers the latest tick."""
+        self._price = price
+
+    async def watch(self, bot: Bot, chat_id: int) -> None:
+        """Post the ticker message in a chat, replacing any earlier one."""
+        previous = self._watches.pop(chat_id, None)
+        if previous:
+            await self._safe_edit(bot, chat_id, previous.message_id, "⏹ Price watch moved to a newer message.", markup=None)
+
+        if not self._price:
+            self._price = await get_current_price()
+        text = self._render()
+        message = await bot.send_message(chat_id, text, reply_markup=stop_watch_keyboard())
+        now = time.monotonic()
+        self._watches[chat_id] = PriceWatch(
+            message_id=message.message_id,
+            expires_at=now + self.watch_timeout,
+            last_edit=now,
+            last_text=text,
+        )
+        logger.info("Price watch started for chat %s (%s active)", chat_id, len(self._watches))
+
+    async def stop(self, bot: Bot, chat_id: int, reason: str = "⏹ Price watch stopped.") -> bool:
+        watch = self._watches.pop(chat_id, None)
+        if not watch:
+            return False
+        await self._safe_edit(bot, chat_id, watch.message_id, f"{watch.last_text}\n\n{reason}", markup=None)
+        return True
+
+    async def run(self, bot: Bot) -> None:
+        """Background loop refreshing all watchers."""
+        add_price_listener(self.on_price)
+        logger.info("Price ticker started")
+        try:
+            while True:
+                await asyncio.sleep(self.refresh_interval)
+                try:
+                    await self._refresh(bot)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error("Price ticker refresh failed: %s", e)
+        finally:
+            remove_price_listener(self.on_price)
+
+    def _render(self) -> str:
+        if self._rendered_price != self._price:
+            self._rendered_price = self._price
+            if self._price <= 0:
+                self._text = "⚠️ Current gold price is temporarily unavailable."
+            else:
+                self._text = (
+                    f"📊 Live Gold Price: ${self._price:.2f} per gram\n"
+                    f"Updated: {format_timestamp(int(time.time()))}"
+                )
+        return self._text
+
+    async def _refresh(self, bot: Bot) -> None:
+        if not self._watches:
+            return
+        now = time.monotonic()
+
+        expired = [chat_id for chat_id, w in self._watches.items() if w.expires_at <= now]
+        for chat_id in expired:
+            await self.stop(bot, chat_id, reason="⏹ Price watch ended. Send \"Watch Price\" to start again.")
+
+        text = self._render()
+        budget = int(self.max_edits_per_second * self.refresh_interval)
+        due = []
+        for chat_id, watch in self._watches.items():
+            if len(due) >= budget:
+                break
+            if watch.last_text != text and now - watch.last_edit >= self.per_chat_interval:
+                due.append(chat_id)
+        if not due:
+            return
+
+        for chat_id in due:
+            watch = self._watches[chat_id]
+            watch.last_edit = now
+            watch.last_text = text
+            # Rotate to the back so chats that could not be served this round go first next time
+            self._watches.move_to_end(chat_id)
+
+        await asyncio.gather(*(self._edit_watch(bot, chat_id, text) for chat_id in due))
+
+    async def _edit_watch(self, bot: Bot, chat_id: int, text: str) -> None:
+        watch = self._watches.get(chat_id)
+        if not watch:
+            return
+        if not await self._safe_edit(bot, chat_id, watch.message_id, text, markup=stop_watch_keyboard()):
+            self._watches.pop(chat_id, None)
+
+    async def _safe_edit(self, bot: Bot, chat_id: int, message_id: int, text: str, markup) -> bool:
+        """Edit a ticker message. Returns False if the watch should be dropped."""
+        async with self._semaphore:
+            try:
+                await bot.edit_message_text(text=text, chat_id=chat_id, message_id=message_id, reply_markup=markup)
+                return True
+            except TelegramRetryAfter as e:
+                logger.warning("Price ticker rate limited, backing off %ss", e.retry_after)
+                await asyncio.sleep(e.retry_after)
+                return True
+            except TelegramBadRequest as e:
+                if "message is not modified" in str(e):
+                    return True
+                logger.info("Dropping price watch for chat %s: %s", chat_id, e)
+                return False
+            except TelegramForbiddenError:
+                return False
+            except Exception as e:
+                logger.error("Price ticker edit failed for chat %s: %s", chat_id, e)
+                return True
+
+
+price_ticker = PriceTicker()
@@ -0,0 +1,102 @@
+import asyncio
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+from app.utils.common import generate_uuid
+from app.utils.logging import get_logger
+from app.utils.timer_wheel import TimerWheel
+
+logger = get_logger(__name__)
+
+QUOTE_TTL = 10  # seconds; the buy/sell flows tell users a price is valid this long
+
+
+@dataclass
+class Quote:
+    quote_id: str
+    user_uuid: str
+    side: str  # "BUY" or "SELL"
+    grams: float
+    price: float
+    expires_at: float  # time.monotonic()
+
+
+class QuoteService:
+    """
+    Short-lived price quotes for the buy and sell flows.
+
+    A quote locks the price shown to the user under an id kept in the FSM
+    state. Confirming redeems the id: one dict pop plus a clock comparison,
+    no price or database lookup. Expired quotes are rejected on redeem even
+    if they are still in memory; a single background task advances a timer
+    wheel once per second to evict them, so there is no task or callback
+    per quote.
+    """
+
+    def __init__(self, ttl: float = QUOTE_TTL, tick_seconds: float = 1.0):
+        self.ttl = ttl
+        self.tick_seconds = tick_seconds
+        self._quotes: Dict[str, Quote] = {}
+        self._wheel = TimerWheel()
+        self._started_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._quotes)
+
+    async def issue(self, user_uuid: str, side: str, grams: float, price: float) -> Quote:
+        """Lock `price` for `grams` for the next `ttl` seconds."""
+        quote = Quote(
+            quote_id=await generate_uuid(),
+            user_uuid=user_uuid,
+            side=side,
+            grams=grams,
+            price=price,
+            expires_at=time.monotonic() + self.ttl,
+        )
+        self._quotes[quote.quote_id] = quote
+        # One tick of slack: the wheel lags the clock by up to a tick
+        self._wheel.schedule(quote.quote_id, math.ceil(self.ttl / self.tick_seconds) + 1)
+        return quote
+
+    def peek(self, quote_id: Optional[str], user_uuid: str, side: str) -> Optional[Quote]:
+        """The quote if it is still valid for this user and side, without using it up."""
+        quote = self._quotes.get(quote_id) if quote_id else None
+        if quote is None or quote.user_uuid != user_uuid or quote.side != side:
+            return None
+        if time.monotonic() >= quote.expires_at:
+            return None
+        return quote
+
+    def redeem(self, quote_id: Optional[str], user_uuid: str, side: str) -> Optional[Quote]:
+        """Use up a quote. Returns None if it is unknown, expired or not this user's."""
+        quote = self.peek(quote_id, user_uuid, side)
+        if quote is None:
+            return None
+        del self._quotes[quote_id]
+        self._wheel.cancel(quote_id)
+        return quote
+
+    def remaining(self, quote: Quote) -> float:
+        """Seconds left before `quote` expires."""
+        return max(0.0, quote.expires_at - time.monotonic())
+
+    def _evict_expired(self) -> int:
+        target_tick = int((time.monotonic() - self._started_at) / self.tick_seconds)
+        expired = self._wheel.advance(target_tick - self._wheel.now)
+        for quote_id, _ in expired:
+            self._quotes.pop(quote_id, None)
+        return len(expired)
+
+    async def run(self) -> None:
+        """Background loop evicting expired quotes."""
+        logger.info("Quote service started (ttl=%ss)", self.ttl)
+        while True:
+            await asyncio.sleep(self.tick_seconds)
+            try:
+                self._evict_expired()
+            except Exception as e:
+                logger.error("Quote eviction tick failed: %s", e)
+
+
+quote_service = QuoteService()
@@ -0,0 +1,204 @@
+"""
+Append-only columnar store of raw price ticks.
+
+Every tick from the price feed is kept in one pair of files per UTC day
+under `TICKS.PATH`:
+
+    2026-10-19.t.u32   uint32 milliseconds since that day's 00:00 UTC
+    2026-10-19.p.f64   float64 bid price
+
+Timestamps are delta-encoded against the day's start (frame of reference),
+so they take 4 bytes instead of 8 and stay directly searchable: they are
+non-decreasing, and a range lookup is one `searchsorted` per bound. Rows
+are only ever appended, so the two columns share row numbers. A crash
+between the two writes leaves one column longer: readers only use the rows
+both have, and before the first append to a day's files in a process the
+writer cuts both back to that length, so later rows line up again.
+
+The price listener only appends to in-memory buffers, and a day's buffer
+is set aside when the day rolls over; `run()` writes them out once per
+`TICKS.FLUSH_INTERVAL` on the store's single writer thread, so the feed
+never waits on the disk and chunks reach the files in the order they were
+taken. Reads memory-map the day files and return NumPy views
+into them, nothing is copied until a caller asks for absolute timestamps.
+
+    for day in tick_store.query(start_ts, end_ts):
+        day.prices                # float64 view into the mmap
+        day.timestamps_ms()       # int64 epoch milliseconds (a new array)
+"""
+import asyncio
+import os
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+from app.utils.config import settings
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+DAY_MS = 86_400_000
+TIME_SUFFIX = ".t.u32"
+PRICE_SUFFIX = ".p.f64"
+
+
+class TickSlice:
+    """Ticks of one day within a queried range; `offsets_ms` and `prices` are views into the day's files."""
+
+    __slots__ = ("day", "base_ms", "offsets_ms", "prices")
+
+    def __init__(self, day: str, base_ms: int, offsets_ms: np.ndarray, prices: np.ndarray):
+        self.day = day
+        self.base_ms = base_ms
+        self.offsets_ms = offsets_ms
+        self.prices = prices
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def timestamps_ms(self) -> np.ndarray:
+        return self.offsets_ms.astype(np.int64) + self.base_ms
+
+
+def _day_of(ts_ms: int) -> Tuple[str, int]:
+    """(YYYY-MM-DD, day start in epoch ms) of the UTC day containing `ts_ms`."""
+    base_ms = ts_ms - ts_ms % DAY_MS
+    return datetime.fromtimestamp(base_ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d"), base_ms
+
+
+class TickStore:
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._day: Optional[str] = None
+        self._base_ms = 0
+        self._last_offset = 0
+        self._offsets = array("I")
+        self._prices = array("d")
+        # Days whose files the writer thread has trimmed to whole, matching rows
+        self._aligned: Set[str] = set()
+        # (day, chunk) taken from the buffers and not handed to the writer yet
+        self._pending: List[Tuple[str, Tuple[bytes, bytes]]] = []
+        # One thread, so writes never overlap and keep their order; started on the first flush
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tick-writer")
+        # day -> (rows mapped, offsets, prices); today's maps are replaced as the files grow
+        self._maps: Dict[str, Tuple[int, np.ndarray, np.ndarray]] = {}
+
+    # --- writing -----------------------------------------------------------
+
+    def append(self, price: float, ts_ms: Optional[int] = None) -> None:
+        """Buffer a tick; written by the next flush."""
+        if ts_ms is None:
+            ts_ms = time.time_ns() // 1_000_000
+        if ts_ms >= self._base_ms + DAY_MS or self._day is None:
+            if self._offsets:
+                self._pending.append((self._day, self._take()))
+            self._day, self._base_ms = _day_of(ts_ms)
+            self._last_offset = 0
+        # Keep the column sorted if the clock steps back
+        offset = max(ts_ms - self._base_ms, self._last_offset)
+        self._last_offset = offset
+        self._offsets.append(offset)
+        self._prices.append(price)
+
+    def on_price(self, price: float) -> None:
+        """Price listener."""
+        self.append(price)
+
+    def _take(self) -> Tuple[bytes, bytes]:
+        chunk = (self._offsets.tobytes(), self._prices.tobytes())
+        self._offsets = array("I")
+        self._prices = array("d")
+        return chunk
+
+    def _align(self, day: str) -> None:
+        """Cut a day's columns back to the rows both hold in full, e.g. after a crash mid-write."""
+        time_file = self.path / f"{day}{TIME_SUFFIX}"
+        price_file = self.path / f"{day}{PRICE_SUFFIX}"
+        time_size = time_file.stat().st_size if time_file.exists() else 0
+        price_size = price_file.stat().st_size if price_file.exists() else 0
+        rows = min(time_size // 4, price_size // 8)
+        if time_size != rows * 4 or price_size != rows * 8:
+            logger.warning("Tick store: trimming %s to %s rows (columns held %s and %s bytes)",
+                           day, rows, time_size, price_size)
+            for file, size in ((time_file, rows * 4), (price_file, rows * 8)):
+                if file.exists():
+                    os.truncate(file, size)
+
+    def _write(self, day: str, chunk: Tuple[bytes, bytes]) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        if day not in self._aligned:
+            self._align(day)
+            self._aligned.add(day)
+        offsets, prices = chunk
+        with open(self.path / f"{day}{TIME_SUFFIX}", "ab") as f:
+            f.write(offsets)
+        with open(self.path / f"{day}{PRICE_SUFFIX}", "ab") as f:
+            f.write(prices)
+
+    def _write_chunks(self, chunks: List[Tuple[str, Tuple[bytes, bytes]]]) -> None:
+        for day, chunk in chunks:
+            self._write(day, chunk)
+
+    async def flush(self) -> None:
+        """Hand everything buffered so far to the writer thread and wait until it is on disk."""
+        if self._offsets:
+            self._pending.append((self._day, self._take()))
+        if not self._pending:
+            return
+        chunks, self._pending = self._pending, []
+        await asyncio.get_running_loop().run_in_executor(self._writer, self._write_chunks, chunks)
+
+    async def run(self) -> None:
+        """Background loop writing buffered ticks to disk."""
+        logger.info("Tick store writing to %s", self.path)
+        try:
+            while True:
+                await asyncio.sleep(settings.TICKS.FLUSH_INTERVAL)
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.error("Tick store flush failed: %s", e)
+        finally:
+            # Queued behind any write still running from a cancelled flush
+            await self.flush()
+
+    # --- reading -----------------------------------------------------------
+
+    def _map(self, day: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        time_file = self.path / f"{day}{TIME_SUFFIX}"
+        price_file = self.path / f"{day}{PRICE_SUFFIX}"
+        try:
+            rows = min(time_file.stat().st_size // 4, price_file.stat().st_size // 8)
+        except FileNotFoundError:
+            return None
+        if rows == 0:
+            return None
+        cached = self._maps.get(day)
+        if cached is None or cached[0] != rows:
+            offsets = np.memmap(time_file, dtype=np.uint32, mode="r", shape=(rows,))
+            prices = np.memmap(price_file, dtype=np.float64, mode="r", shape=(rows,))
+            cached = self._maps[day] = (rows, offsets, prices)
+        return cached[1], cached[2]
+
+    def query(self, start_ts: float, end_ts: float) -> List[TickSlice]:
+        """Ticks with start_ts <= time < end_ts (epoch seconds), one slice per UTC day, oldest first."""
+        start_ms, end_ms = int(start_ts * 1000), int(end_ts * 1000)
+        slices = []
+        day_ms = start_ms - start_ms % DAY_MS
+        while day_ms < end_ms:
+            day, base_ms = _day_of(day_ms)
+            mapped = self._map(day)
+            if mapped is not None:
+                offsets, prices = mapped
+                lo = np.searchsorted(offsets, max(start_ms - base_ms, 0), side="left")
+                hi = np.searchsorted(offsets, min(end_ms - base_ms, DAY_MS), side="left")
+                if hi > lo:
+                    slices.append(TickSlice(day, base_ms, offsets[lo:hi], prices[lo:hi]))
+            day_ms += DAY_MS
+        return slices
+
+
+tick_store = TickStore(settings.TICKS.PATH)
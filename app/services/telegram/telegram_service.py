@@ -2,6 +2,7 @@
 from time import time
 from typing import Any, Dict, Optional
 from app.db.mongo.helper import MongoHelper
+from app.services.user.user_service import UserService
 from app.utils.config import settings
 from app.utils.logging import get_logger, setup_logging
 
@@ -44,6 +45,7 @@ class TelegramService:
         )
 
         if modified_count > 0:
+            UserService.invalidate_auth_cache(telegram_id)
             return await MongoHelper.find_one(
                 collection=settings.DB_TABLE.USERS,
                 query={"uuid": user_id}
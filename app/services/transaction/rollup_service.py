@@ -0,0 +1,172 @@
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+from pymongo import UpdateOne
+from app.db.mongo.helper import MongoHelper
+from app.utils.common import IST
+from app.utils.config import settings
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Summed fields of a DailyRollup document (app/models/daily_rollup.py)
+ROLLUP_TOTALS = ("trades", "buy_grams", "sell_grams", "notional", "realized_pnl")
+
+
+class DailyRollupService:
+    """
+    Per-user trading totals per IST calendar day.
+
+    One small document per user and day is bumped with `$inc` as trades
+    execute, in the same Mongo transaction as the trade, so the history views
+    read at most a handful of documents for a day or a week instead of
+    scanning and counting raw transactions. `backfill` rebuilds them from the
+    transactions.
+    """
+
+    @staticmethod
+    def day_of(ts: int) -> str:
+        return datetime.fromtimestamp(ts, tz=IST).strftime("%Y-%m-%d")
+
+    @staticmethod
+    def day_bounds(days_ago: int, days: int = 1) -> Tuple[int, int]:
+        """[start_ts, end_ts) of `days` IST days, ending with the day `days_ago` days before today."""
+        today = datetime.now(IST).replace(hour=0, minute=0, second=0, microsecond=0)
+        end = today - timedelta(days=days_ago - 1)
+        start = end - timedelta(days=days)
+        return int(start.timestamp()), int(end.timestamp())
+
+    @staticmethod
+    def opening_trade(txn: Dict[str, Any]) -> Dict[str, float]:
+        """Increments for a newly opened BUY or SELL transaction."""
+        if (txn.get("buy_grams") or 0) > 0:
+            grams, price, side = txn["buy_grams"], txn.get("buy_price") or 0, "buy_grams"
+        else:
+            grams, price, side = txn.get("sell_grams") or 0, txn.get("sell_price") or 0, "sell_grams"
+        return {"trades": 1, side: grams, "notional": grams * price}
+
+    @staticmethod
+    def closing_trade(position: Dict[str, Any], price: float, pnl: float) -> Dict[str, float]:
+        """Increments for closing `position` (transaction layout) at `price`."""
+        if (position.get("buy_price") or 0) > 0:
+            grams, side = position.get("buy_grams") or 0, "sell_grams"
+        else:
+            grams, side = position.get("sell_grams") or 0, "buy_grams"
+        return {"trades": 1, side: grams, "notional": grams * price, "realized_pnl": pnl}
+
+    @staticmethod
+    async def record(trades: List[Tuple[str, int, Dict[str, float]]], session=None) -> None:
+        """
+        Add (user_uuid, executed_at, increments) trades to their daily rollups.
+
+        Trades falling on the same user and day are combined, so a bulk close
+        is one upsert per user rather than one per position. Pass the session
+        of the trade's MongoHelper.transaction() so both commit together.
+        """
+        combined: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(lambda: defaultdict(int))
+        for user_uuid, executed_at, increments in trades:
+            totals = combined[(user_uuid, DailyRollupService.day_of(executed_at))]
+            for field, value in increments.items():
+                totals[field] += value
+        now = int(time.time())
+        await MongoHelper.bulk_write(
+            settings.DB_TABLE.DAILY_ROLLUPS,
+            [
+                UpdateOne(
+                    {"user_id": user_uuid, "day": day},
+                    {"$inc": dict(totals), "$set": {"updated_at": now}},
+                    upsert=True,
+                )
+                for (user_uuid, day), totals in combined.items()
+            ],
+            session=session,
+        )
+
+    @staticmethod
+    async def summary(user_uuid: str, start_ts: int, end_ts: int) -> Dict[str, float]:
+        """Totals over the IST days from `start_ts` up to, not including, `end_ts`."""
+        rollups = await MongoHelper.find_many(
+            collection=settings.DB_TABLE.DAILY_ROLLUPS,
+            query={
+                "user_id": user_uuid,
+                "day": {"$gte": DailyRollupService.day_of(start_ts), "$lte": DailyRollupService.day_of(end_ts - 1)},
+            },
+            projection={"_id": 0},
+            limit=(end_ts - start_ts) // 86400 + 2,
+        )
+        totals = dict.fromkeys(ROLLUP_TOTALS, 0)
+        for rollup in rollups:
+            for field in ROLLUP_TOTALS:
+                totals[field] += rollup.get(field) or 0
+        return totals
+
+    @staticmethod
+    def _transaction_trades(txn: Dict[str, Any]) -> List[Tuple[int, Dict[str, float]]]:
+        """(executed_at, increments) of the opening and, once closed, the closing leg of a transaction."""
+        legs = sorted(
+            (txn.get(f"{side}_at") or 0, side) for side in ("buy", "sell") if (txn.get(f"{side}_grams") or 0) > 0
+        )
+        if txn.get("status") != "CLOSED":
+            legs = legs[:1]
+        trades = []
+        for closing, (executed_at, side) in enumerate(legs):
+            grams, price = txn[f"{side}_grams"], txn.get(f"{side}_price") or 0
+            increments = {"trades": 1, f"{side}_grams": grams, "notional": grams * price}
+            if closing:
+                increments["realized_pnl"] = txn.get("pnl") or 0
+            trades.append((executed_at, increments))
+        return trades
+
+    @staticmethod
+    async def backfill(page_size: int = 1000) -> int:
+        """
+        Rebuild every daily rollup from the transactions collection.
+
+        The totals are set rather than incremented, so this can be re-run, but
+        trades executing meanwhile would be overwritten: run it with the bot
+        stopped. Returns the number of rollups written.
+        """
+        combined: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(lambda: dict.fromkeys(ROLLUP_TOTALS, 0))
+        query: Dict[str, Any] = {}
+        while True:
+            page = await MongoHelper.find_many(
+                collection=settings.DB_TABLE.TRANSACTIONS,
+                query=query,
+                sort=[("_id", 1)],
+                limit=page_size,
+            )
+            for txn in page:
+                for executed_at, increments in DailyRollupService._transaction_trades(txn):
+                    totals = combined[(txn["user_id"], DailyRollupService.day_of(executed_at))]
+                    for field, value in increments.items():
+                        totals[field] += value
+            if len(page) < page_size:
+                break
+            query = {"_id": {"$gt": page[-1]["_id"]}}
+
+        now = int(time.time())
+        ops = [
+            UpdateOne({"user_id": user_uuid, "day": day}, {"$set": {**totals, "updated_at": now}}, upsert=True)
+            for (user_uuid, day), totals in combined.items()
+        ]
+        for start in range(0, len(ops), page_size):
+            await MongoHelper.bulk_write(settings.DB_TABLE.DAILY_ROLLUPS, ops[start:start + page_size])
+        logger.info("Backfilled %s daily rollups", len(ops))
+        return len(ops)
+
+
+if __name__ == "__main__":
+    # One-off: python -m app.services.transaction.rollup_service
+    import asyncio
+    from app.db.mongo.mongodb import close_mongodb_connection, connect_to_mongodb, ensure_unique_indexes
+
+    async def main():
+        await connect_to_mongodb()
+        try:
+            await ensure_unique_indexes()
+            await DailyRollupService.backfill()
+        finally:
+            await close_mongodb_connection()
+
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+import csv
+import io
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, List
+from aiogram import Bot
+from aiogram.types import InputFile
+from app.db.mongo.helper import MongoHelper
+from app.services.transaction.transaction_service import TransactionService
+from app.utils.common import IST, format_timestamp
+from app.utils.config import settings
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+CHUNK_SIZE = 64 * 1024  # bytes of CSV handed on at a time
+
+STATEMENT_COLUMNS = [
+    "id", "type", "status",
+    "buy_at", "buy_grams", "buy_price", "buy_price_type",
+    "sell_at", "sell_grams", "sell_price", "sell_price_type",
+    "pnl", "updated_at",
+]
+TIMESTAMP_COLUMNS = {"buy_at", "sell_at", "updated_at"}
+
+STATEMENT_PROJECTION = {
+    "_id": 0, "uuid": 1,
+    "buy_at": 1, "buy_grams": 1, "buy_price": 1, "buy_price_type": 1,
+    "sell_at": 1, "sell_grams": 1, "sell_price": 1, "sell_price_type": 1,
+    "status": 1, "pnl": 1, "updated_at": 1,
+}
+
+
+class StatementService:
+    """
+    Trade statements as CSV, optionally gzipped.
+
+    Each stage is an async generator: Mongo cursor -> rows -> CSV chunks ->
+    (gzip) chunks, so only one cursor batch and one chunk are held in memory
+    whatever the size of the user's history.
+    """
+
+    @staticmethod
+    def _query(user_uuid: str, start_ts: int, end_ts: int) -> dict:
+        return {"user_id": user_uuid, "updated_at": {"$gte": start_ts, "$lt": end_ts}}
+
+    @staticmethod
+    async def has_transactions(user_uuid: str, start_ts: int, end_ts: int) -> bool:
+        found = await MongoHelper.find_one(
+            collection=settings.DB_TABLE.TRANSACTIONS,
+            query=StatementService._query(user_uuid, start_ts, end_ts),
+            projection={"_id": 1},
+        )
+        return found is not None
+
+    @staticmethod
+    async def rows(user_uuid: str, start_ts: int, end_ts: int) -> AsyncIterator[List]:
+        """One list of column values per transaction, oldest first."""
+        async for tx in MongoHelper.iterate(
+            collection=settings.DB_TABLE.TRANSACTIONS,
+            query=StatementService._query(user_uuid, start_ts, end_ts),
+            sort=[("updated_at", 1)],
+            projection=STATEMENT_PROJECTION,
+        ):
+            fields = TransactionService.summary_fields(tx)
+            yield [
+                format_timestamp(fields[c]) if c in TIMESTAMP_COLUMNS and fields[c] else fields[c]
+                for c in STATEMENT_COLUMNS
+            ]
+
+    @staticmethod
+    async def csv_chunks(rows: AsyncIterator[List], chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(STATEMENT_COLUMNS)
+        async for row in rows:
+            writer.writerow(row)
+            if buffer.tell() >= chunk_size:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate(0)
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+
+    @staticmethod
+    async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+        async for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+    @staticmethod
+    def stream(user_uuid: str, start_ts: int, end_ts: int, compress: bool = False) -> AsyncIterator[bytes]:
+        chunks = StatementService.csv_chunks(StatementService.rows(user_uuid, start_ts, end_ts))
+        return StatementService.gzip_chunks(chunks) if compress else chunks
+
+
+class StatementFile(InputFile):
+    """Telegram upload that pulls the statement straight from the pipeline."""
+
+    def __init__(self, user_uuid: str, start_ts: int, end_ts: int, compress: bool = False):
+        start = datetime.fromtimestamp(start_ts, tz=IST).strftime("%Y%m%d")
+        end = datetime.fromtimestamp(end_ts - 1, tz=IST).strftime("%Y%m%d")
+        super().__init__(filename=f"statement_{start}_{end}.csv" + (".gz" if compress else ""))
+        self.user_uuid = user_uuid
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+        self.compress = compress
+
+    async def read(self, bot: Bot) -> AsyncIterator[bytes]:
+        async for chunk in StatementService.stream(self.user_uuid, self.start_ts, self.end_ts, self.compress):
+            yield chunk
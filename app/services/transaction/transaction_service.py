@@ -2,7 +2,8 @@
 
 import time
 from app.db.mongo.helper import MongoHelper
-from app.models.transaction import Transaction, TxStatus
+from app.models.records import TransactionRecord
+from app.models.transaction import TxStatus
 from app.utils.common import generate_uuid
 from app.utils.config import settings
 from app.utils.logging import get_logger, setup_logging
@@ -11,6 +12,30 @@ logger = get_logger(__name__)
 
 class TransactionService:
 
+    @staticmethod
+    def summary_fields(tx: dict) -> dict:
+        """
+        Normalised display fields of a transaction document, shared by the
+        transactions list and the statement export.
+        """
+        is_buy = (tx.get("buy_grams") or 0) > 0
+        is_sell = (tx.get("sell_grams") or 0) > 0
+        return {
+            "id": tx.get("uuid"),
+            "type": "BUY" if is_buy and not is_sell else "SELL" if is_sell and not is_buy else "MIXED",
+            "status": (tx.get("status") or "N/A").capitalize(),
+            "buy_at": tx.get("buy_at") or None,
+            "buy_grams": tx.get("buy_grams") or 0,
+            "buy_price": tx.get("buy_price") or 0,
+            "buy_price_type": tx.get("buy_price_type") or "",
+            "sell_at": tx.get("sell_at") or None,
+            "sell_grams": tx.get("sell_grams") or 0,
+            "sell_price": tx.get("sell_price") or 0,
+            "sell_price_type": tx.get("sell_price_type") or "",
+            "pnl": tx.get("pnl") or 0,
+            "updated_at": tx.get("updated_at"),
+        }
+
     @staticmethod
     async def create_transaction(payload: dict) -> dict:
         """
@@ -46,7 +71,7 @@ class TransactionService:
                 if not status:
                     status = TxStatus.OPEN if price_type == "MARKET" else TxStatus.PENDING
 
-                txn = Transaction(
+                txn = TransactionRecord(
                     uuid=await generate_uuid(),
                     user_id=user_id,
                     buy_at=payload.get("buy_at", now_ts),
@@ -73,7 +98,7 @@ class TransactionService:
                 if not status:
                     status = TxStatus.OPEN if price_type == "MARKET" else TxStatus.PENDING
 
-                txn = Transaction(
+                txn = TransactionRecord(
                     uuid=await generate_uuid(),
                     user_id=user_id,
                     buy_at=0,
@@ -93,10 +118,10 @@ class TransactionService:
             else:
                 raise ValueError("Payload must contain buy_price or sell_price for a valid transaction.")
 
-            doc = txn.model_dump()
+            doc = txn.to_doc()
             await MongoHelper.insert_one(collection=settings.DB_TABLE.TRANSACTIONS, document=doc)
             logger.info("Transaction created: %s", doc["uuid"])
             return doc
     
         except Exception as e:
-            logger.error(f"Error while creating transaction: {str(e)}")
\ No newline at end of file
+            logger.error("Error while creating transaction: %s", e)
\ No newline at end of file
@@ -1,7 +1,7 @@
 import secrets
 import time
-from typing import Dict, Any
-from app.models.user import UserLink
+from typing import Dict, Any, Optional, Tuple
+from app.models.records import UserLinkRecord
 from app.db.mongo.helper import MongoHelper
 from app.utils.common import generate_uuid
 from app.utils.config import settings
@@ -9,6 +9,11 @@ from app.utils.logging import get_logger
 
 logger = get_logger(__name__)
 
+AUTH_CACHE_TTL = 60  # seconds; approval changes are picked up within this window
+
+# telegram_id -> (expires_at, auth context)
+_auth_cache: Dict[int, Tuple[float, Dict[str, Any]]] = {}
+
 class UserService:
     @staticmethod
     async def create_telegram_user(
@@ -46,13 +51,14 @@ class UserService:
                         query={"telegram_id": telegram_id},
                         update={"$set": update_fields}
                     )
+                    UserService.invalidate_auth_cache(telegram_id)
                     logger.info("Updated user fields for telegram_id %s: %s", telegram_id, update_fields)
 
                 return {**existing, **update_fields}
 
             # Create user if not exists
             link_code = secrets.token_hex(4)
-            user = UserLink(
+            user = UserLinkRecord(
                 uuid=await generate_uuid(),
                 telegram_id=telegram_id,
                 username=username,
@@ -64,12 +70,13 @@ class UserService:
                 phone_number=phone_number
             )
 
-            doc = user.model_dump(exclude_none=True)
+            doc = user.to_doc(exclude_none=True)
 
             if doc.get("email") is None:
                 doc.pop("email", None)
 
             await MongoHelper.insert_one(collection=collection, document=doc)
+            UserService.invalidate_auth_cache(telegram_id)
             logger.info("Created telegram user %s", telegram_id)
             return doc
         except Exception as e:
@@ -89,10 +96,56 @@ class UserService:
             logger.error("Error fetching user by telegram_id %s: %s", telegram_id, e)
             return None
 
+    @staticmethod
+    async def get_auth_context(telegram_id: int) -> Dict[str, Any]:
+        """
+        Resolve everything needed to authorise an update for a Telegram user.
+
+        Results (including "user not found") are cached for AUTH_CACHE_TTL
+        seconds, so a burst of updates from the same user costs one lookup.
+
+        Returns:
+            dict: user (document or None), status, is_approved, user_uuid, wallet_id.
+        """
+        now = time.monotonic()
+        cached = _auth_cache.get(telegram_id)
+        if cached and cached[0] > now:
+            return cached[1]
+
+        user = await MongoHelper.find_one(collection=settings.DB_TABLE.USERS, query={"telegram_id": telegram_id})
+        user_uuid = user.get("uuid") if user else None
+        wallet_id = None
+        if user_uuid:
+            wallet = await MongoHelper.find_one(
+                collection=settings.DB_TABLE.WALLETS,
+                query={"user_id": user_uuid, "status": "ACTIVE"},
+                projection={"uuid": 1},
+            )
+            wallet_id = wallet.get("uuid") if wallet else None
+
+        status = user.get("status") if user else None
+        context = {
+            "user": user,
+            "status": status,
+            "is_approved": status == "APPROVED",
+            "user_uuid": user_uuid,
+            "wallet_id": wallet_id,
+        }
+        _auth_cache[telegram_id] = (now + AUTH_CACHE_TTL, context)
+        return context
+
+    @staticmethod
+    def invalidate_auth_cache(telegram_id: Optional[int] = None) -> None:
+        """Drop the cached auth context for one user, or for everyone if no id is given."""
+        if telegram_id is None:
+            _auth_cache.clear()
+        else:
+            _auth_cache.pop(telegram_id, None)
+
     @staticmethod
     async def ensure_user_approved(message) -> bool:
         try:
-            user = await UserService.get_user_by_telegram_id(message.from_user.id)
+            user = (await UserService.get_auth_context(message.from_user.id))["user"]
             if not user:
                 await message.answer("Please send hi, hello before proceeding to any action")
                 return False
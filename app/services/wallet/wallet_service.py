@@ -1,5 +1,7 @@
 from datetime import datetime
-from app.models.wallet import Wallet
+from typing import Dict, List, Optional, Tuple
+from app.models.records import WalletLedgerEntryRecord, WalletRecord
+from app.models.wallet_ledger import WalletSnapshot
 from app.db.mongo.helper import MongoHelper
 from app.utils.common import generate_uuid
 from app.utils.config import settings
@@ -8,21 +10,25 @@ import time
 
 logger = get_logger(__name__)
 
+# A wallet snapshot is written every this many ledger entries, which bounds
+# how many entries a balance-as-of query has to add up
+LEDGER_SNAPSHOT_EVERY = 100
+
 class WalletService:
 
     @staticmethod
     async def create_wallet_for_user(user_id: str) -> dict:
 
         try:
-            logger.info(f"Creating wallet for user with id : {str(user_id)}")
+            logger.info("Creating wallet for user with id : %s", user_id)
             existing_wallet = await MongoHelper.find_one(collection=settings.DB_TABLE.WALLETS,query={"user_id": user_id, "status": "ACTIVE"})
             if existing_wallet:
-                logger.info(f"Wallet exists for user : {user_id}")
+                logger.info("Wallet exists for user : %s", user_id)
                 # Wallet already exists; return it instead of creating a new one
                 return existing_wallet
             
             now = int(time.time())
-            wallet = Wallet(
+            wallet = WalletRecord(
                 uuid=await generate_uuid(),
                 user_id=user_id,
                 currency="USD",
@@ -30,75 +36,195 @@ class WalletService:
                 updated_at=now,
             )
 
-            await MongoHelper.insert_one(collection=settings.DB_TABLE.WALLETS, document=wallet.model_dump())
-            logger.info(f"Wallet created for user : {user_id}")
-            return wallet.model_dump()
+            await MongoHelper.insert_one(collection=settings.DB_TABLE.WALLETS, document=wallet.to_doc())
+            logger.info("Wallet created for user : %s", user_id)
+            return wallet.to_doc()
         
         except Exception as e:
-            logger.error(f"Error creating wallet: str(e)")
+            logger.error("Error creating wallet: %s", e)
     @staticmethod
     async def get_wallet_for_user(telegram_id: int) -> dict:
 
         try:
-            logger.info(f"Fetching wallet details of user with telegram-id : {telegram_id}")
+            logger.info("Fetching wallet details of user with telegram-id : %s", telegram_id)
             # Translate telegram_id to user UUID if needed, or directly query by user_id field
             user = await MongoHelper.find_one(collection=settings.DB_TABLE.USERS,query={"telegram_id": telegram_id})
             if not user:
-                logger.info(f"User not found with telegram-id : {telegram_id}")
+                logger.info("User not found with telegram-id : %s", telegram_id)
                 return None
             user_id = user.get("uuid")
             if not user_id:
-                logger.info(f"User UUID not found for telegram-id : {telegram_id}")
+                logger.info("User UUID not found for telegram-id : %s", telegram_id)
                 return None
 
             # Find wallet using user UUID
             wallet = await MongoHelper.find_one(collection=settings.DB_TABLE.WALLETS, query={"user_id": user_id, "status": "ACTIVE"})
             if not wallet:
-                logger.info(f"Wallet not found for user-id : {user_id}")
+                logger.info("Wallet not found for user-id : %s", user_id)
                 return None
-            logger.info(f"Wallet found for user-id : {user_id}")
+            logger.info("Wallet found for user-id : %s", user_id)
             return wallet
         except Exception as e:
-            logger.error(f"Error while fetching wallet for user-id : {str(user_id)}")
+            logger.error("Error while fetching wallet for user-id : %s", user_id)
     
     @staticmethod
-    async def deduct_wallet_balance(user_id: str, amount: float) -> bool:
+    async def get_wallet_by_id(wallet_id: str) -> dict:
+        """Fetch an active wallet by its own UUID (as injected by AuthMiddleware)."""
+        if not wallet_id:
+            return None
+        return await MongoHelper.find_one(collection=settings.DB_TABLE.WALLETS, query={"uuid": wallet_id, "status": "ACTIVE"})
+
+    @staticmethod
+    async def deduct_wallet_balance(user_id: str, amount: float, kind: str = "DEBIT", reference: str = None,
+                                    session=None) -> bool:
         """
         Deduct a specified amount from the active wallet balance of a user.
 
         Args:
             user_id (str): The unique identifier of the user.
             amount (float): The amount to deduct from the wallet.
+            kind (str): Ledger entry kind, e.g. BUY or SELL.
+            reference (str): Transaction the deduction pays for.
+            session: Mongo session of an enclosing MongoHelper.transaction(), if any.
 
         Returns:
             bool: True if deduction was successful (enough balance), False otherwise.
-        """
-        filter_criteria = {
-            "user_id": user_id,
-            "status": "ACTIVE",
-            "balance": {"$gte": amount},  # Only proceed if balance is sufficient
-        }
-
-        update_operation = {
-            "$inc": {"balance": -amount},
-            "$set": {"updated_at": int(time.time())},
-        }
 
+        Raises:
+            Exception: Database errors, when `session` is given.
+        """
         try:
-            logger.info(f"Attempting to deduct ${amount} from user {user_id}'s wallet.")
-            modified_count = await MongoHelper.update_one(
-                collection=settings.DB_TABLE.WALLETS,
-                query=filter_criteria,
-                update=update_operation
+            logger.info("Attempting to deduct $%s from user %s's wallet.", amount, user_id)
+            wallet = await WalletService.change_balance(
+                user_id, -amount, kind, reference=reference, require_funds=True, session=session
             )
 
-            if modified_count > 0:
-                logger.info(f"Successfully deducted ${amount} from user {user_id}'s wallet.")
+            if wallet:
+                logger.info("Successfully deducted $%s from user %s's wallet.", amount, user_id)
                 return True
             else:
-                logger.warning(f"Failed to deduct ${amount} from user {user_id}'s wallet. Insufficient balance or wallet not found.")
+                logger.warning("Failed to deduct $%s from user %s's wallet. Insufficient balance or wallet not found.", amount, user_id)
                 return False
 
         except Exception as e:
-            logger.error(f"Error during wallet deduction for user {user_id}: {e}")
+            if session is not None:
+                # Let the enclosing transaction abort, and retry on a write conflict
+                raise
+            logger.error("Error during wallet deduction for user %s: %s", user_id, e)
             return False
+
+    @staticmethod
+    async def change_balance(user_id: str, amount: float, kind: str, reference: str = None,
+                             require_funds: bool = False, session=None) -> Optional[dict]:
+        """
+        Add `amount` (negative to debit) to the user's active wallet and append
+        the matching ledger entry in the same transaction.
+
+        Args:
+            require_funds (bool): Refuse the change if it would take the balance below zero.
+            session: Mongo session of an enclosing MongoHelper.transaction(), if any.
+
+        Returns:
+            dict: The wallet after the change, or None if it was not found / had insufficient funds.
+        """
+        wallets = await WalletService.change_balances(
+            [(user_id, amount, kind, reference)], require_funds=require_funds, session=session
+        )
+        return wallets.get(user_id)
+
+    @staticmethod
+    async def change_balances(changes: List[Tuple[str, float, str, Optional[str]]],
+                              require_funds: bool = False, session=None) -> Dict[str, dict]:
+        """
+        Apply several (user_id, amount, kind, reference) balance changes and
+        write all their ledger entries with one insert, in one transaction.
+
+        Returns:
+            dict: user_id -> wallet after the change, for the wallets that were changed.
+        """
+        if session is not None:
+            return await WalletService._apply_balance_changes(changes, require_funds, session)
+        return await MongoHelper.transaction(
+            lambda own_session: WalletService._apply_balance_changes(changes, require_funds, own_session)
+        )
+
+    @staticmethod
+    async def _apply_balance_changes(changes, require_funds: bool, session) -> Dict[str, dict]:
+        now = int(time.time())
+        wallets: Dict[str, dict] = {}
+        entries = []
+        snapshots = []
+        for user_id, amount, kind, reference in changes:
+            query = {"user_id": user_id, "status": "ACTIVE"}
+            if require_funds and amount < 0:
+                query["balance"] = {"$gte": -amount}
+            wallet = await MongoHelper.find_one_and_update(
+                collection=settings.DB_TABLE.WALLETS,
+                query=query,
+                update={"$inc": {"balance": amount, "ledger_seq": 1}, "$set": {"updated_at": now}},
+                session=session,
+            )
+            if not wallet:
+                continue
+            wallets[user_id] = wallet
+            seq = wallet["ledger_seq"]
+            balance = wallet["balance"]
+            entries.append(WalletLedgerEntryRecord(
+                uuid=await generate_uuid(),
+                wallet_id=wallet["uuid"],
+                user_id=user_id,
+                seq=seq,
+                kind=kind,
+                amount=amount,
+                balance_after=balance,
+                reference=reference,
+                created_at=now,
+            ).to_doc())
+            if seq == 1:
+                # First ledgered change: record the opening balance it started from
+                snapshots.append(await WalletService._snapshot(wallet, 0, balance - amount, now))
+            if seq % LEDGER_SNAPSHOT_EVERY == 0:
+                snapshots.append(await WalletService._snapshot(wallet, seq, balance, now))
+
+        await MongoHelper.insert_many(settings.DB_TABLE.WALLET_LEDGER, entries, session=session)
+        await MongoHelper.insert_many(settings.DB_TABLE.WALLET_SNAPSHOTS, snapshots, session=session)
+        return wallets
+
+    @staticmethod
+    async def _snapshot(wallet: dict, seq: int, balance: float, taken_at: int) -> dict:
+        return WalletSnapshot(
+            uuid=await generate_uuid(),
+            wallet_id=wallet["uuid"],
+            user_id=wallet["user_id"],
+            seq=seq,
+            balance=balance,
+            taken_at=taken_at,
+        ).model_dump()
+
+    @staticmethod
+    async def balance_as_of(wallet_id: str, as_of: int) -> Optional[float]:
+        """
+        Wallet balance at unix time `as_of`: the latest snapshot taken by then
+        plus the (fewer than LEDGER_SNAPSHOT_EVERY) ledger entries after it.
+
+        Returns:
+            float, or None if the wallet has no ledger history that far back.
+        """
+        snapshots = await MongoHelper.find_many(
+            collection=settings.DB_TABLE.WALLET_SNAPSHOTS,
+            query={"wallet_id": wallet_id, "taken_at": {"$lte": as_of}},
+            sort=[("seq", -1)],
+            limit=1,
+            projection={"seq": 1, "balance": 1},
+        )
+        if not snapshots:
+            return None
+        snapshot = snapshots[0]
+        entries = await MongoHelper.find_many(
+            collection=settings.DB_TABLE.WALLET_LEDGER,
+            query={"wallet_id": wallet_id, "seq": {"$gt": snapshot["seq"]}, "created_at": {"$lte": as_of}},
+            sort=[("seq", 1)],
+            limit=LEDGER_SNAPSHOT_EVERY,
+            projection={"amount": 1},
+        )
+        return snapshot["balance"] + sum(entry["amount"] for entry in entries)
@@ -1,18 +1,53 @@
-from aiogram import Bot
+from aiogram import Bot, Dispatcher
 import asyncio
+from typing import List
 from app.utils.config import settings
 from app.utils.logging import get_logger
+from app.utils.common import session_tracker
+from app.services.price.price_chart import price_charts
+from app.services.price.price_ticker import price_ticker
+from app.services.price.quote_service import quote_service
+from app.services.positions.triggers import trigger_engine
+from app.utils.background import export_executor, trade_executor
+from app.utils.startup import startup
+from app.utils.tracing import tracer
 from .dispatcher import setup_dispatcher
+from .middlewares import RequestTracingMiddleware, StartupReportMiddleware
 
 logger = get_logger(__name__)
 bot: Bot | None = None
 
+def start_background_services(bot: Bot, dp: Dispatcher) -> List[asyncio.Task]:
+    """Start the services that run next to the dispatcher; stop them with `stop_background_services`."""
+    return [
+        asyncio.create_task(session_tracker.run(bot, dp.storage)),
+        asyncio.create_task(price_ticker.run(bot)),
+        asyncio.create_task(trigger_engine.run(bot)),
+        asyncio.create_task(quote_service.run()),
+    ]
+
+
+async def stop_background_services(tasks: List[asyncio.Task]) -> None:
+    for task in tasks:
+        task.cancel()
+    price_charts.close()
+    await trade_executor.drain()
+    await export_executor.drain()
+
+
 async def start_bot_polling() -> None:
     global bot
     logger.info("Starting Telegram bot (polling)...")
     bot = Bot(token=settings.TELEGRAM.TELEGRAM_BOT_TOKEN)
+    bot.session.middleware(RequestTracingMiddleware())
     dp = setup_dispatcher()
+    bot.session.middleware(StartupReportMiddleware())
+    startup.mark("dispatcher")
+    services = start_background_services(bot, dp)
+    traces = asyncio.create_task(tracer.run())
     try:
         await dp.start_polling(bot)
     finally:
+        await stop_background_services(services)
+        traces.cancel()
         await bot.session.close()
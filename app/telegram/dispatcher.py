@@ -1,6 +1,6 @@
 from aiogram import Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
-from app.telegram.handlers.start import router as start_router
+from app.telegram.handlers.start import router as start_router, handle_registration
 from app.telegram.handlers.buy import router as buy_router
 from app.telegram.handlers.sell import router as sell_router
 from app.telegram.handlers.price import router as price_router
@@ -8,14 +8,45 @@ from app.telegram.handlers.closed_positions import router as closed_positions_ro
 from app.telegram.handlers.open_positions import router as open_positions_router
 from app.telegram.handlers.transactions import router as transactions_router
 from app.telegram.handlers.wallet import router as wallet_router
+from collections import Counter
+from app.telegram.middlewares import (
+    AuthMiddleware,
+    HandlerMetricsMiddleware,
+    HandlerTracingMiddleware,
+    LogContextMiddleware,
+    UpdateMetricsMiddleware,
+    UpdateTracingMiddleware,
+)
 from app.utils.common import InactivityMiddleware
+from app.utils.metrics import fsm_sessions
 
 
 storage = MemoryStorage() 
 
+def fsm_state_counts():
+    """(state,) -> number of chats in it, for the bot_fsm_sessions gauge."""
+    counts = Counter(record.state for record in storage.storage.values() if record.state)
+    return (((state,), count) for state, count in counts.items())
+
+fsm_sessions.collect = fsm_state_counts
+
 def setup_dispatcher() -> Dispatcher:
     dp = Dispatcher(storage=storage)
 
+    # Tag logs with the update, trace and count it, then resolve and authorise the user once, before any router filter
+    dp.update.outer_middleware(LogContextMiddleware())
+    dp.update.outer_middleware(UpdateTracingMiddleware())
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.update.outer_middleware(AuthMiddleware(on_unregistered=handle_registration))
+
+    # Handler latency; registered first so it also covers the middlewares below
+    handler_metrics = HandlerMetricsMiddleware()
+    dp.message.middleware(handler_metrics)
+    dp.callback_query.middleware(handler_metrics)
+    handler_tracing = HandlerTracingMiddleware()
+    dp.message.middleware(handler_tracing)
+    dp.callback_query.middleware(handler_tracing)
+
     # # Register inactivity timeout middleware globally
     dp.message.middleware(InactivityMiddleware())
     dp.callback_query.middleware(InactivityMiddleware())
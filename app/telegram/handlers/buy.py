@@ -5,11 +5,15 @@ from aiogram.fsm.state import StatesGroup, State
 from app.telegram.keyboards import confirm_inline
 from app.services.buy.buy_service import BuyService
 from app.services.price.price_service import get_current_price
+from app.services.price.quote_service import quote_service
+from app.db.mongo.helper import MongoHelper
 from app.services.wallet.wallet_service import WalletService
-from app.services.telegram.telegram_service import TelegramService
-from app.services.user.user_service import UserService
+from app.services.positions.position_book_service import PositionBookService
+from app.services.transaction.rollup_service import DailyRollupService
+from app.utils.background import trade_executor
 from app.utils.common import check_retry_limit, validate_fsm_data_decorator
 from app.utils.logging import get_logger, setup_logging
+from app.utils.metrics import trade_outcomes
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 router = Router()
@@ -44,8 +48,6 @@ def price_selection_keyboard(current_price: float):
 @router.message(lambda m: (m.text or "").strip().lower() == "buy gold")
 async def buy_start(msg: types.Message, state: FSMContext):
     await state.clear()
-    if not await UserService.ensure_user_approved(msg):
-        return
     await msg.answer("Enter grams to buy (e.g., 1.5):")
     await state.set_state(BuyFlow.waiting_grams)
 
@@ -67,9 +69,9 @@ async def buy_start(msg: types.Message, state: FSMContext):
 #     )
 
 @router.message(BuyFlow.waiting_grams)
-async def process_grams(msg: types.Message, state: FSMContext):
+async def process_grams(msg: types.Message, state: FSMContext, user_uuid: str):
     try:
-        logger.info(f"Taking input grams: {msg.text} from user {msg.from_user.id} for BUY")
+        logger.info("Taking input grams: %s from user %s for BUY", msg.text, msg.from_user.id)
         grams = float(msg.text.strip())
         if grams <= 0:
             raise ValueError()
@@ -89,18 +91,25 @@ async def process_grams(msg: types.Message, state: FSMContext):
     await state.update_data(wrong_grams_attempts=0)
 
     current_price = await get_current_price()
-    await state.update_data(grams=grams, current_price=current_price)
+    quote = await quote_service.issue(user_uuid, "BUY", grams, current_price)
+    await state.update_data(grams=grams, current_price=current_price, quote_id=quote.quote_id)
     await msg.answer(
-        f"Current price per gram: ${current_price:.2f}\n\n⚠️ This action is valid for 10 seconds.",
+        f"Current price per gram: ${current_price:.2f}\n\n⚠️ This price is valid for {quote_service.ttl} seconds.",
         reply_markup=price_selection_keyboard(current_price)
     )
 
 @router.callback_query(F.data == "buy:current_price")
-async def buy_current_price(call: types.CallbackQuery, state: FSMContext):
-    logger.info(f"User {call.from_user.id} selected BUY at current price")
+async def buy_current_price(call: types.CallbackQuery, state: FSMContext, user_uuid: str):
+    logger.info("User %s selected BUY at current price", call.from_user.id)
     data = await state.get_data()
-    grams = data.get("grams")
-    current_price = data.get("current_price")
+    quote = quote_service.peek(data.get("quote_id"), user_uuid, "BUY")
+    if not quote:
+        await state.clear()
+        await call.message.edit_text("⌛ This price quote has expired. Please type 'buy gold' to get a new one.")
+        await call.answer()
+        return
+    grams = quote.grams
+    current_price = quote.price
 
     total_price = grams * current_price  
 
@@ -111,63 +120,68 @@ async def buy_current_price(call: types.CallbackQuery, state: FSMContext):
         f"Quantity: {grams}g\n"
         f"Price per gram: ${current_price:.2f}\n"
         f"Total price: ${total_price:.2f}\n"
-        f"⚠️ This action is valid for 10 seconds.",
+        f"⚠️ This price is valid for {quote_service.remaining(quote):.0f} more seconds.",
         reply_markup=confirm_inline("BUY_EXECUTE")
     )
     await state.set_state(BuyFlow.waiting_confirmation)
     await call.answer()
 
 @router.callback_query(F.data.in_(["confirm:BUY_EXECUTE", "confirm:BUY_PENDING"]))
-async def confirm_buy(call: types.CallbackQuery, state: FSMContext):
+async def confirm_buy(call: types.CallbackQuery, state: FSMContext, user_uuid: str, wallet_id: str):
     telegram_id = call.from_user.id
-    logger.info(f"User {telegram_id} confirmed BUY order with action {call.data}")
+    logger.info("User %s confirmed BUY order with action %s", telegram_id, call.data)
+    # Acknowledge right away; the trade itself runs on the background executor
+    await call.answer()
+    data = await state.get_data()
+    if not data.get("quote_id"):
+        # Repeated tap after the flow was consumed; the message already shows its outcome
+        return
+    await state.clear()
+    if data.get("target_price") is None:
+        # Market order: execute at the quoted price, if the quote is still valid
+        quote = quote_service.redeem(data.get("quote_id"), user_uuid, "BUY")
+        if not quote:
+            trade_outcomes.labels("BUY", "quote_expired").inc()
+            await call.message.edit_text("⌛ This price quote has expired. Please type 'buy gold' to get a new one.")
+            return
+        data.update(grams=quote.grams, current_price=quote.price)
+    await call.message.edit_text("⏳ Executing your buy order…")
+    if not trade_executor.submit(execute_buy(call.message, telegram_id, user_uuid, wallet_id, data)):
+        await call.message.edit_text("⚠️ The system is busy right now. Please try again in a moment.")
+
+async def execute_buy(message: types.Message, telegram_id: int, user_uuid: str, wallet_id: str, data: dict):
     try:
-        data = await state.get_data()
         grams = data.get("grams")
         target_price = data.get("target_price")
         current_price = data.get("current_price")
         
-        # Step 1: Check user-link
+        # Step 1: Check wallet (user is already resolved by AuthMiddleware)
         try:
-            user = await TelegramService.get_link_for_telegram(telegram_id)
-            if not user:
-                await call.message.edit_text("🚫 Your Telegram account isn’t linked. Please link your account or contact support.")
-                await state.clear()
-                return
-            user_uuid = user.get("uuid")
-        except Exception as ex:
-            logger.error(f"User lookup failed: {ex}")
-            await call.message.edit_text("⚠️ Account lookup failed. Please try again later.")
-            await state.clear()
-            return
-
-        # Step 2: Check wallet
-        try:
-            wallet = await WalletService.get_wallet_for_user(telegram_id)
+            wallet = await WalletService.get_wallet_by_id(wallet_id)
             if not wallet:
-                await call.message.edit_text("🚫 No wallet found. Please contact support to set up your wallet.")
-                await state.clear()
+                trade_outcomes.labels("BUY", "no_wallet").inc()
+                await message.edit_text("🚫 No wallet found. Please contact support to set up your wallet.")
                 return
         except Exception as ex:
             logger.error(f"Wallet lookup failed: {ex}")
-            await call.message.edit_text("⚠️ Wallet check failed. Please try again later.")
-            await state.clear()
+            trade_outcomes.labels("BUY", "error").inc()
+            await message.edit_text("⚠️ Wallet check failed. Please try again later.")
             return
 
-        # Step 3: Check balance
+        # Step 2: Check balance
         price_per_gram = current_price if target_price is None else target_price
         total_price = grams * price_per_gram
         if wallet.get("balance", 0) < total_price:
             logger.info(f"Insufficient balance for user {user_uuid}: required {total_price}, available {wallet.get('balance', 0)}")
-            await call.message.edit_text("❌ Insufficient wallet balance. Please top up and try again.")
-            await state.clear()
+            trade_outcomes.labels("BUY", "insufficient_funds").inc()
+            await message.edit_text("❌ Insufficient wallet balance. Please top up and try again.")
             return
 
-        # Step 4: Create buy order
+        # Step 3: Create buy order
         try:
             if target_price is None:
-                logger.info(f"Creating immediate buy order for user {telegram_id}")
-                txn = await BuyService.create_buy_order_for_linked_user(telegram_id, grams)
+                logger.info("Creating immediate buy order for user %s", telegram_id)
+                txn = await BuyService.create_buy_order(user_uuid, grams, quoted_price=current_price)
                 if not txn:
                     raise RuntimeError("Failed to create buy order")
                 msg = (
@@ -178,7 +192,7 @@ async def confirm_buy(call: types.CallbackQuery, state: FSMContext):
                     f"Order ID: {txn['uuid'][:5]}"
                 )
             else:
-                txn = await BuyService.create_buy_order_for_linked_user(telegram_id, grams, custom_price=target_price)
+                txn = await BuyService.create_buy_order(user_uuid, grams, custom_price=target_price)
                 if not txn:
                     raise RuntimeError("Failed to create pending buy order")
                 msg = (
@@ -189,37 +203,54 @@ async def confirm_buy(call: types.CallbackQuery, state: FSMContext):
                 )
         except RuntimeError as ex:
             logger.error(f"BuyService error for user {telegram_id}: {ex}")
-            await call.message.edit_text("⚠️ Could not place your order at this time. Please try again.")
-            await state.clear()
+            trade_outcomes.labels("BUY", "error").inc()
+            await message.edit_text("⚠️ Could not place your order at this time. Please try again.")
             return
         except Exception as ex:
             logger.error(f"Order creation unexpected error for user {telegram_id}: {ex}")
-            await call.message.edit_text("⚠️ An unexpected error occurred while placing order. Please try again later.")
-            await state.clear()
+            trade_outcomes.labels("BUY", "error").inc()
+            await message.edit_text("⚠️ An unexpected error occurred while placing order. Please try again later.")
             return
 
-        # Step 5: Deduct funds
+        # Step 4: Deduct funds
         try:
-            wallet_deducted = await WalletService.deduct_wallet_balance(user_uuid, total_price)
+            # The trade counts towards the daily rollup in the same transaction as it is paid for
+            async def pay(session) -> bool:
+                deducted = await WalletService.deduct_wallet_balance(
+                    user_uuid, total_price, kind="BUY", reference=txn["uuid"], session=session
+                )
+                if deducted:
+                    await DailyRollupService.record(
+                        [(user_uuid, txn["updated_at"], DailyRollupService.opening_trade(txn))], session=session
+                    )
+                return deducted
+
+            wallet_deducted = await MongoHelper.transaction(pay)
             if not wallet_deducted:
-                await call.message.edit_text("❌ Insufficient wallet balance. Please top up and try again.")
-                await state.clear()
+                trade_outcomes.labels("BUY", "insufficient_funds").inc()
+                await message.edit_text("❌ Insufficient wallet balance. Please top up and try again.")
                 return
         except Exception as ex:
             logger.error(f"Wallet deduction failed for user {telegram_id}: {ex}")
-            await call.message.edit_text("⚠️ Wallet deduction failed. Please try again.")
-            await state.clear()
+            trade_outcomes.labels("BUY", "error").inc()
+            await message.edit_text("⚠️ Wallet deduction failed. Please try again.")
             return
 
+        # PENDING (target price) orders only become lots once they fill
+        if txn["status"] == "OPEN":
+            try:
+                await PositionBookService.record_open(user_uuid, txn)
+            except Exception as ex:
+                logger.error("Position book update failed for user %s: %s", user_uuid, ex)
+
         # Success
-        await call.message.edit_text(msg)
+        trade_outcomes.labels("BUY", "filled" if target_price is None else "pending").inc()
+        await message.edit_text(msg)
 
     except Exception as e:
         logger.error(f"Buy order critical failure for user {telegram_id}: {e}")
-        await call.message.edit_text("⚠️ An unexpected error occurred. Please try again later.")
-
-    await state.clear()
-    await call.answer()
+        trade_outcomes.labels("BUY", "error").inc()
+        await message.edit_text("⚠️ An unexpected error occurred. Please try again later.")
 
 
 @router.callback_query(F.data == "cancel")
@@ -227,4 +258,4 @@ async def cancel_handler(call: types.CallbackQuery, state: FSMContext):
     await call.message.edit_text("❌ Operation cancelled.")
     await state.clear()
     await call.answer()  # This is important to stop the loading spinner
-    logger.info(f"User {call.from_user.id} cancelled the operation.")
\ No newline at end of file
+    logger.info("User %s cancelled the operation.", call.from_user.id)
\ No newline at end of file
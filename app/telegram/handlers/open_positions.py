@@ -1,15 +1,19 @@
+import math
 import time
 from aiogram import Router, types, F
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from app.services.telegram.telegram_service import TelegramService
 from app.services.positions.position_service import PositionService
+from app.services.positions.position_book_service import PositionBookService
+from app.services.positions.triggers import TriggerOrder, trigger_engine
 from app.db.mongo.helper import MongoHelper
-from app.services.user.user_service import UserService
+from app.utils.background import trade_executor
 from app.utils.common import check_retry_limit
 from app.utils.config import settings
 from app.services.price.price_service import get_current_price
 from app.utils.logging import get_logger
+from app.utils.metrics import trade_outcomes
 
 
 import time
@@ -27,6 +31,17 @@ logger = get_logger(__name__)
 class ClosePositionStates(StatesGroup):
     waiting_selection = State()
     waiting_confirmation = State()
+    waiting_triggers = State()
+
+def describe_position(pos: dict) -> str:
+    if pos.get("buy_price", 0) > 0:
+        return f"BUY {pos.get('buy_grams', 0)}g @ ${pos.get('buy_price', 0):.2f}"
+    return f"SELL {pos.get('sell_grams', 0)}g @ ${pos.get('sell_price', 0):.2f}"
+
+def format_levels(stop_loss, take_profit) -> str:
+    sl = f"${stop_loss:.2f}" if stop_loss is not None else "—"
+    tp = f"${take_profit:.2f}" if take_profit is not None else "—"
+    return f"Stop-loss: {sl} | Take-profit: {tp}"
 
 # @router.message(lambda m: (m.text or "").strip().lower() == "open positions")
 # async def positions_list(message: types.Message, state: FSMContext):
@@ -71,29 +86,10 @@ class ClosePositionStates(StatesGroup):
 #     await state.set_state(ClosePositionStates.waiting_selection)
 
 @router.message(lambda m: (m.text or "").strip().lower() == "open positions")
-async def positions_list(message: types.Message, state: FSMContext):
-    if not await UserService.ensure_user_approved(message):
-        return
-    logger.info(f"[positions_list] User {message.from_user.id} requested open positions")
-    user = await TelegramService.get_link_for_telegram(message.from_user.id)
-    if not user:
-        await message.answer("⚠️ User not found. Please contact support.")
-        return
-
-    user_uuid = user.get("uuid")
-    positions = await MongoHelper.find_many(
-        collection="transactions",
-        query={"user_id": user_uuid, "status": "OPEN"},
-        projection={
-            "uuid": 1,
-            "buy_at": 1,
-            "buy_grams": 1,
-            "buy_price": 1,
-            "sell_at": 1,
-            "sell_grams": 1,
-            "sell_price": 1,
-        }
-    )
+async def positions_list(message: types.Message, state: FSMContext, user_uuid: str):
+    logger.info("[positions_list] User %s requested open positions", message.from_user.id)
+    book = await PositionBookService.get_book(user_uuid)
+    positions = PositionBookService.open_positions(book)
 
     if not positions:
         await message.answer("You have no open positions currently.")
@@ -108,29 +104,23 @@ async def positions_list(message: types.Message, state: FSMContext):
 
     lines = ["🔓 Your Open Positions (with Real-Time PnL):\n"]
     for i, pos in enumerate(positions, start=1):
-        is_buy = pos.get("buy_price", 0) > 0
-        buy_grams = pos.get("buy_grams", 0)
-        buy_price = pos.get("buy_price", 0)
-        sell_grams = pos.get("sell_grams", 0)
-        sell_price = pos.get("sell_price", 0)
-
-        pnl = 0
-        if is_buy:
-            pnl = (current_price * buy_grams) - (buy_price * buy_grams)
-            desc = f"BUY {buy_grams}g @ ${buy_price:.2f}"
-        else:
-            pnl = (sell_price * sell_grams) - (current_price * sell_grams)
-            desc = f"SELL {sell_grams}g @ ${sell_price:.2f}"
-
-        lines.append(f"{i}. {desc} | PnL: ${pnl:.2f} (ID:{pos.get('uuid')[:8]}) \n")
-
-    await message.answer("\n".join(lines) + "\n\nSend the number of the position you want to close (e.g., 1) or send 0 to cancel:")
+        pnl = PositionBookService.unrealized_pnl(pos, current_price)
+        line = f"{i}. {describe_position(pos)} | PnL: ${pnl:.2f} (ID:{pos.get('uuid')[:8]})"
+        levels = trigger_engine.levels(pos["uuid"])
+        if levels:
+            line += f"\n    {format_levels(*levels)}"
+        lines.append(line + " \n")
+
+    await message.answer(
+        "\n".join(lines) + "\n\nSend the number of the position you want to close (e.g., 1), "
+        "several numbers (e.g., 1,3) or 'all' to close them together, or send 0 to cancel:"
+    )
     await state.update_data(positions=positions)
     await state.set_state(ClosePositionStates.waiting_selection)
 
 @router.message(ClosePositionStates.waiting_selection)
 async def position_selection(message: types.Message, state: FSMContext):
-    logger.info(f"[position_selection] User {message.from_user.id} selection: {message.text}")
+    logger.info("[position_selection] User %s selection: %s", message.from_user.id, message.text)
     text = message.text.strip().lower()
     
     if text == "0":
@@ -140,13 +130,14 @@ async def position_selection(message: types.Message, state: FSMContext):
 
     data = await state.get_data()
     positions = data.get("positions", [])
+    indexes = parse_selection(text, len(positions))
 
-    if not text.isdigit():
+    if indexes is None:
         can_continue = await check_retry_limit(
             message,
             state,
             attempt_key="wrong_position_attempts",
-            error_text="❌ Please enter a valid position number.",
+            error_text="❌ Please enter a valid position number, several numbers like 1,3 or 'all'.",
             expired_text="❌ Too many invalid attempts! Session expired. Please type 'open positions' to restart."
         )
         if not can_continue:
@@ -154,8 +145,7 @@ async def position_selection(message: types.Message, state: FSMContext):
         else:
             return
 
-    idx = int(text)
-    if idx < 1 or idx > len(positions):
+    if any(idx < 1 or idx > len(positions) for idx in indexes):
         can_continue = await check_retry_limit(
             message,
             state,
@@ -167,11 +157,17 @@ async def position_selection(message: types.Message, state: FSMContext):
             return
         return
 
+    if len(indexes) > 1:
+        await state.update_data(wrong_position_attempts=0)
+        await ask_bulk_confirmation(message, state, [positions[idx - 1] for idx in indexes])
+        return
+
+    idx = indexes[0]
     # Valid selection — reset counter
     await state.update_data(wrong_position_attempts=0)
     selected_pos = positions[idx - 1]
     await state.update_data(selected_pos=selected_pos)
-    logger.info(f"[position_selection] User {message.from_user.id} selected position {selected_pos.get('uuid')}")
+    logger.info("[position_selection] User %s selected position %s", message.from_user.id, selected_pos.get("uuid"))
 
     # Fetch current price for confirmation
     try:
@@ -184,19 +180,8 @@ async def position_selection(message: types.Message, state: FSMContext):
         return
 
     # Prepare confirmation message with estimated pnl
-    is_buy = selected_pos.get("buy_price", 0) > 0
-    buy_price = selected_pos.get("buy_price", 0)
-    buy_grams = selected_pos.get("buy_grams", 0)
-    sell_price = selected_pos.get("sell_price", 0)
-    sell_grams = selected_pos.get("sell_grams", 0)
-
-    pnl = 0
-    if is_buy:
-        pnl = (current_price * buy_grams) - (buy_price * buy_grams)
-        position_desc = f"BUY {buy_grams}g @ ${buy_price:.2f}"
-    else:
-        pnl = (sell_price * sell_grams) - (current_price * sell_grams)
-        position_desc = f"SELL {sell_grams}g @ ${sell_price:.2f}"
+    pnl = PositionBookService.unrealized_pnl(selected_pos, current_price)
+    position_desc = describe_position(selected_pos)
 
     confirm_text = (
         f"Confirm closing this position:\n\n"
@@ -204,15 +189,66 @@ async def position_selection(message: types.Message, state: FSMContext):
         f"Closing at current price: ${current_price:.2f}\n"
         f"Estimated PnL: ${pnl:.2f}\n"
         f"⚠️ This action is valid for 10 seconds.\n\n"
-        "Reply with '1' to confirm or '0' to cancel."
+        "Reply with '1' to confirm, '2' to set a stop-loss / take-profit instead, or '0' to cancel."
     )
     await message.answer(confirm_text)
     await state.set_state(ClosePositionStates.waiting_confirmation)
 
 
+def parse_selection(text: str, count: int):
+    """Position numbers from '2', '1,3', '1 3 4' or 'all'; None if the text is not a selection."""
+    if text == "all":
+        return list(range(1, count + 1))
+    parts = text.replace(",", " ").split()
+    if not parts or not all(part.isdigit() for part in parts):
+        return None
+    return list(dict.fromkeys(int(part) for part in parts))
+
+
+async def ask_bulk_confirmation(message: types.Message, state: FSMContext, positions: list):
+    """Price every selected position at one snapshot and ask to close them together."""
+    try:
+        current_price = await get_current_price()
+    except Exception as e:
+        logger.error("[ask_bulk_confirmation] Failed to fetch current price: %s", e)
+        await message.answer("⚠️ Failed to fetch current price. Please try again later.")
+        await state.clear()
+        return
+
+    await state.update_data(selected_positions=positions, current_price=current_price)
+    count = f"these {len(positions)} positions" if len(positions) > 1 else "this position"
+    lines = [f"Confirm closing {count}:\n"]
+    total_pnl = 0.0
+    for pos in positions:
+        pnl = PositionBookService.unrealized_pnl(pos, current_price)
+        total_pnl += pnl
+        lines.append(f"• {describe_position(pos)} | PnL: ${pnl:.2f}")
+    lines.append(
+        f"\nClosing at current price: ${current_price:.2f}\n"
+        f"Estimated total PnL: ${total_pnl:.2f}\n"
+        f"All positions are closed together or none is.\n"
+        f"⚠️ This action is valid for 10 seconds.\n\n"
+        "Reply with '1' to confirm or '0' to cancel."
+    )
+    await message.answer("\n".join(lines))
+    await state.set_state(ClosePositionStates.waiting_confirmation)
+
+
+@router.message(lambda m: (m.text or "").strip().lower() == "close all")
+async def close_all(message: types.Message, state: FSMContext, user_uuid: str):
+    logger.info("[close_all] User %s requested to close all positions", message.from_user.id)
+    book = await PositionBookService.get_book(user_uuid)
+    positions = PositionBookService.open_positions(book)
+    if not positions:
+        await message.answer("You have no open positions currently.")
+        return
+    await state.clear()
+    await ask_bulk_confirmation(message, state, positions)
+
+
 @router.message(ClosePositionStates.waiting_confirmation)
-async def confirm_close(message: types.Message, state: FSMContext):
-    logger.info(f"[confirm_close] User {message.from_user.id} reply: {message.text}")
+async def confirm_close(message: types.Message, state: FSMContext, user_uuid: str):
+    logger.info("[confirm_close] User %s reply: %s", message.from_user.id, message.text)
     text = message.text.strip().lower()
 
     # Handle cancel explicitly
@@ -221,13 +257,19 @@ async def confirm_close(message: types.Message, state: FSMContext):
         await state.clear()
         return
 
-    # Validate input; only "0" (cancel) and "1" (confirm) allowed
-    if text not in ("0", "1"):
+    data = await state.get_data()
+    bulk = bool(data.get("selected_positions"))
+
+    # Validate input; only "0" (cancel), "1" (confirm) and, for one position, "2" (set levels) allowed
+    if text not in (("0", "1") if bulk else ("0", "1", "2")):
         can_continue = await check_retry_limit(
             message,
             state,
             attempt_key="wrong_confirmation_attempts",
-            error_text="⚠️ Please reply with '1' to confirm or '0' to cancel.",
+            error_text=(
+                "⚠️ Please reply with '1' to confirm or '0' to cancel." if bulk
+                else "⚠️ Please reply with '1' to confirm, '2' to set levels or '0' to cancel."
+            ),
             expired_text="❌ Too many invalid attempts! Session expired. Please start over."
         )
         if not can_continue:
@@ -238,119 +280,168 @@ async def confirm_close(message: types.Message, state: FSMContext):
     # If confirm ("1"), reset retry counter and continue closing logic
     await state.update_data(wrong_confirmation_attempts=0)
 
+    if text == "2":
+        levels = trigger_engine.levels(data.get("selected_pos", {}).get("uuid", ""))
+        current = f"Current levels: {format_levels(*levels)}\n\n" if levels else ""
+        await message.answer(
+            f"{current}Send the stop-loss and take-profit prices separated by a space, e.g. `1950 2100`.\n"
+            "Use '-' to leave one unset, 'clear' to remove both, or '0' to cancel."
+        )
+        await state.set_state(ClosePositionStates.waiting_triggers)
+        return
+
+    if text == "1" and bulk:
+        positions = data.get("selected_positions")
+        current_price = data.get("current_price")
+        await state.clear()
+        if not current_price:
+            await message.answer("⚠️ Missing position or price data. Please start over.")
+            return
+        progress = await message.answer("⏳ Closing your positions…")
+        if not trade_executor.submit(execute_close_many(progress, user_uuid, positions, current_price)):
+            await progress.edit_text("⚠️ The system is busy right now. Please try again in a moment.")
+        return
+
     if text == "1":
         # Retrieve necessary data
-        data = await state.get_data()
         selected_pos = data.get("selected_pos")
         current_price = data.get("current_price")
-        telegram_id = message.from_user.id
 
         if not (selected_pos and current_price):
             await message.answer("⚠️ Missing position or price data. Please start over.")
             await state.clear()
             return
 
-        user = await TelegramService.get_link_for_telegram(telegram_id)
-        if not user:
-            await message.answer("⚠️ User not found. Please contact support.")
-            await state.clear()
-            return
-        user_uuid = user.get("uuid")
+        # Reply right away and close the position on the background executor
+        await state.clear()
+        progress = await message.answer("⏳ Closing your position…")
+        if not trade_executor.submit(execute_close(progress, user_uuid, selected_pos, current_price)):
+            await progress.edit_text("⚠️ The system is busy right now. Please try again in a moment.")
+
+async def execute_close(progress: types.Message, user_uuid: str, selected_pos: dict, current_price: float):
+    try:
+        result = await PositionService.close_position(user_uuid, selected_pos, current_price)
+        trade_outcomes.labels("CLOSE", "filled").inc()
+        await progress.edit_text(
+            f"✅ Position closed successfully!\n"
+            f"PnL Realized: ${result['pnl']:.2f}\n"
+            f"Updated Wallet Balance: ${result['balance']:.2f}"
+        )
+    except ValueError:
+        trade_outcomes.labels("CLOSE", "no_wallet").inc()
+        await progress.edit_text("⚠️ Wallet not found. Operation aborted and rolled back.")
+    except Exception as e:
+        logger.error(f"Error closing position for user {user_uuid}: {e}")
+        trade_outcomes.labels("CLOSE", "error").inc()
+        await progress.edit_text("❌ Failed to close position due to internal error. Please try again later.")
+
+async def execute_close_many(progress: types.Message, user_uuid: str, positions: list, current_price: float):
+    try:
+        results, _ = await PositionService.close_positions(
+            [(user_uuid, pos) for pos in positions], current_price, all_or_nothing=True
+        )
+        total_pnl = sum(result["pnl"] for result in results)
+        trade_outcomes.labels("CLOSE_MANY", "filled").inc()
+        await progress.edit_text(
+            f"✅ Closed {len(results)} position(s) successfully!\n"
+            f"Closed at: ${current_price:.2f}\n"
+            f"PnL Realized: ${total_pnl:.2f}\n"
+            f"Updated Wallet Balance: ${results[-1]['balance']:.2f}"
+        )
+    except ValueError:
+        trade_outcomes.labels("CLOSE_MANY", "no_wallet").inc()
+        await progress.edit_text("⚠️ Wallet not found. Operation aborted and rolled back.")
+    except RuntimeError:
+        trade_outcomes.labels("CLOSE_MANY", "already_closed").inc()
+        await progress.edit_text(
+            "⚠️ Some of these positions were already closed. Nothing was changed — "
+            "type 'open positions' to see the current list."
+        )
+    except Exception as e:
+        logger.error("Error closing %s positions for user %s: %s", len(positions), user_uuid, e)
+        trade_outcomes.labels("CLOSE_MANY", "error").inc()
+        await progress.edit_text("❌ Failed to close positions due to internal error. Please try again later.")
+
+
+def parse_level(value: str):
+    """'-' means no level; otherwise a positive price."""
+    if value == "-":
+        return None
+    level = float(value.lstrip("$"))
+    # float() also takes "nan" and "inf", which can never be a trigger level
+    if not math.isfinite(level):
+        raise ValueError(f"not a price: {value}")
+    return level
+
+
+@router.message(ClosePositionStates.waiting_triggers)
+async def set_triggers(message: types.Message, state: FSMContext, user_uuid: str):
+    logger.info("[set_triggers] User %s levels: %s", message.from_user.id, message.text)
+    text = (message.text or "").strip().lower()
+
+    if text == "0":
+        await message.answer("❌ Operation cancelled.")
+        await state.clear()
+        return
 
-        # Prepare rollback info
-        rollback_fields = {k: selected_pos.get(k, None) for k in [
-            "buy_at", "buy_grams", "buy_price", "buy_price_type", "total_buy_amount",
-            "sell_at", "sell_grams", "sell_price", "sell_price_type", "total_sell_amount",
-            "status", "pnl", "updated_at"
-        ]}
+    data = await state.get_data()
+    selected_pos = data.get("selected_pos")
+    if not selected_pos:
+        await message.answer("⚠️ Missing position data. Please start over.")
+        await state.clear()
+        return
 
+    if text == "clear":
+        stop_loss, take_profit = None, None
+    else:
+        parts = text.split()
         try:
-            is_buy = selected_pos.get("buy_price", 0) > 0
-            buy_grams = selected_pos.get("buy_grams", 0)
-            buy_price = selected_pos.get("buy_price", 0)
-            sell_grams = selected_pos.get("sell_grams", 0)
-            sell_price = selected_pos.get("sell_price", 0)
-
-            now_ts = int(time.time())
-            if is_buy:
-                pnl = (current_price * buy_grams) - (buy_price * buy_grams)
-                update = {
-                    "$set": {
-                        "sell_at": now_ts,
-                        "sell_grams": buy_grams,
-                        "sell_price": current_price,
-                        "sell_price_type": "MARKET",
-                        "total_sell_amount": current_price * buy_grams,
-                        "status": "CLOSED",
-                        "pnl": pnl,
-                        "updated_at": now_ts
-                    }
-                }
-                credit_amount = (buy_price * buy_grams) + pnl
-            else:
-                pnl = (sell_price * sell_grams) - (current_price * sell_grams)
-                update = {
-                    "$set": {
-                        "buy_at": now_ts,
-                        "buy_grams": sell_grams,
-                        "buy_price": current_price,
-                        "buy_price_type": "MARKET",
-                        "total_buy_amount": current_price * sell_grams,
-                        "status": "CLOSED",
-                        "pnl": pnl,
-                        "updated_at": now_ts
-                    }
-                }
-                credit_amount = (sell_price * sell_grams) + pnl
-
-            txn_affected = await MongoHelper.update_one(
-                collection=settings.DB_TABLE.TRANSACTIONS,
-                query={"uuid": selected_pos.get("uuid")},
-                update=update
-            )
-            if txn_affected == 0:
-                raise RuntimeError("Failed to update transaction status")
-
-            wallet = await MongoHelper.find_one(settings.DB_TABLE.WALLETS, {"user_id": user_uuid})
-            if not wallet:
-                # rollback
-                await MongoHelper.update_one(
-                    collection="transactions",
-                    query={"uuid": selected_pos.get("uuid")},
-                    update={"$set": rollback_fields}
-                )
-                await message.answer("⚠️ Wallet not found. Operation aborted and rolled back.")
-                await state.clear()
-                return
-
-            wallet_affected = await MongoHelper.update_one(
-                collection=settings.DB_TABLE.WALLETS,
-                query={"user_id": user_uuid},
-                update={"$inc": {"balance": credit_amount}}
+            if len(parts) != 2:
+                raise ValueError
+            stop_loss, take_profit = parse_level(parts[0]), parse_level(parts[1])
+        except ValueError:
+            await check_retry_limit(
+                message,
+                state,
+                attempt_key="wrong_trigger_attempts",
+                error_text="❌ Please send two prices like `1950 2100`, use '-' to skip one, or 'clear'.",
+                expired_text="❌ Too many invalid attempts! Session expired. Please type 'open positions' to restart."
             )
-            if wallet_affected == 0:
-                await MongoHelper.update_one(
-                    collection="transactions",
-                    query={"uuid": selected_pos.get("uuid")},
-                    update={"$set": rollback_fields}
-                )
-                raise RuntimeError("Failed to update wallet balance; rolled back transaction")
-
-            updated_wallet = await MongoHelper.find_one(settings.DB_TABLE.WALLETS, {"user_id": user_uuid})
-            if not updated_wallet:
-                raise RuntimeError("Updated wallet missing after balance increment")
-            new_balance = updated_wallet.get("balance", 0)
-
-            await message.answer(
-                f"✅ Position closed successfully!\n"
-                f"PnL Realized: ${pnl:.2f}\n"
-                f"Updated Wallet Balance: ${new_balance:.2f}"
-            )
-        except Exception as e:
-            logger.error(f"Error closing position for user {user_uuid}: {e}")
-            await message.answer("❌ Failed to close position due to internal error. Please try again later.")
-        finally:
-            await state.clear()
+            return
+
+    current_price = await get_current_price()
+    error = trigger_engine.validate(selected_pos, current_price, stop_loss, take_profit)
+    if error:
+        await check_retry_limit(
+            message,
+            state,
+            attempt_key="wrong_trigger_attempts",
+            error_text=f"❌ {error}",
+            expired_text="❌ Too many invalid attempts! Session expired. Please type 'open positions' to restart."
+        )
+        return
+
+    await state.clear()
+    order = TriggerOrder(
+        position=selected_pos,
+        user_uuid=user_uuid,
+        chat_id=message.chat.id,
+        stop_loss=stop_loss,
+        take_profit=take_profit,
+    )
+    if not await trigger_engine.set_levels(order):
+        await message.answer("⚠️ This position is no longer open.")
+        return
+
+    if stop_loss is None and take_profit is None:
+        await message.answer(f"✅ Stop-loss and take-profit removed from {describe_position(selected_pos)}.")
+        return
+    await message.answer(
+        f"✅ Levels set on {describe_position(selected_pos)}\n"
+        f"{format_levels(stop_loss, take_profit)}\n"
+        f"The position will be closed automatically when one is reached."
+    )
+
 
 # @router.message(ClosePositionStates.waiting_confirmation)
 # async def confirm_close(message: types.Message, state: FSMContext):
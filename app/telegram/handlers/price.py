@@ -1,6 +1,7 @@
-from aiogram import Router, types
+from aiogram import Router, types, F
 from app.services.price.price_service import get_current_price
-from app.services.user.user_service import UserService
+from app.services.price.price_chart import CHART_CALLBACK_PREFIX, TIMEFRAMES, chart_timeframe_keyboard, price_charts
+from app.services.price.price_ticker import price_ticker, STOP_CALLBACK
 from app.utils.logging import get_logger, setup_logging
 from app.utils.error_handler import handle_bot_errors
 
@@ -11,11 +12,35 @@ router = Router()
 @router.message(lambda m: (m.text or "").strip().lower() == "live price")
 @handle_bot_errors("⚠️ Unable to fetch live price at the moment. Please try again later.")
 async def live_price(msg: types.Message):
-    if not await UserService.ensure_user_approved(msg):
-        return
     price = await get_current_price()
     if price <= 0:
         await msg.answer("⚠️ Current gold price is temporarily unavailable. Please try again shortly.")
     else:
         await msg.answer(f"📊 Current Gold Price: ${price:.2f} per gram")
 
+@router.message(lambda m: (m.text or "").strip().lower() == "watch price")
+@handle_bot_errors("⚠️ Unable to start the live price watch. Please try again later.")
+async def watch_price(msg: types.Message):
+    logger.info("User %s started watching the price", msg.from_user.id)
+    await price_ticker.watch(msg.bot, msg.chat.id)
+
+@router.callback_query(F.data == STOP_CALLBACK)
+async def stop_watch_price(call: types.CallbackQuery):
+    stopped = await price_ticker.stop(call.bot, call.message.chat.id)
+    await call.answer("Price watch stopped." if stopped else "This watch has already ended.")
+
+@router.message(lambda m: (m.text or "").strip().lower() == "price chart")
+async def price_chart(msg: types.Message):
+    await msg.answer("📈 Choose a timeframe:", reply_markup=chart_timeframe_keyboard())
+
+@router.callback_query(F.data.startswith(CHART_CALLBACK_PREFIX))
+@handle_bot_errors("⚠️ Unable to draw the price chart at the moment. Please try again later.")
+async def send_price_chart(call: types.CallbackQuery):
+    timeframe = call.data[len(CHART_CALLBACK_PREFIX):]
+    if timeframe not in TIMEFRAMES:
+        await call.answer()
+        return
+    if await price_charts.send(call.bot, call.message.chat.id, timeframe):
+        await call.answer()
+    else:
+        await call.answer("No price history for this timeframe yet.", show_alert=True)
@@ -4,14 +4,18 @@ from aiogram import Router, types, F
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from app.services.transaction.transaction_service import TransactionService
-from app.services.user.user_service import UserService
 from app.telegram.keyboards import confirm_inline
+from app.utils.background import trade_executor
 from app.utils.common import check_retry_limit, validate_fsm_data_decorator
 from app.utils.logging import get_logger, setup_logging
+from app.utils.metrics import trade_outcomes
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from app.db.mongo.helper import MongoHelper
 from app.services.wallet.wallet_service import WalletService
+from app.services.positions.position_book_service import PositionBookService
+from app.services.transaction.rollup_service import DailyRollupService
 from app.services.price.price_service import get_current_price
-from app.services.telegram.telegram_service import TelegramService
+from app.services.price.quote_service import quote_service
 
 router = Router()
 
@@ -38,8 +42,6 @@ def price_selection_keyboard(current_price: float):
 @router.message(lambda m: (m.text or "").strip().lower() == "sell gold")
 async def sell_start(msg: types.Message, state: FSMContext):
     await state.clear()
-    if not await UserService.ensure_user_approved(msg):
-        return
     await msg.answer("Enter grams to sell (e.g., 1.5):")
     await state.set_state(SellFlow.waiting_grams)
 
@@ -61,7 +63,7 @@ async def sell_start(msg: types.Message, state: FSMContext):
 #     )
 
 @router.message(SellFlow.waiting_grams)
-async def process_grams(msg: types.Message, state: FSMContext):
+async def process_grams(msg: types.Message, state: FSMContext, user_uuid: str):
     data = await state.get_data()
     wrong_attempts = data.get("wrong_sell_grams", 0)  # Use same attempt key
 
@@ -85,17 +87,24 @@ async def process_grams(msg: types.Message, state: FSMContext):
     await state.update_data(wrong_sell_grams=0)
 
     current_price = await get_current_price()
-    await state.update_data(grams=grams, current_price=current_price)
+    quote = await quote_service.issue(user_uuid, "SELL", grams, current_price)
+    await state.update_data(grams=grams, current_price=current_price, quote_id=quote.quote_id)
     await msg.answer(
-        f"Current price per gram: ${current_price:.2f}\n\n⚠️ This action is valid for 10 seconds.",
+        f"Current price per gram: ${current_price:.2f}\n\n⚠️ This price is valid for {quote_service.ttl} seconds.",
         reply_markup=price_selection_keyboard(current_price)
     )
 
 @router.callback_query(F.data == "sell:current_price")
-async def sell_current_price(call: types.CallbackQuery, state: FSMContext):
+async def sell_current_price(call: types.CallbackQuery, state: FSMContext, user_uuid: str):
     data = await state.get_data()
-    grams = data.get("grams")
-    current_price = data.get("current_price")
+    quote = quote_service.peek(data.get("quote_id"), user_uuid, "SELL")
+    if not quote:
+        await state.clear()
+        await call.message.edit_text("⌛ This price quote has expired. Please type 'sell gold' to get a new one.")
+        await call.answer()
+        return
+    grams = quote.grams
+    current_price = quote.price
     total_price = grams * current_price
 
     await state.update_data(price=current_price, total_price=total_price, target_price=None)
@@ -104,57 +113,61 @@ async def sell_current_price(call: types.CallbackQuery, state: FSMContext):
         f"Confirm sell order:\n"
         f"Quantity: {grams}g\n"
         f"Price per gram: ${current_price:.2f}\n"
-        f"Total price: ${total_price:.2f}\n",
-        f"⚠️ This action is valid for 10 seconds.",
+        f"Total price: ${total_price:.2f}\n"
+        f"⚠️ This price is valid for {quote_service.remaining(quote):.0f} more seconds.",
         reply_markup=confirm_inline("SELL_EXECUTE")
     )
     await state.set_state(SellFlow.waiting_confirmation)
     await call.answer()
 
 @router.callback_query(F.data == "confirm:SELL_EXECUTE")
-async def confirm_sell(call: types.CallbackQuery, state: FSMContext):
+async def confirm_sell(call: types.CallbackQuery, state: FSMContext, user_uuid: str, wallet_id: str):
     telegram_id = call.from_user.id
+    logger.info("User %s confirmed SELL order", telegram_id)
+    # Acknowledge right away; the trade itself runs on the background executor
+    await call.answer()
+    data = await state.get_data()
+    if not data.get("quote_id"):
+        # Repeated tap after the flow was consumed; the message already shows its outcome
+        return
+    await state.clear()
+    quote = quote_service.redeem(data.get("quote_id"), user_uuid, "SELL")
+    if not quote:
+        trade_outcomes.labels("SELL", "quote_expired").inc()
+        await call.message.edit_text("⌛ This price quote has expired. Please type 'sell gold' to get a new one.")
+        return
+    data.update(grams=quote.grams, price=quote.price)
+    await call.message.edit_text("⏳ Executing your sell order…")
+    if not trade_executor.submit(execute_sell(call.message, telegram_id, user_uuid, wallet_id, data)):
+        await call.message.edit_text("⚠️ The system is busy right now. Please try again in a moment.")
+
+async def execute_sell(message: types.Message, telegram_id: int, user_uuid: str, wallet_id: str, data: dict):
     try:
-        data = await state.get_data()
         grams = data.get("grams")
         price_per_gram = data.get("price")  # From state set earlier
         target_price = data.get("target_price")  # For future extension; currently None or sell price
 
-        # Step 1: User lookup
+        # Step 1: Wallet lookup (user is already resolved by AuthMiddleware)
         try:
-            user = await TelegramService.get_link_for_telegram(telegram_id)
-            if not user:
-                await call.message.edit_text("🚫 Your Telegram account isn’t linked. Please link your account or contact support.")
-                await state.clear()
-                return
-            user_uuid = user.get("uuid")
-        except Exception as ex:
-            logger.error(f"User lookup failed for telegram ID {telegram_id}: {ex}")
-            await call.message.edit_text("⚠️ Unable to verify your account. Please try again later.")
-            await state.clear()
-            return
-
-        # Step 2: Wallet lookup
-        try:
-            wallet = await WalletService.get_wallet_for_user(telegram_id)
+            wallet = await WalletService.get_wallet_by_id(wallet_id)
             if not wallet:
-                await call.message.edit_text("🚫 No wallet found. Please contact support to set up your wallet.")
-                await state.clear()
+                trade_outcomes.labels("SELL", "no_wallet").inc()
+                await message.edit_text("🚫 No wallet found. Please contact support to set up your wallet.")
                 return
         except Exception as ex:
             logger.error(f"Wallet lookup failed for user {user_uuid}: {ex}")
-            await call.message.edit_text("⚠️ Unable to access your wallet. Please try again later.")
-            await state.clear()
+            trade_outcomes.labels("SELL", "error").inc()
+            await message.edit_text("⚠️ Unable to access your wallet. Please try again later.")
             return
 
-        # Step 3: Verify sufficient wallet balance for sell
+        # Step 2: Verify sufficient wallet balance for sell
         total_price = grams * price_per_gram
         if wallet.get("balance", 0) < total_price:
-            await call.message.edit_text("❌ Insufficient wallet balance. Please top up and try again.")
-            await state.clear()
+            trade_outcomes.labels("SELL", "insufficient_funds").inc()
+            await message.edit_text("❌ Insufficient wallet balance. Please top up and try again.")
             return
 
-        # Step 4: Create sell transaction
+        # Step 3: Create sell transaction
         try:
             txn_payload = {
                 "user_uuid": user_uuid,
@@ -169,30 +182,49 @@ async def confirm_sell(call: types.CallbackQuery, state: FSMContext):
                 raise RuntimeError("Transaction service did not create sell order")
         except RuntimeError as ex:
             logger.error(f"Transaction creation failed for user {user_uuid}: {ex}")
-            await call.message.edit_text("⚠️ Failed to place your sell order. Please try again.")
-            await state.clear()
+            trade_outcomes.labels("SELL", "error").inc()
+            await message.edit_text("⚠️ Failed to place your sell order. Please try again.")
             return
         except Exception as ex:
             logger.error(f"Unexpected error on transaction creation for user {user_uuid}: {ex}")
-            await call.message.edit_text("⚠️ An unexpected error occurred while placing your order. Please try later.")
-            await state.clear()
+            trade_outcomes.labels("SELL", "error").inc()
+            await message.edit_text("⚠️ An unexpected error occurred while placing your order. Please try later.")
             return
 
-        # Step 5: Deduct wallet balance
+        # Step 4: Deduct wallet balance
         try:
-            wallet_deducted = await WalletService.deduct_wallet_balance(user_uuid, total_price)
+            # The trade counts towards the daily rollup in the same transaction as it is paid for
+            async def pay(session) -> bool:
+                deducted = await WalletService.deduct_wallet_balance(
+                    user_uuid, total_price, kind="SELL", reference=txn["uuid"], session=session
+                )
+                if deducted:
+                    await DailyRollupService.record(
+                        [(user_uuid, txn["updated_at"], DailyRollupService.opening_trade(txn))], session=session
+                    )
+                return deducted
+
+            wallet_deducted = await MongoHelper.transaction(pay)
             if not wallet_deducted:
                 logger.warning(f"Wallet deduction failed: insufficient funds or update error for user {user_uuid}")
-                await call.message.edit_text("❌ Failed to deduct funds from wallet. Please try again or contact support.")
-                await state.clear()
+                trade_outcomes.labels("SELL", "insufficient_funds").inc()
+                await message.edit_text("❌ Failed to deduct funds from wallet. Please try again or contact support.")
                 return
         except Exception as ex:
             logger.error(f"Wallet deduction exception for user {user_uuid}: {ex}")
-            await call.message.edit_text("⚠️ Wallet deduction failed due to system error. Please try again.")
-            await state.clear()
+            trade_outcomes.labels("SELL", "error").inc()
+            await message.edit_text("⚠️ Wallet deduction failed due to system error. Please try again.")
             return
 
+        # PENDING (target price) orders only become lots once they fill
+        if txn["status"] == "OPEN":
+            try:
+                await PositionBookService.record_open(user_uuid, txn)
+            except Exception as ex:
+                logger.error("Position book update failed for user %s: %s", user_uuid, ex)
+
         # Success: confirm sell order to user
+        trade_outcomes.labels("SELL", "filled").inc()
         msg = (
             f"✅ Sell order executed successfully!\n"
             f"Quantity: {grams}g\n"
@@ -200,18 +232,16 @@ async def confirm_sell(call: types.CallbackQuery, state: FSMContext):
             f"Total price: ${total_price:.2f}\n"
             f"Order ID: {txn['uuid'][:8]}"
         )
-        await call.message.edit_text(msg)
+        await message.edit_text(msg)
 
     except Exception as ex:
         logger.error(f"Critical sell order failure for telegram ID {telegram_id}: {ex}")
-        await call.message.edit_text("⚠️ An unexpected error occurred. Please try again later.")
-
-    await state.clear()
-    await call.answer()
+        trade_outcomes.labels("SELL", "error").inc()
+        await message.edit_text("⚠️ An unexpected error occurred. Please try again later.")
 
 @router.callback_query(F.data == "cancel")
 async def cancel_handler(call: types.CallbackQuery, state: FSMContext):
     await call.message.edit_text("❌ Operation cancelled.")
     await state.clear()
     await call.answer()  # This is important to stop the loading spinner
-    logger.info(f"User {call.from_user.id} cancelled the operation.")
\ No newline at end of file
+    logger.info("User %s cancelled the operation.", call.from_user.id)
\ No newline at end of file
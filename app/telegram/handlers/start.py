@@ -71,19 +71,12 @@ class RegistrationStates(StatesGroup):
 MAX_PHONE_ATTEMPTS = 3
 
 @router.message()
-async def handle_message(message: Message, state: FSMContext):
-    user = await UserService.get_user_by_telegram_id(message.from_user.id)
-
-    if user:
-        # Existing user
-        status = user.get("status")
-        if status == "PENDING":
-            await message.answer("Your account activation is in progress. Please wait for approval.")
-            return
-        elif status == "APPROVED":
-            await process_user_command(message)
-            return
+async def handle_message(message: Message):
+    # Only approved users get here; AuthMiddleware routes everyone else
+    # to handle_registration or the pending-approval reply.
+    await process_user_command(message)
 
+async def handle_registration(message: Message, state: FSMContext):
     # New user or no record found
     current_state = await state.get_state()
     if current_state == RegistrationStates.waiting_for_phone.state:
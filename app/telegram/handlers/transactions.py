@@ -1,11 +1,14 @@
 import time
-from aiogram import Router, types, F
+from datetime import datetime, timedelta
+from aiogram import Bot, Router, types, F
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.filters.state import StateFilter
-from app.services.telegram.telegram_service import TelegramService
-from app.services.user.user_service import UserService
-from app.utils.common import format_timestamp
+from app.services.transaction.rollup_service import DailyRollupService
+from app.services.transaction.statement_service import StatementFile, StatementService
+from app.services.transaction.transaction_service import TransactionService
+from app.utils.background import export_executor
+from app.utils.common import IST, format_timestamp
 from app.utils.config import settings
 from app.utils.logging import get_logger
 from app.db.mongo.helper import MongoHelper
@@ -29,22 +32,37 @@ def build_time_range_keyboard() -> types.InlineKeyboardMarkup:
     return keyboard
 
 @router.message(lambda m: (m.text or "").strip().lower() == "transactions")
-async def transactions_start(message: types.Message, state: FSMContext):
-    logger.info(f"[transactions_list] User {message.from_user.id} requested transactions time filter")
-    if not await UserService.ensure_user_approved(message):
-        return
-    user = await TelegramService.get_link_for_telegram(message.from_user.id)
-    if not user:
-        await message.answer("⚠️ User not found. Please contact support.")
-        return
-
-    await state.update_data(user_uuid=user.get("uuid"))
+async def transactions_start(message: types.Message, state: FSMContext, user_uuid: str):
+    logger.info("[transactions_list] User %s requested transactions time filter", message.from_user.id)
+    await state.update_data(user_uuid=user_uuid)
     await state.set_state(TransactionsStates.waiting_page)  # Or another state if needed for time filter
 
     keyboard = build_time_range_keyboard()
     await message.answer("Select the time range for transactions:", reply_markup=keyboard)
 
 
+TIME_FILTERS = {
+    # callback suffix -> (days ago the range ends, number of IST days)
+    "today": (0, 1),
+    "yesterday": (1, 1),
+    "lastweek": (0, 7),
+}
+
+TX_PROJECTION = {
+    "uuid": 1,
+    "buy_at": 1,
+    "buy_grams": 1,
+    "buy_price": 1,
+    "buy_price_type": 1,
+    "sell_at": 1,
+    "sell_grams": 1,
+    "sell_price": 1,
+    "sell_price_type": 1,
+    "status": 1,
+    "pnl": 1,
+    "updated_at": 1,
+}
+
 # New callback to handle time range selection
 @router.callback_query(F.data.startswith("tx_time_"), StateFilter(TransactionsStates.waiting_page))
 async def transactions_time_filter(callback: types.CallbackQuery, state: FSMContext):
@@ -56,64 +74,24 @@ async def transactions_time_filter(callback: types.CallbackQuery, state: FSMCont
         await state.clear()
         return
 
-    now_ts = int(time.time())
-    # Calculate start and end timestamps based on selection
-    if time_filter == "today":
-        # start of today in UTC
-        start_ts = int(time.mktime(time.gmtime(time.time() // 86400 * 86400)))
-        end_ts = start_ts + 86400
-    elif time_filter == "yesterday":
-        start_ts = int(time.mktime(time.gmtime((time.time() // 86400 - 1) * 86400)))
-        end_ts = start_ts + 86400
-    elif time_filter == "lastweek":
-        start_ts = now_ts - 7 * 86400
-        end_ts = now_ts
-    else:
+    if time_filter not in TIME_FILTERS:
         await callback.answer("Invalid selection.", show_alert=True)
         return
+    # Whole calendar days in IST, the timezone every date is shown in
+    start_ts, end_ts = DailyRollupService.day_bounds(*TIME_FILTERS[time_filter])
 
-    query = {
-        "user_id": user_uuid,
-        "updated_at": {"$gte": start_ts, "$lt": end_ts}
-    }
-
-    transactions = await MongoHelper.find_many(
-        collection=settings.DB_TABLE.TRANSACTIONS,
-        query=query,
-        sort=[("updated_at", -1)],
-        limit=ITEMS_PER_PAGE,
-        skip=0,
-        projection={
-            "uuid": 1,
-            "buy_at": 1,
-            "buy_grams": 1,
-            "buy_price": 1,
-            "buy_price_type": 1,
-            "sell_at": 1,
-            "sell_grams": 1,
-            "sell_price": 1,
-            "sell_price_type": 1,
-            "status": 1,
-            "pnl": 1,
-            "updated_at": 1,
-        }
-    )
-    total_count = await MongoHelper.count_documents("transactions", query)
-
+    transactions, has_next = await fetch_transactions_page(user_uuid, start_ts, end_ts, page=1)
     if not transactions:
         await callback.message.edit_text(f"No transactions found for selected period: {time_filter.capitalize()}.")
         await callback.answer()
         return
 
-    lines = [f"📜 Your Transactions ({time_filter.capitalize()}), Page 1/{(total_count + ITEMS_PER_PAGE - 1)//ITEMS_PER_PAGE}:"]
-    for i, tx in enumerate(transactions, start=1):
-        line = format_tx_summary(tx, i)
-        lines.append(line)
-
-    keyboard = build_pagination_keyboard(1, total_count)
-
-    await callback.message.edit_text("\n".join(lines), reply_markup=keyboard)
-    await state.update_data(page=1, time_filter=time_filter)
+    header = format_rollup_header(await DailyRollupService.summary(user_uuid, start_ts, end_ts))
+    await state.update_data(page=1, time_filter=time_filter, start_ts=start_ts, end_ts=end_ts, summary_header=header)
+    await callback.message.edit_text(
+        render_transactions_page(time_filter, header, transactions, page=1),
+        reply_markup=build_pagination_keyboard(1, has_next),
+    )
     await callback.answer()
 
 
@@ -126,86 +104,71 @@ async def transactions_pagination(callback: types.CallbackQuery, state: FSMConte
     page = int(page_str)
 
     data = await state.get_data()
-    print(data)
     user_uuid = data.get("user_uuid")
-    if not user_uuid:
-        await callback.answer("Session expired, please try /transactions again.", show_alert=True)
+    if not user_uuid or "start_ts" not in data:
+        await callback.answer("Session expired, please try 'transactions' again.", show_alert=True)
         await state.clear()
         return
 
-    skip = (page - 1) * ITEMS_PER_PAGE
-    total_count = await MongoHelper.count_documents(settings.DB_TABLE.TRANSACTIONS, {"user_id": user_uuid})
+    transactions, has_next = await fetch_transactions_page(user_uuid, data["start_ts"], data["end_ts"], page)
+    if not transactions:
+        await callback.answer("No transactions on this page.", show_alert=True)
+        return
+
+    await callback.message.edit_text(
+        render_transactions_page(data.get("time_filter", ""), data.get("summary_header", ""), transactions, page),
+        reply_markup=build_pagination_keyboard(page, has_next),
+    )
+    await callback.answer()
+    await state.update_data(page=page)
+
 
+async def fetch_transactions_page(user_uuid: str, start_ts: int, end_ts: int, page: int):
+    """One page of the user's transactions in [start_ts, end_ts), newest first, and whether another follows."""
     transactions = await MongoHelper.find_many(
         collection=settings.DB_TABLE.TRANSACTIONS,
-        query={"user_id": user_uuid},
+        query={"user_id": user_uuid, "updated_at": {"$gte": start_ts, "$lt": end_ts}},
         sort=[("updated_at", -1)],
-        limit=ITEMS_PER_PAGE,
-        skip=skip,
-        projection={
-            "uuid": 1,
-            "buy_at": 1,
-            "buy_grams": 1,
-            "buy_price": 1,
-            "buy_price_type": 1,
-            "sell_at": 1,
-            "sell_grams": 1,
-            "sell_price": 1,
-            "sell_price_type": 1,
-            "status": 1,
-            "pnl": 1,
-            "updated_at": 1,
-        }
+        # One extra row tells whether there is a next page, without counting
+        limit=ITEMS_PER_PAGE + 1,
+        skip=(page - 1) * ITEMS_PER_PAGE,
+        projection=TX_PROJECTION,
     )
+    return transactions[:ITEMS_PER_PAGE], len(transactions) > ITEMS_PER_PAGE
 
-    if not transactions:
-        await callback.answer("No transactions on this page.", show_alert=True)
-        return
 
-    lines = [f"📜 Your Transactions (Page {page}/{(total_count + ITEMS_PER_PAGE - 1)//ITEMS_PER_PAGE}):"]
-    for i, tx in enumerate(transactions, start=skip+1):
-        line = format_tx_summary(tx, i)
-        lines.append(line)
+def format_rollup_header(totals: dict) -> str:
+    return (
+        f"Trades: {totals['trades']} | Bought: {totals['buy_grams']:g}g | Sold: {totals['sell_grams']:g}g\n"
+        f"Volume: ${totals['notional']:.2f} | Realized PnL: ${totals['realized_pnl']:.2f}"
+    )
 
-    keyboard = build_pagination_keyboard(page, total_count)
 
-    await callback.message.edit_text("\n".join(lines), reply_markup=keyboard)
-    await callback.answer()
-    await state.update_data(page=page)
+def render_transactions_page(time_filter: str, header: str, transactions: list, page: int) -> str:
+    lines = [f"📜 Your Transactions ({time_filter.capitalize()}), Page {page}:", header, ""]
+    for i, tx in enumerate(transactions, start=(page - 1) * ITEMS_PER_PAGE + 1):
+        lines.append(format_tx_summary(tx, i))
+    return "\n".join(lines)
 
 
 def format_tx_summary(tx: dict, idx: int) -> str:
-    is_buy = tx.get("buy_grams", 0) > 0
-    is_sell = tx.get("sell_grams", 0) > 0
-    tx_type = "BUY" if is_buy and not is_sell else "SELL" if is_sell and not is_buy else "MIXED"
-    pnl = tx.get("pnl", 0)
-    pnl_str = f"{pnl:.2f}"
-    buy_grams = tx.get("buy_grams", 0)
-    buy_price = tx.get("buy_price", 0)
-    buy_price_type = tx.get("buy_price_type") or ""
-    sell_grams = tx.get("sell_grams", 0)
-    sell_price = tx.get("sell_price", 0)
-    sell_price_type = tx.get("sell_price_type") or ""
-    status = tx.get("status", "N/A").capitalize()
-    updated_at = tx.get("updated_at")
-    updated_at_str = format_timestamp(updated_at) if updated_at else "N/A"
+    f = TransactionService.summary_fields(tx)
+    updated_at_str = format_timestamp(f["updated_at"]) if f["updated_at"] else "N/A"
     
     return (
-        f"{idx}. {tx_type} | Status: {status}\n"
-        f"   Buy: {buy_grams}g @ ${buy_price:.2f} ({buy_price_type})\n"
-        f"   Sell: {sell_grams}g @ ${sell_price:.2f} ({sell_price_type})\n"
-        f"   PnL: ${pnl_str} | ID: {tx.get('uuid')[:8]}\n"
+        f"{idx}. {f['type']} | Status: {f['status']}\n"
+        f"   Buy: {f['buy_grams']}g @ ${f['buy_price']:.2f} ({f['buy_price_type']})\n"
+        f"   Sell: {f['sell_grams']}g @ ${f['sell_price']:.2f} ({f['sell_price_type']})\n"
+        f"   PnL: ${f['pnl']:.2f} | ID: {f['id'][:8]}\n"
         f"   Updated At: {updated_at_str}\n"
         f"------------------------"
     )
 
-def build_pagination_keyboard(current_page: int, total_count: int) -> types.InlineKeyboardMarkup:
-    total_pages = (total_count + ITEMS_PER_PAGE - 1) // ITEMS_PER_PAGE
-    
+def build_pagination_keyboard(current_page: int, has_next: bool) -> types.InlineKeyboardMarkup:
     buttons = []
     if current_page > 1:
         buttons.append(types.InlineKeyboardButton(text="⬅ Prev", callback_data=f"tx_page_{current_page-1}"))
-    if current_page < total_pages:
+    if has_next:
         buttons.append(types.InlineKeyboardButton(text="Next ➡", callback_data=f"tx_page_{current_page+1}"))
     
     inline_keyboard = []
@@ -214,3 +177,72 @@ def build_pagination_keyboard(current_page: int, total_count: int) -> types.Inli
     
     return types.InlineKeyboardMarkup(inline_keyboard=inline_keyboard)
 
+
+STATEMENT_RANGES = {"30": "Last 30 days", "90": "Last 90 days", "all": "All time"}
+
+def build_statement_keyboard() -> types.InlineKeyboardMarkup:
+    return types.InlineKeyboardMarkup(inline_keyboard=[
+        [types.InlineKeyboardButton(text=label, callback_data=f"stmt:{key}:csv") for key, label in STATEMENT_RANGES.items()],
+        [types.InlineKeyboardButton(text=f"{label} (.gz)", callback_data=f"stmt:{key}:gz") for key, label in STATEMENT_RANGES.items()],
+    ])
+
+def parse_statement_dates(start: str, end: str):
+    """Inclusive YYYY-MM-DD dates (IST) -> [start_ts, end_ts)."""
+    start_dt = datetime.strptime(start, "%Y-%m-%d").replace(tzinfo=IST)
+    end_dt = datetime.strptime(end, "%Y-%m-%d").replace(tzinfo=IST) + timedelta(days=1)
+    if end_dt <= start_dt:
+        raise ValueError("end before start")
+    return int(start_dt.timestamp()), int(end_dt.timestamp())
+
+@router.message(lambda m: (m.text or "").strip().lower().split()[:1] == ["statement"])
+async def statement_start(message: types.Message, user_uuid: str):
+    parts = message.text.strip().lower().split()
+    if len(parts) == 1:
+        await message.answer(
+            "Choose the period for your trade statement (CSV).\n"
+            "For specific dates send `statement YYYY-MM-DD YYYY-MM-DD`, add `gz` for a compressed file.",
+            reply_markup=build_statement_keyboard(),
+        )
+        return
+
+    try:
+        if len(parts) not in (3, 4) or (len(parts) == 4 and parts[3] != "gz"):
+            raise ValueError("bad format")
+        start_ts, end_ts = parse_statement_dates(parts[1], parts[2])
+    except ValueError:
+        await message.answer("❌ Please use `statement YYYY-MM-DD YYYY-MM-DD` (optionally followed by `gz`).")
+        return
+    await queue_statement(message, user_uuid, start_ts, end_ts, compress=len(parts) == 4)
+
+@router.callback_query(F.data.startswith("stmt:"))
+async def statement_range(callback: types.CallbackQuery, user_uuid: str):
+    _, range_key, fmt = callback.data.split(":")
+    now_ts = int(time.time())
+    start_ts = 0 if range_key == "all" else now_ts - int(range_key) * 86400
+    await callback.answer()
+    await queue_statement(callback.message, user_uuid, start_ts, now_ts + 1, compress=fmt == "gz")
+
+async def queue_statement(message: types.Message, user_uuid: str, start_ts: int, end_ts: int, compress: bool):
+    if not await StatementService.has_transactions(user_uuid, start_ts, end_ts):
+        await message.answer("No transactions found for the selected period.")
+        return
+    progress = await message.answer("⏳ Preparing your statement…")
+    job = send_statement(message.bot, message.chat.id, progress, user_uuid, start_ts, end_ts, compress)
+    if not export_executor.submit(job):
+        await progress.edit_text("⚠️ Too many statements are being prepared right now. Please try again shortly.")
+
+async def send_statement(bot: Bot, chat_id: int, progress: types.Message, user_uuid: str,
+                         start_ts: int, end_ts: int, compress: bool):
+    logger.info("[statement] Exporting statement for user %s (%s-%s, gzip=%s)", user_uuid, start_ts, end_ts, compress)
+    try:
+        period = "all time" if start_ts == 0 else f"{format_timestamp(start_ts)[:10]} to {format_timestamp(end_ts - 1)[:10]}"
+        await bot.send_document(
+            chat_id,
+            StatementFile(user_uuid, start_ts, end_ts, compress=compress),
+            caption=f"📄 Trade statement, {period} (IST)",
+        )
+        await progress.delete()
+    except Exception as e:
+        logger.error("[statement] Export failed for user %s: %s", user_uuid, e)
+        await progress.edit_text("⚠️ Failed to prepare your statement. Please try again later.")
+
@@ -1,18 +1,16 @@
 from aiogram import Router
 from aiogram.types import Message
-from app.services.user.user_service import UserService
 from app.services.wallet.wallet_service import WalletService
+from app.services.positions.position_book_service import PositionBookService
 from app.utils.logging import get_logger
 
 router = Router()
 logger = get_logger(__name__)
 
 @router.message(lambda message: (message.text or "").strip().lower() == "wallet")
-async def wallet_balance_handler(message: Message):
-    if not await UserService.ensure_user_approved(message):
-        return
+async def wallet_balance_handler(message: Message, user_uuid: str, wallet_id: str):
     telegram_id = message.from_user.id
-    wallet = await WalletService.get_wallet_for_user(telegram_id)
+    wallet = await WalletService.get_wallet_by_id(wallet_id)
     if not wallet:
         await message.answer("⚠️ Wallet not found. Please contact support.")
         logger.warning(f"Wallet not found for Telegram user {telegram_id}")
@@ -20,4 +18,13 @@ async def wallet_balance_handler(message: Message):
 
     balance = wallet.get("balance", 0)
     currency = wallet.get("currency", "USD")
-    await message.answer(f"💰 Your wallet balance is: {balance:.2f} {currency}")
+    lines = [f"💰 Your wallet balance is: {balance:.2f} {currency}"]
+
+    book = await PositionBookService.get_book(user_uuid)
+    if book.get("lots"):
+        lines.append(
+            f"📂 Open positions: {len(book['lots'])} | Net: {book['net_grams']:+.4g}g"
+            f" @ avg ${book['avg_cost']:.2f}"
+        )
+    lines.append(f"📈 Realized PnL: ${book.get('realized_pnl', 0):.2f}")
+    await message.answer("\n".join(lines))
@@ -23,9 +23,9 @@ from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 MAIN_MENU = ReplyKeyboardMarkup(
     keyboard=[
         [KeyboardButton(text="Buy Gold"), KeyboardButton(text="Sell Gold")],
-        [KeyboardButton(text="Live Price"), KeyboardButton(text="Wallet")],
+        [KeyboardButton(text="Live Price"), KeyboardButton(text="Watch Price"), KeyboardButton(text="Price Chart")],
         [KeyboardButton(text="Open Positions"), KeyboardButton(text="Closed Positions")], 
-        [KeyboardButton(text="Transactions")],
+        [KeyboardButton(text="Transactions"), KeyboardButton(text="Statement"), KeyboardButton(text="Wallet")],
     ],
     resize_keyboard=True
 )
@@ -0,0 +1,232 @@
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+from aiogram.methods import GetUpdates, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message, TelegramObject, Update
+from app.services.user.user_service import UserService
+from app.utils.logging import bind_update, get_logger, unbind_update
+from app.utils.metrics import handler_errors, handler_latency, updates_in_flight, updates_total
+from app.utils.startup import startup
+from app.utils.tracing import KIND_CLIENT, KIND_SERVER, tracer
+
+logger = get_logger(__name__)
+
+PENDING_APPROVAL_TEXT = "Your account activation is in progress. Please wait for approval."
+NOT_REGISTERED_TEXT = "Please send hi, hello before proceeding to any action"
+
+
+class AuthMiddleware(BaseMiddleware):
+    """
+    Outer update middleware that authorises every update once.
+
+    The user, approval status and wallet id are resolved from the cached auth
+    context and injected into handler data as `auth_user`, `user_uuid`,
+    `wallet_id` and `is_approved`, so handlers never look the user up just to
+    check access. Updates from users who are not approved stop here, before
+    any router filter runs:
+
+    - PENDING users get the "activation in progress" reply.
+    - Unknown (or rejected) users sending a message are handed to
+      `on_unregistered(message, state)`, the registration flow.
+    - Callback queries from non-approved users are answered with an alert.
+    """
+
+    def __init__(self, on_unregistered: Optional[Callable[[Message, FSMContext], Awaitable[Any]]] = None):
+        self.on_unregistered = on_unregistered
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        if from_user is None:
+            return await handler(event, data)
+
+        try:
+            auth = await UserService.get_auth_context(from_user.id)
+        except Exception as e:
+            logger.error("Auth lookup failed for user %s: %s", from_user.id, e)
+            if event.message:
+                await event.message.answer("An error occurred while verifying your account. Please try again later.")
+            elif event.callback_query:
+                await event.callback_query.answer("Please try again later.", show_alert=True)
+            return None
+
+        data["auth_user"] = auth["user"]
+        data["user_uuid"] = auth["user_uuid"]
+        data["wallet_id"] = auth["wallet_id"]
+        data["is_approved"] = auth["is_approved"]
+
+        if auth["is_approved"]:
+            return await handler(event, data)
+
+        if auth["status"] == "PENDING":
+            if event.message:
+                await event.message.answer(PENDING_APPROVAL_TEXT)
+            elif event.callback_query:
+                await event.callback_query.answer(PENDING_APPROVAL_TEXT, show_alert=True)
+            return None
+
+        if event.message and self.on_unregistered is not None:
+            return await self.on_unregistered(event.message, data["state"])
+        if event.callback_query:
+            await event.callback_query.answer(NOT_REGISTERED_TEXT, show_alert=True)
+        return None
+
+
+class LogContextMiddleware(BaseMiddleware):
+    """Outer update middleware tagging every log record written while handling an update with its ids."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        token = bind_update(from_user.id if from_user else None, event.update_id)
+        try:
+            return await handler(event, data)
+        finally:
+            unbind_update(token)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer update middleware counting updates by type and tracking how many are in flight."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        updates_total.labels(event.event_type).inc()
+        updates_in_flight.inc()
+        try:
+            return await handler(event, data)
+        finally:
+            updates_in_flight.dec()
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Inner middleware recording the latency of every handler call.
+
+    Series are keyed by the handler's module (one router per module in
+    app/telegram/handlers) and function name. The metric children are
+    looked up once per handler function and kept, so timing a call costs
+    two perf_counter reads and a histogram bisect.
+    """
+
+    def __init__(self):
+        self._series: Dict[Callable, Tuple[Any, Any]] = {}
+
+    def _series_for(self, callback: Callable) -> Tuple[Any, Any]:
+        series = self._series.get(callback)
+        if series is None:
+            router = callback.__module__.rsplit(".", 1)[-1]
+            name = getattr(callback, "__name__", type(callback).__name__)
+            series = self._series[callback] = (handler_latency.labels(router, name), handler_errors.labels(router, name))
+        return series
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        latency, errors = self._series_for(data["handler"].callback)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            latency.observe(time.perf_counter() - start)
+
+
+class UpdateTracingMiddleware(BaseMiddleware):
+    """
+    Outermost update middleware: opens the trace of an update. Everything
+    below it, including the other middlewares, runs inside the root span.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        with tracer.trace(
+            f"update {event.event_type}",
+            KIND_SERVER,
+            **{"telegram.update_id": event.update_id, "telegram.user_id": from_user.id if from_user else None},
+        ):
+            return await handler(event, data)
+
+
+class HandlerTracingMiddleware(BaseMiddleware):
+    """Inner middleware adding a span per handler call, named after the handler module and function."""
+
+    def __init__(self):
+        self._names: Dict[Callable, str] = {}
+
+    def _name_for(self, callback: Callable) -> str:
+        name = self._names.get(callback)
+        if name is None:
+            router = callback.__module__.rsplit(".", 1)[-1]
+            name = self._names[callback] = f"handler {router}.{getattr(callback, '__name__', type(callback).__name__)}"
+        return name
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if tracer.current() is None:
+            return await handler(event, data)
+        with tracer.span(self._name_for(data["handler"].callback)):
+            return await handler(event, data)
+
+
+class RequestTracingMiddleware(BaseRequestMiddleware):
+    """Bot session middleware adding a client span per Bot API call (`telegram SendMessage` etc.)."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Any:
+        if tracer.current() is None:
+            return await make_request(bot, method)
+        with tracer.span(f"telegram {type(method).__name__}", KIND_CLIENT):
+            return await make_request(bot, method)
+
+
+class StartupReportMiddleware(BaseRequestMiddleware):
+    """
+    Bot session middleware that closes the startup timing when the first
+    getUpdates goes out, i.e. when the bot starts receiving, then removes itself.
+    """
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Any:
+        if isinstance(method, GetUpdates):
+            bot.session.middleware.unregister(self)
+            startup.mark("first_poll")
+            startup.report()
+        return await make_request(bot, method)
@@ -0,0 +1,393 @@
+"""
+Chat-sharded multi-process mode (BOT_MODE=sharded).
+
+One receiver process long-polls `getUpdates` with plain aiohttp, reads just
+enough of each update to find its chat, and hands the raw update to one of
+`BOT_WORKERS` worker processes picked by consistent hashing on `chat_id`.
+All updates of a chat therefore land on the same worker, which owns that
+chat's FSM state, quotes and price watches, and a worker handles a chat's
+updates one at a time, in order, while different chats run concurrently.
+
+Each worker is a spawned process with its own event loop, `setup_dispatcher()`,
+Bot session, Mongo pool and background services; the trigger engine in a
+worker only arms the stop-loss/take-profit levels of its own chats. Parsing,
+validation, handlers and formatting all happen in the workers, so the bot
+scales past one core. The workers open no price feed of their own: the
+receiver forwards every tick of its feed to them.
+
+Updates reach a worker over its own Pipe and are buffered in the receiver
+until the worker acks them, with at most MAX_IN_FLIGHT sent and unacked.
+The receiver also supervises the workers: a worker that dies is started
+again (with backoff) on a new Pipe, and the updates it had not acked are
+replayed to it before any others. An update the worker handled but died
+before acking is therefore handled twice. Telegram's offset moves past an
+update once it is in the receiver's buffer, so only the receiver process
+dying loses updates, as it would in single-process polling.
+"""
+import asyncio
+import multiprocessing
+import signal
+import threading
+import time
+from bisect import bisect
+from collections import deque
+from hashlib import blake2b
+from multiprocessing.connection import Connection
+from queue import SimpleQueue
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+import aiohttp
+from app.utils.config import settings
+from app.utils.logging import get_logger
+from app.utils.metrics import shard_updates, worker_restarts
+
+logger = get_logger(__name__)
+
+API_URL = "https://api.telegram.org/bot{token}/{method}"
+POLL_TIMEOUT = 30            # seconds getUpdates may hang waiting for updates
+QUEUE_SIZE = 10000           # updates buffered per worker before the receiver stops polling
+MAX_IN_FLIGHT = 200          # updates sent to a worker and not acked yet (handled concurrently across chats)
+MAX_RESTART_BACKOFF = 30.0   # seconds
+STABLE_AFTER = 60.0          # a worker up this long has its crash backoff reset
+
+_CLOSE = object()  # stops a _WorkerLink's sender thread
+
+
+class HashRing:
+    """
+    Consistent hash ring over worker indices. Each worker owns `replicas`
+    points, so changing the worker count only moves about 1/N of the chats.
+    """
+
+    def __init__(self, nodes: Sequence[int], replicas: int = 100):
+        points = sorted(
+            (self._hash(f"{node}:{replica}"), node) for node in nodes for replica in range(replicas)
+        )
+        self._keys = [key for key, _ in points]
+        self._nodes = [node for _, node in points]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(blake2b(value.encode(), digest_size=8).digest(), "big")
+
+    def node_for(self, chat_id: int) -> int:
+        i = bisect(self._keys, self._hash(str(chat_id)))
+        return self._nodes[i % len(self._nodes)]
+
+
+def chat_id_of(update: Dict[str, Any]) -> Optional[int]:
+    """The chat a raw update belongs to: the message's chat, else the sender."""
+    for key, payload in update.items():
+        if key == "update_id" or not isinstance(payload, dict):
+            continue
+        message = payload.get("message") if key == "callback_query" else payload
+        if isinstance(message, dict) and "chat" in message:
+            return message["chat"]["id"]
+        if "chat" in payload:
+            return payload["chat"]["id"]
+        if "from" in payload:
+            return payload["from"]["id"]
+    return None
+
+
+# --- worker process -----------------------------------------------------------
+
+def _worker_main(index: int, workers: int, conn: Connection) -> None:
+    """Entry point of a worker process."""
+    # Ctrl+C reaches the whole process group; the receiver shuts workers down in order
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from app.utils.logging import setup_logging
+    setup_logging(f"telegram-bot-worker-{index}")
+    asyncio.run(_serve(index, workers, conn))
+
+
+async def _serve(index: int, workers: int, conn: Connection) -> None:
+    from aiogram import Bot
+    from app.db.mongo.mongodb import close_mongodb_connection, connect_to_mongodb
+    from app.services.positions.triggers import trigger_engine
+    from app.services.price.price_service import publish_price
+    from app.telegram.bot import start_background_services, stop_background_services
+    from app.telegram.dispatcher import setup_dispatcher
+    from app.telegram.middlewares import RequestTracingMiddleware
+    from app.utils.loop_monitor import loop_monitor
+    from app.utils.tracing import tracer
+
+    await connect_to_mongodb()
+    ring = HashRing(range(workers))
+    trigger_engine.owns_chat = lambda chat_id: ring.node_for(chat_id) == index
+
+    bot = Bot(token=settings.TELEGRAM.TELEGRAM_BOT_TOKEN)
+    bot.session.middleware(RequestTracingMiddleware())
+    dp = setup_dispatcher()
+    services = start_background_services(bot, dp)
+    traces = asyncio.create_task(tracer.run())
+    lag_monitor = asyncio.create_task(loop_monitor.run()) if settings.LOOP_MONITOR.ENABLED else None
+    logger.info("Worker %s/%s ready", index, workers)
+
+    loop = asyncio.get_running_loop()
+    tails: Dict[int, asyncio.Task] = {}  # chat_id -> last queued update of that chat
+
+    async def handle(previous: Optional[asyncio.Task], update: Dict[str, Any]) -> None:
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await dp.feed_raw_update(bot, update)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Worker %s failed to handle update %s: %s", index, update.get("update_id"), e)
+        # Handled, or failed for good: either way the receiver must not send it again
+        conn.send(update["update_id"])
+
+    def forget(chat_id: int, task: asyncio.Task) -> None:
+        if tails.get(chat_id) is task:
+            del tails[chat_id]
+
+    try:
+        while True:
+            try:
+                message = await loop.run_in_executor(None, conn.recv)
+            except EOFError:  # the receiver is gone
+                break
+            if message is None:  # shutdown sentinel
+                break
+            kind, payload = message
+            if kind == "price":
+                publish_price(payload)
+                continue
+            for chat_id, update in payload:
+                task = asyncio.create_task(handle(tails.get(chat_id), update))
+                tails[chat_id] = task
+                task.add_done_callback(lambda t, c=chat_id: forget(c, t))
+        if tails:
+            await asyncio.wait(list(tails.values()))
+    finally:
+        await stop_background_services(services)
+        traces.cancel()
+        if lag_monitor:
+            lag_monitor.cancel()
+        await bot.session.close()
+        await close_mongodb_connection()
+        conn.close()
+        logger.info("Worker %s stopped", index)
+
+
+# --- receiver and supervisor ---------------------------------------------------
+
+class _WorkerLink:
+    """
+    The receiver's end of one worker's Pipe. A thread sends the messages
+    queued with `send`, so a worker that stops reading never blocks the
+    receiver's loop, and another thread passes the worker's acks to `on_ack`
+    on the loop. A restarted worker gets a new Pipe and a new link.
+    """
+
+    def __init__(self, index: int, conn: Connection, loop: asyncio.AbstractEventLoop,
+                 on_ack: Callable[[int, int], None]):
+        self.index = index
+        self.conn = conn
+        self._loop = loop
+        self._on_ack = on_ack
+        self._outbox: SimpleQueue = SimpleQueue()
+        threading.Thread(target=self._send_loop, name=f"bot-worker-{index}-send", daemon=True).start()
+        threading.Thread(target=self._ack_loop, name=f"bot-worker-{index}-acks", daemon=True).start()
+
+    def send(self, message: Any) -> None:
+        self._outbox.put(message)
+
+    def close(self) -> None:
+        self._outbox.put(_CLOSE)
+
+    def _send_loop(self) -> None:
+        while True:
+            message = self._outbox.get()
+            if message is _CLOSE:
+                break
+            try:
+                self.conn.send(message)
+            except (OSError, ValueError):  # the worker died; what it had not acked is replayed
+                break
+
+    def _ack_loop(self) -> None:
+        while True:
+            try:
+                update_id = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            try:
+                self._loop.call_soon_threadsafe(self._on_ack, self.index, update_id)
+            except RuntimeError:  # loop closed at shutdown
+                break
+        self.conn.close()
+
+
+class ShardedPoller:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.ring = HashRing(range(workers))
+        self._ctx = multiprocessing.get_context("spawn")
+        self._links: List[Optional[_WorkerLink]] = [None] * workers
+        # Per worker: updates not sent yet, and updates sent but not acked, in the order they were routed
+        self._waiting: List[Deque[Tuple[int, Dict[str, Any]]]] = [deque() for _ in range(workers)]
+        self._unacked: List[Dict[int, Tuple[int, Dict[str, Any]]]] = [{} for _ in range(workers)]
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self._restarts = [0] * workers
+        self._started_at = [0.0] * workers
+        self._price: Optional[float] = None
+        self._stopping = False
+
+    def _start_worker(self, index: int) -> None:
+        conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main, args=(index, self.workers, child_conn),
+            name=f"bot-worker-{index}", daemon=True,
+        )
+        process.start()
+        # Only the worker holds the other end now, so its exit shows up here as EOF
+        child_conn.close()
+        link = self._links[index] = _WorkerLink(index, conn, asyncio.get_running_loop(), self._ack)
+        self._processes[index] = process
+        self._started_at[index] = time.monotonic()
+        if self._price is not None:
+            link.send(("price", self._price))
+        unacked = self._unacked[index]
+        if unacked:
+            logger.warning("Replaying %s unacknowledged updates to bot worker %s", len(unacked), index)
+            link.send(("updates", list(unacked.values())))
+        self._pump(index)
+        logger.info("Started bot worker %s (pid %s)", index, process.pid)
+
+    def _pump(self, index: int) -> None:
+        """Send worker `index` as many waiting updates as it has room for in flight."""
+        link, waiting, unacked = self._links[index], self._waiting[index], self._unacked[index]
+        if link is None or not waiting:
+            return
+        batch = []
+        while waiting and len(unacked) < MAX_IN_FLIGHT:
+            chat_id, update = item = waiting.popleft()
+            unacked[update["update_id"]] = item
+            batch.append(item)
+        if batch:
+            link.send(("updates", batch))
+
+    def _ack(self, index: int, update_id: int) -> None:
+        self._unacked[index].pop(update_id, None)
+        self._pump(index)
+
+    def _on_price(self, price: float) -> None:
+        """Forward each tick of this process's price feed to every worker."""
+        self._price = price
+        for link in self._links:
+            if link is not None:
+                link.send(("price", price))
+
+    async def _supervise(self) -> None:
+        """Restart workers that exit, backing off on repeated crashes."""
+        next_start = [0.0] * self.workers
+        while not self._stopping:
+            await asyncio.sleep(1)
+            now = time.monotonic()
+            for index, process in enumerate(self._processes):
+                if process is None or process.is_alive() or self._stopping:
+                    continue
+                if not next_start[index]:
+                    link = self._links[index]
+                    if link is not None:
+                        link.close()
+                        self._links[index] = None
+                    if now - self._started_at[index] >= STABLE_AFTER:
+                        self._restarts[index] = 0
+                    backoff = min(MAX_RESTART_BACKOFF, 2 ** self._restarts[index])
+                    next_start[index] = now + backoff
+                    logger.error("Bot worker %s exited with code %s, restarting in %.0fs",
+                                 index, process.exitcode, backoff)
+                elif now >= next_start[index]:
+                    next_start[index] = 0.0
+                    self._restarts[index] += 1
+                    worker_restarts.labels(str(index)).inc()
+                    self._start_worker(index)
+
+    async def _route(self, update: Dict[str, Any]) -> None:
+        chat_id = chat_id_of(update)
+        if chat_id is None:
+            chat_id = update["update_id"]
+        index = self.ring.node_for(chat_id)
+        shard_updates.labels(str(index)).inc()
+        # The worker is behind or restarting: hold off polling, and so confirming, more updates
+        while len(self._waiting[index]) + len(self._unacked[index]) >= QUEUE_SIZE:
+            await asyncio.sleep(0.05)
+        self._waiting[index].append((chat_id, update))
+        self._pump(index)
+
+    async def _poll(self, allowed_updates: List[str]) -> None:
+        url = API_URL.format(token=settings.TELEGRAM.TELEGRAM_BOT_TOKEN, method="getUpdates")
+        offset = None
+        failures = 0
+        timeout = aiohttp.ClientTimeout(total=POLL_TIMEOUT + 10)
+        async with aiohttp.ClientSession(timeout=timeout) as http:
+            while True:
+                payload = {"timeout": POLL_TIMEOUT, "allowed_updates": allowed_updates}
+                if offset is not None:
+                    payload["offset"] = offset
+                try:
+                    async with http.post(url, json=payload) as response:
+                        body = await response.json()
+                    if not body.get("ok"):
+                        raise RuntimeError(body.get("description", f"HTTP {response.status}"))
+                    failures = 0
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    failures += 1
+                    delay = min(MAX_RESTART_BACKOFF, failures)
+                    logger.error("getUpdates failed (%s), retrying in %ss", e, delay)
+                    await asyncio.sleep(delay)
+                    continue
+                for update in body["result"]:
+                    await self._route(update)
+                    offset = update["update_id"] + 1
+
+    async def run(self, allowed_updates: List[str]) -> None:
+        from app.services.price.price_service import add_price_listener, remove_price_listener
+
+        logger.info("Starting Telegram bot (sharded, %s workers)...", self.workers)
+        add_price_listener(self._on_price)
+        for index in range(self.workers):
+            self._start_worker(index)
+        supervisor = asyncio.create_task(self._supervise())
+        try:
+            await self._poll(allowed_updates)
+        finally:
+            remove_price_listener(self._on_price)
+            self._stopping = True
+            supervisor.cancel()
+            await self.stop()
+
+    async def stop(self, timeout: float = 15.0) -> None:
+        """Let every worker finish the updates routed to it, then stop it."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and any(
+            (waiting or unacked) and link is not None
+            for waiting, unacked, link in zip(self._waiting, self._unacked, self._links)
+        ):
+            await asyncio.sleep(0.05)
+        for index, link in enumerate(self._links):
+            pending = len(self._waiting[index]) + len(self._unacked[index])
+            if pending:
+                logger.warning("Bot worker %s stops with %s updates not handled", index, pending)
+            if link is not None:
+                link.send(None)
+                link.close()
+        for index, process in enumerate(self._processes):
+            if process is None:
+                continue
+            await asyncio.to_thread(process.join, max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("Bot worker %s did not stop in time, terminating", index)
+                process.terminate()
+
+
+async def start_sharded_polling(workers: Optional[int] = None) -> None:
+    from app.telegram.dispatcher import setup_dispatcher
+
+    allowed_updates = setup_dispatcher().resolve_used_update_types()
+    await ShardedPoller(workers or settings.TELEGRAM.WORKERS).run(allowed_updates)
@@ -0,0 +1,67 @@
+import asyncio
+from typing import Coroutine, Set
+from app.utils.logging import get_logger
+from app.utils.tracing import tracer
+
+logger = get_logger(__name__)
+
+
+class BackgroundExecutor:
+    """
+    Bounded runner for work that should finish after the handler returns.
+
+    At most `max_concurrency` jobs run at once; up to `max_pending` jobs
+    (running + waiting) are accepted, beyond that `submit` refuses the job so
+    the caller can tell the user to retry instead of queueing without limit.
+    """
+
+    def __init__(self, name: str, max_concurrency: int = 20, max_pending: int = 500):
+        self.name = name
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    def submit(self, job: Coroutine) -> bool:
+        """Schedule a coroutine. Returns False (and discards it) when the executor is full."""
+        if len(self._tasks) >= self.max_pending:
+            job.close()
+            logger.warning("[%s] executor full (%s pending), job rejected", self.name, self.max_pending)
+            return False
+        # Started now so the update's trace stays open until the job is done
+        span = tracer.start_span(f"background {self.name}")
+        task = asyncio.create_task(self._run(job, span))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def drain(self, timeout: float = 10.0) -> None:
+        """Wait for in-flight jobs, e.g. on shutdown."""
+        if not self._tasks:
+            return
+        logger.info("[%s] waiting for %s background jobs", self.name, len(self._tasks))
+        _, still_running = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in still_running:
+            task.cancel()
+
+    async def _run(self, job: Coroutine, span=None) -> None:
+        with tracer.activate(span):
+            async with self._semaphore:
+                try:
+                    await job
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    if span is not None:
+                        span.fail(e)
+                    logger.error("[%s] background job failed: %s", self.name, e)
+
+
+# Trade confirmations (buy, sell, close) run here after the callback is acknowledged
+trade_executor = BackgroundExecutor("trades", max_concurrency=20, max_pending=500)
+
+# Statement exports: long-running uploads, kept few so they cannot crowd out trades
+export_executor = BackgroundExecutor("exports", max_concurrency=4, max_pending=50)
@@ -5,10 +5,10 @@ async def generate_uuid() -> str:
 
 from datetime import datetime, timedelta, timezone
 
+IST = timezone(timedelta(hours=5, minutes=30))  # all user-facing dates are IST
+
 def format_timestamp(timestamp: int) -> str:
-    ist_offset = timedelta(hours=5, minutes=30)  # IST offset from UTC
-    ist_timezone = timezone(ist_offset)
-    dt = datetime.fromtimestamp(timestamp, tz=ist_timezone)
+    dt = datetime.fromtimestamp(timestamp, tz=IST)
     return dt.strftime('%Y-%m-%d %H:%M:%S')
 
 from aiogram.fsm.context import FSMContext
@@ -50,35 +50,32 @@ async def check_retry_limit(
         await message.answer(f"{error_text} (Attempt {attempts}/{max_attempts})")
         return True
 
-import time
 from aiogram.dispatcher.middlewares.base import BaseMiddleware
 from aiogram.types import TelegramObject
 from aiogram.fsm.context import FSMContext
+from app.utils.session_expiry import SessionExpiryTracker
 
 INACTIVITY_TIMEOUT = 10  # or 60, as needed
+INACTIVITY_NOTIFY = True  # tell the chat when its session is expired
+
+session_tracker = SessionExpiryTracker(timeout=INACTIVITY_TIMEOUT, notify=INACTIVITY_NOTIFY)
 
 class InactivityMiddleware(BaseMiddleware):
+    """
+    Records the last activity of each FSM session.
+
+    Only a timestamp is written per update; expiry itself happens in the
+    background (see `SessionExpiryTracker.run`), so no storage round trips
+    are added in front of the handler.
+    """
+
+    def __init__(self, tracker: SessionExpiryTracker = session_tracker):
+        self.tracker = tracker
+
     async def __call__(self, handler, event: TelegramObject, data: dict):
         state: FSMContext = data.get("state")
-        message_obj = None
-        # Identify correct message object for answering
-        if isinstance(event, types.Message):
-            message_obj = event
-        elif isinstance(event, types.CallbackQuery):
-            message_obj = event.message
-
         if state is not None:
-            state_data = await state.get_data()
-            last_active = state_data.get("last_active")
-            now = int(time.time())
-            if last_active is not None and now - last_active > INACTIVITY_TIMEOUT:
-                await state.clear()
-                if message_obj:
-                    await message_obj.answer("❌ Session expired due to inactivity. Please start again.")
-                return  # Skip handler execution
-            # Update last interaction timestamp
-            await state.update_data(last_active=now)
-
+            self.tracker.touch(state.key)
         return await handler(event, data)
 
 from functools import wraps
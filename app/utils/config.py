@@ -4,7 +4,6 @@ from pydantic import BaseModel, field_validator, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
 from dotenv import load_dotenv
-from pathlib import Path
 
 # Load .env file
 load_dotenv()
@@ -15,6 +14,10 @@ class DatabaseTables(BaseModel):
     TRANSACTIONS: str = os.getenv("TRANSACTIONS")
     INVENTORY: str = os.getenv("INVENTORY")
     ORDER_TRANSACTIONS: str = os.getenv("ORDER_TRANSACTIONS")
+    POSITION_BOOKS: str = os.getenv("POSITION_BOOKS", "position_books")
+    WALLET_LEDGER: str = os.getenv("WALLET_LEDGER", "wallet_ledger")
+    WALLET_SNAPSHOTS: str = os.getenv("WALLET_SNAPSHOTS", "wallet_snapshots")
+    DAILY_ROLLUPS: str = os.getenv("DAILY_ROLLUPS", "daily_rollups")
 
 class DatabaseConfig(BaseModel):
     URL: str = "mongodb://localhost:27017"
@@ -24,6 +27,14 @@ class DatabaseConfig(BaseModel):
     MAX_IDLE_TIME_MS: int = 30000
     SERVER_SELECTION_TIMEOUT_MS: int = 5000
     CONNECT_TIMEOUT_MS: int = 10000
+    USE_TRANSACTIONS: Optional[bool] = None  # unset: on when the server is a replica set member or mongos
+    BACKEND: str = "motor"  # "motor", or "memory" for an in-process database that persists nothing
+
+    @field_validator('BACKEND')
+    def validate_backend(cls, v):
+        if v.lower() not in ("motor", "memory"):
+            raise ValueError("DB backend must be 'motor' or 'memory'")
+        return v.lower()
 
 class ServerConfig(BaseModel):
     HOST: str = "0.0.0.0"
@@ -41,13 +52,18 @@ class AppConfig(BaseModel):
 
 class TelegramConfig(BaseModel):
     TELEGRAM_BOT_TOKEN: str = os.getenv("TELEGRAM_BOT_TOKEN")
-    BOT_MODE: str = "polling"
+    BOT_MODE: str = os.getenv("BOT_MODE", "polling")  # "polling", or "sharded" for multi-process
+    WORKERS: int = int(os.getenv("BOT_WORKERS", "4"))  # worker processes in sharded mode
 
 class LoggingConfig(BaseModel):
     LEVEL: str = "info"
     FILE_PATH: str = "../logs"
     ROTATION_SIZE_MB: int = 10
     BACKUP_COUNT: int = 5
+    JSON: bool = True  # one JSON object per line; False for the plain text format
+    QUEUE_SIZE: int = 10000  # records waiting for the writer thread; beyond that they are dropped
+    SAMPLE_RATE_PER_SEC: float = 50  # per logger, for records below WARNING; 0 disables sampling
+    SAMPLE_BURST: int = 200
     
     @field_validator('LEVEL')
     def validate_log_level(cls, v):
@@ -56,6 +72,28 @@ class LoggingConfig(BaseModel):
             raise ValueError(f"Log level must be one of {allowed_levels}")
         return v.lower()
 
+class TracingConfig(BaseModel):
+    ENABLED: bool = True
+    SAMPLE_RATE: float = 0.01  # share of ordinary updates kept; slow or failed ones are always kept
+    SLOW_THRESHOLD_MS: int = 1000
+    EXPORT_PATH: str = "../logs/traces.jsonl"
+    OTLP_ENDPOINT: str = ""  # e.g. http://localhost:4318/v1/traces; takes precedence over EXPORT_PATH
+    EXPORT_INTERVAL: float = 5.0
+
+class LoopMonitorConfig(BaseModel):
+    ENABLED: bool = True
+    INTERVAL_MS: int = 100
+    THRESHOLD_MS: int = 250  # log the loop thread's stack once it is blocked this long
+
+class AdminConfig(BaseModel):
+    API_TOKEN: str = ""  # sent as X-Admin-Token to /admin/* and /risk/*; empty disables them
+    PROFILE_MAX_SECONDS: int = 60
+
+class TickStoreConfig(BaseModel):
+    ENABLED: bool = True
+    PATH: str = "../data/ticks"  # one pair of column files per UTC day
+    FLUSH_INTERVAL: float = 1.0  # seconds buffered ticks wait before being written
+
 class Settings(BaseSettings):
     # Environment
     ENV: str = "development"
@@ -67,6 +105,10 @@ class Settings(BaseSettings):
     LOG: LoggingConfig = LoggingConfig()
     DB_TABLE: DatabaseTables = DatabaseTables()
     TELEGRAM: TelegramConfig = TelegramConfig()
+    TRACE: TracingConfig = TracingConfig()
+    ADMIN: AdminConfig = AdminConfig()
+    LOOP_MONITOR: LoopMonitorConfig = LoopMonitorConfig()
+    TICKS: TickStoreConfig = TickStoreConfig()
     model_config = SettingsConfigDict(
         env_file='.env',
         env_file_encoding='utf-8',
@@ -89,10 +131,8 @@ class Settings(BaseSettings):
             if self.LOG.LEVEL == "debug":  # In production, minimum level is info
                 self.LOG.LEVEL = "info"
         
-        # Ensure log directory exists
-        log_dir = Path(self.LOG.FILE_PATH)
-        log_dir.mkdir(exist_ok=True)
-        
+        # No filesystem work here: settings are built at import time. Log
+        # directories are created by whatever writes to them.
         return self
     
     def is_development(self) -> bool:
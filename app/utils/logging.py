@@ -1,35 +1,155 @@
+import atexit
+import json
 import logging
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+import time
+from contextvars import ContextVar, Token
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from app.utils.config import settings
+from app.utils.metrics import log_records_dropped
 
 # Use a flag for development mode; later replace with your config
 is_development = True
 
-def setup_logging() -> None:
-    log_dir = Path("./logs/telegram-bot")  # Keep bot logs separate
+# (telegram_id, update_id) of the update being handled, set by LogContextMiddleware
+_update_context: ContextVar[Tuple[Optional[int], Optional[int]]] = ContextVar(
+    "log_update_context", default=(None, None)
+)
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RESERVED = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+
+def bind_update(telegram_id: Optional[int], update_id: Optional[int]) -> Token:
+    """Tag log records from this context (and tasks it starts) with the update; undo with `unbind_update`."""
+    return _update_context.set((telegram_id, update_id))
+
+
+def unbind_update(token: Token) -> None:
+    _update_context.reset(token)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra={...}` fields are included as they are."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RateSampler(logging.Filter):
+    """
+    Token bucket per logger for records below WARNING: each logger may emit
+    `rate` records per second with bursts of `burst`; the rest are dropped and
+    counted, and the next record let through carries `suppressed=<count>`.
+    Warnings and errors always pass.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, List[float]] = {}  # logger -> [tokens, last refill, suppressed]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.rate <= 0:
+            return True
+        now = time.monotonic()
+        bucket = self._buckets.get(record.name)
+        if bucket is None:
+            bucket = self._buckets[record.name] = [float(self.burst), now, 0]
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            bucket[2] += 1
+            log_records_dropped.labels("sampled").inc()
+            return False
+        bucket[0] = tokens - 1
+        if bucket[2]:
+            record.suppressed = int(bucket[2])
+            bucket[2] = 0
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler that never waits: when the writer thread falls behind and
+    the queue is full, the record is dropped and counted.
+
+    `prepare` runs on the caller's thread, so it only freezes the message and
+    stamps the update context; formatting (JSON, tracebacks) happens in the
+    listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        telegram_id, update_id = _update_context.get()
+        if telegram_id is not None:
+            record.telegram_id = telegram_id
+        if update_id is not None:
+            record.update_id = update_id
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped.labels("queue_full").inc()
+
+
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logging(name: str = "telegram-bot") -> None:
+    global _listener
+    log_dir = Path("./logs") / name  # Keep bot logs separate; sharded workers each get their own
     log_dir.mkdir(parents=True, exist_ok=True)
 
-    rotation_size = 10 * 1024 * 1024
-    backup_count = 5
+    rotation_size = settings.LOG.ROTATION_SIZE_MB * 1024 * 1024
+    backup_count = settings.LOG.BACKUP_COUNT
 
     root_logger = logging.getLogger()
     base_level = logging.INFO if is_development else logging.WARNING
     root_logger.setLevel(base_level)
 
     # Remove old handlers if any
+    _stop_listener()
     for handler in root_logger.handlers[:]:
         root_logger.removeHandler(handler)
 
-    formatter = logging.Formatter(
-        "%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-        "%Y-%m-%d %H:%M:%S"
-    )
+    if settings.LOG.JSON:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            "%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+            "%Y-%m-%d %H:%M:%S"
+        )
 
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
     console_handler.setLevel(base_level)
-    root_logger.addHandler(console_handler)
 
     file_handler = RotatingFileHandler(
         filename=log_dir / "app.log",
@@ -39,7 +159,6 @@ def setup_logging() -> None:
     )
     file_handler.setFormatter(formatter)
     file_handler.setLevel(base_level)
-    root_logger.addHandler(file_handler)
 
     error_file_handler = RotatingFileHandler(
         filename=log_dir / "error.log",
@@ -49,7 +168,18 @@ def setup_logging() -> None:
     )
     error_file_handler.setFormatter(formatter)
     error_file_handler.setLevel(logging.ERROR)
-    root_logger.addHandler(error_file_handler)
+
+    # The event loop only enqueues; a listener thread formats, writes and rotates
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG.QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(RateSampler(settings.LOG.SAMPLE_RATE_PER_SEC, settings.LOG.SAMPLE_BURST))
+    root_logger.addHandler(queue_handler)
+
+    _listener = QueueListener(
+        log_queue, console_handler, file_handler, error_file_handler, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(_stop_listener)
 
     # Optional: if you want **all** pymongo logs visible, comment these lines out:
     # logging.getLogger("watchfiles").setLevel(logging.ERROR)
@@ -62,4 +192,4 @@ def setup_logging() -> None:
     logging.info(f"Application initialized in {'development' if is_development else 'production'} mode")
 
 def get_logger(name: str) -> logging.Logger:
-    return logging.getLogger(name)
\ No newline at end of file
+    return logging.getLogger(name)
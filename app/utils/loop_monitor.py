@@ -0,0 +1,71 @@
+"""
+Event-loop lag watchdog.
+
+A coroutine on the loop sleeps `interval` seconds in a cycle and records how
+late it wakes up: that scheduling delay is what every handler, the FastAPI
+app and the price feed wait on top of their own work. It is exported as the
+`event_loop_lag_seconds` histogram.
+
+Lag is only known after the loop is free again, which is too late to see
+what blocked it. So a helper thread watches the coroutine's heartbeat and,
+once it is `threshold` overdue, grabs the loop thread's current stack with
+`sys._current_frames()` and logs it; the stack shows the blocking call while
+it is still running. One stack is logged per stall.
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+from app.utils.config import settings
+from app.utils.logging import get_logger
+from app.utils.metrics import loop_lag, loop_stalls
+
+logger = get_logger(__name__)
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.1, threshold: float = 0.25):
+        self.interval = interval
+        self.threshold = threshold
+        self._heartbeat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._stop = threading.Event()
+
+    def _watch(self) -> None:
+        """Helper thread: log the loop thread's stack when the heartbeat is overdue."""
+        reported = None
+        while not self._stop.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            overdue = time.monotonic() - heartbeat - self.interval
+            if overdue < self.threshold or reported == heartbeat:
+                continue
+            reported = heartbeat
+            loop_stalls.inc()
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "<no frame>\n"
+            logger.warning("Event loop blocked for %.0fms so far, loop thread stack:\n%s", overdue * 1000, stack)
+
+    async def run(self) -> None:
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        watcher = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        watcher.start()
+        logger.info("Loop lag monitor started (threshold %.0fms)", self.threshold * 1000)
+        try:
+            while True:
+                start = time.monotonic()
+                await asyncio.sleep(self.interval)
+                now = time.monotonic()
+                loop_lag.observe(max(0.0, now - start - self.interval))
+                self._heartbeat = now
+        finally:
+            self._stop.set()
+
+
+loop_monitor = LoopLagMonitor(
+    interval=settings.LOOP_MONITOR.INTERVAL_MS / 1000,
+    threshold=settings.LOOP_MONITOR.THRESHOLD_MS / 1000,
+)
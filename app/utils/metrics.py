@@ -0,0 +1,227 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+All recording happens on the event loop thread, so updates are plain
+attribute increments without locks. Each labelled child is created once and
+cached; on the hot path recording is a dict lookup plus an add (or a bisect
+for histograms), with nothing allocated per observation. `render()` walks the
+registry when /metrics is scraped.
+"""
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; tuned for Telegram handlers, which mostly finish in 1-500 ms
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # per bucket, the last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class _Metric:
+    kind = ""
+    child_class = _CounterChild
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._default = self._children[()] = self._new_child()
+
+    def _new_child(self):
+        return self.child_class()
+
+    def labels(self, *values: str):
+        """The child for these label values, created on first use. Callers on hot paths can keep it."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def samples(self) -> Iterable[Tuple[str, Tuple[str, ...], float]]:
+        for values, child in self._children.items():
+            yield self.name, values, child.value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, values, value in self.samples():
+            lines.append(f"{name}{_label_text(self.labelnames, values)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.value += amount
+
+
+class Gauge(_Metric):
+    """
+    Gauge set by the code, or computed at scrape time when `collect` is given:
+    a callable returning (label values, value) pairs.
+    """
+
+    kind = "gauge"
+    child_class = _GaugeChild
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 collect: Optional[Callable[[], Iterable[Tuple[Tuple[str, ...], float]]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default.value -= amount
+
+    def set(self, value: float) -> None:
+        self._default.value = value
+
+    def samples(self):
+        if self.collect is None:
+            yield from super().samples()
+            return
+        for values, value in self.collect():
+            yield self.name, tuple(values), value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(float(b) for b in buckets if b != float("inf")))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        names = self.labelnames + ("le",)
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), child.counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_label_text(names, values + (_format_value(bound),))} {cumulative}")
+            labels = _label_text(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), collect=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, collect))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+registry = MetricsRegistry()
+
+handler_latency = registry.histogram(
+    "bot_handler_duration_seconds", "Time spent in Telegram handlers.", ("router", "handler"))
+handler_errors = registry.counter(
+    "bot_handler_errors_total", "Telegram handlers that raised.", ("router", "handler"))
+updates_total = registry.counter("bot_updates_total", "Telegram updates received.", ("type",))
+updates_in_flight = registry.gauge("bot_updates_in_flight", "Telegram updates being processed.")
+# Filled in at scrape time from the FSM storage, see app/telegram/dispatcher.py
+fsm_sessions = registry.gauge("bot_fsm_sessions", "Chats currently in each FSM state.", ("state",))
+trade_outcomes = registry.counter(
+    "bot_trades_total", "Trade attempts by kind and result.", ("kind", "result"))
+price_ticks = registry.counter("price_feed_ticks_total", "Price updates received from the feed.")
+price_feed_errors = registry.counter("price_feed_errors_total", "Price feed connection failures.")
+price_listener_errors = registry.counter("price_listener_errors_total", "Price listeners that raised.")
+price_last = registry.gauge("price_feed_last_price", "Latest gold price.")
+price_last_tick = registry.gauge("price_feed_last_tick_timestamp_seconds", "Unix time of the latest price update.")
+log_records_dropped = registry.counter(
+    "log_records_dropped_total", "Log records not written, by reason (sampled, queue_full).", ("reason",))
+startup_phase_seconds = registry.gauge(
+    "startup_phase_seconds", "Duration of each phase of the last startup.", ("phase",))
+shard_updates = registry.counter(
+    "bot_shard_updates_total", "Updates routed to each worker in sharded mode.", ("worker",))
+worker_restarts = registry.counter(
+    "bot_worker_restarts_total", "Worker processes restarted by the sharded-mode supervisor.", ("worker",))
+loop_lag = registry.histogram(
+    "event_loop_lag_seconds", "How late the event loop runs a callback scheduled to run now.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+loop_stalls = registry.counter(
+    "event_loop_stalls_total", "Times the event loop was blocked past the watchdog threshold.")
@@ -0,0 +1,96 @@
+import asyncio
+import math
+import time
+from typing import Dict, Optional
+from aiogram import Bot
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from app.utils.timer_wheel import TimerWheel
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+SESSION_EXPIRED_TEXT = "❌ Session expired due to inactivity. Please start again."
+
+
+class SessionExpiryTracker:
+    """
+    Expires idle FSM sessions in the background.
+
+    The update path only records a timestamp per storage key (`touch`); a
+    single background task advances a timer wheel once per second and clears
+    the FSM state of keys that have been idle for longer than `timeout`.
+    Keys touched again before their timer fires are lazily re-armed when the
+    timer pops, so a busy chat costs one dict write per update.
+    """
+
+    def __init__(self, timeout: int, notify: bool = True, tick_seconds: float = 1.0):
+        self.timeout = timeout
+        self.notify = notify
+        self.tick_seconds = tick_seconds
+        self._wheel = TimerWheel()
+        self._last_active: Dict[StorageKey, float] = {}
+        self._started_at = time.monotonic()
+
+    def touch(self, key: StorageKey) -> None:
+        """Record activity for a chat/user key. Called on every update."""
+        self._last_active[key] = time.monotonic()
+        if key not in self._wheel:
+            self._wheel.schedule(key, self._ticks(self.timeout))
+
+    def forget(self, key: StorageKey) -> None:
+        """Stop tracking a key, e.g. after its session was cleared explicitly."""
+        self._last_active.pop(key, None)
+        self._wheel.cancel(key)
+
+    def __len__(self) -> int:
+        return len(self._last_active)
+
+    async def run(self, bot: Optional[Bot], storage: BaseStorage) -> None:
+        """Background loop: advance the wheel and expire idle sessions."""
+        logger.info("Session expiry tracker started (timeout=%ss)", self.timeout)
+        while True:
+            await asyncio.sleep(self.tick_seconds)
+            try:
+                expired = self._collect_expired()
+                if expired:
+                    await asyncio.gather(
+                        *(self._expire(bot, storage, key) for key in expired),
+                        return_exceptions=True,
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Session expiry tick failed: %s", e)
+
+    def _ticks(self, seconds: float) -> int:
+        return max(1, math.ceil(seconds / self.tick_seconds))
+
+    def _collect_expired(self) -> list:
+        now = time.monotonic()
+        target_tick = int((now - self._started_at) / self.tick_seconds)
+        expired = []
+        for key, _ in self._wheel.advance(target_tick - self._wheel.now):
+            last_active = self._last_active.get(key)
+            if last_active is None:
+                continue
+            remaining = last_active + self.timeout - now
+            if remaining > 0:
+                # Touched since the timer was armed; re-arm for the remainder.
+                self._wheel.schedule(key, self._ticks(remaining))
+                continue
+            del self._last_active[key]
+            expired.append(key)
+        return expired
+
+    async def _expire(self, bot: Optional[Bot], storage: BaseStorage, key: StorageKey) -> None:
+        if await storage.get_state(key) is None:
+            # Nothing in progress for this chat, just stop tracking it.
+            return
+        await storage.set_state(key, None)
+        await storage.set_data(key, {})
+        logger.info("Session expired for user %s in chat %s", key.user_id, key.chat_id)
+        if self.notify and bot is not None:
+            try:
+                await bot.send_message(key.chat_id, SESSION_EXPIRED_TEXT)
+            except Exception as e:
+                logger.warning("Could not notify chat %s about session expiry: %s", key.chat_id, e)
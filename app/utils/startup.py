@@ -0,0 +1,67 @@
+"""
+Cold-start timing.
+
+`startup.mark(phase)` records the time since the previous mark, starting
+from when this module was first imported (main.py imports it before anything
+else). Once the bot sends its first getUpdates, `report()` logs one line with
+the breakdown, and the phases are exported as the `startup_phase_seconds`
+gauge. Work moved off the critical path runs through `background()` and is
+timed and reported separately.
+
+Only imports the metrics module, which has no app dependencies, so it can
+be imported first.
+"""
+import asyncio
+import logging
+import time
+from typing import Coroutine, List, Optional, Tuple
+from app.utils.metrics import startup_phase_seconds
+
+_logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self._last = self.started_at
+        self.phases: List[Tuple[str, float]] = []
+        self.reported = False
+
+    def mark(self, phase: str) -> float:
+        """Close `phase`, which ran since the previous mark. Returns its duration in seconds."""
+        now = time.perf_counter()
+        duration = now - self._last
+        self._last = now
+        self.phases.append((phase, duration))
+        return duration
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def report(self) -> None:
+        if self.reported:
+            return
+        self.reported = True
+        for phase, duration in self.phases:
+            startup_phase_seconds.labels(phase).set(duration)
+        breakdown = ", ".join(f"{phase} {duration * 1000:.0f}ms" for phase, duration in self.phases)
+        _logger.info("Serving after %.2fs (%s)", self.elapsed, breakdown)
+
+    async def background(self, phase: str, job: Coroutine) -> Optional[float]:
+        """Run startup work off the critical path, logging how long it took or why it failed."""
+        start = time.perf_counter()
+        try:
+            await job
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _logger.error("Background startup step %s failed: %s", phase, e)
+            return None
+        duration = time.perf_counter() - start
+        startup_phase_seconds.labels(phase).set(duration)
+        _logger.info("Background startup step %s finished in %.0fms", phase, duration * 1000)
+        return duration
+
+
+startup = StartupTimer()
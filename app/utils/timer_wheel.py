@@ -0,0 +1,107 @@
+from typing import Any, Dict, Hashable, List, Tuple
+
+
+class TimerWheel:
+    """
+    Hierarchical timer wheel keyed by arbitrary hashable ids.
+
+    Each level has `slots` buckets; level 0 buckets are one tick wide and every
+    higher level is `slots` times coarser. Scheduling and cancelling are O(1),
+    and advancing by one tick only touches the current level 0 bucket (plus an
+    occasional cascade from a coarser level), so the cost per tick does not
+    depend on how many timers are pending.
+
+    Args:
+        slots (int): Buckets per level. Must be a power of two.
+        levels (int): Number of levels. Delays beyond slots ** levels ticks
+            are clamped to the farthest bucket and re-cascaded when reached.
+    """
+
+    def __init__(self, slots: int = 64, levels: int = 4):
+        if slots & (slots - 1):
+            raise ValueError("slots must be a power of two")
+        self._slots = slots
+        self._levels = levels
+        self._wheels: List[List[Dict[Hashable, Tuple[int, Any]]]] = [
+            [{} for _ in range(slots)] for _ in range(levels)
+        ]
+        # key -> (level, slot) so cancel/reschedule is a dict delete, not a scan
+        self._index: Dict[Hashable, Tuple[int, int]] = {}
+        self._now = 0
+
+    @property
+    def now(self) -> int:
+        """Current tick of the wheel."""
+        return self._now
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._index
+
+    def schedule(self, key: Hashable, delay: int, value: Any = None) -> None:
+        """Schedule `key` to expire `delay` ticks from now, replacing any earlier timer."""
+        self.cancel(key)
+        self._insert(key, self._now + max(1, int(delay)), value)
+
+    def cancel(self, key: Hashable) -> bool:
+        """Remove a pending timer. Returns True if one was removed."""
+        position = self._index.pop(key, None)
+        if position is None:
+            return False
+        level, slot = position
+        del self._wheels[level][slot][key]
+        return True
+
+    def advance(self, ticks: int = 1) -> List[Tuple[Hashable, Any]]:
+        """
+        Move the wheel forward and collect everything that expired.
+
+        Returns:
+            list: (key, value) pairs whose deadline has been reached.
+        """
+        expired: List[Tuple[Hashable, Any]] = []
+        for _ in range(max(0, int(ticks))):
+            self._now += 1
+            self._cascade()
+            bucket = self._wheels[0][self._now & (self._slots - 1)]
+            if not bucket:
+                continue
+            for key, (_deadline, value) in bucket.items():
+                del self._index[key]
+                expired.append((key, value))
+            bucket.clear()
+        return expired
+
+    def _insert(self, key: Hashable, deadline: int, value: Any) -> None:
+        delta = deadline - self._now
+        level = 0
+        span = self._slots
+        while delta >= span and level < self._levels - 1:
+            level += 1
+            span *= self._slots
+        slot_at = deadline
+        if delta >= span:
+            # Beyond the wheel's horizon: park in the farthest bucket, it is
+            # re-inserted (and re-clamped) every time that bucket cascades.
+            slot_at = self._now + span - 1
+        width = span // self._slots
+        slot = (slot_at // width) & (self._slots - 1)
+        self._wheels[level][slot][key] = (deadline, value)
+        self._index[key] = (level, slot)
+
+    def _cascade(self) -> None:
+        width = 1
+        for level in range(1, self._levels):
+            width *= self._slots
+            if self._now % width:
+                return
+            bucket = self._wheels[level][(self._now // width) & (self._slots - 1)]
+            if not bucket:
+                continue
+            entries = list(bucket.items())
+            bucket.clear()
+            for key, (deadline, value) in entries:
+                del self._index[key]
+                self._insert(key, max(deadline, self._now), value)
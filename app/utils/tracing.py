@@ -0,0 +1,272 @@
+"""
+Per-update tracing exported as OTLP-compatible JSON.
+
+The dispatcher opens a root span for every update; middlewares, handlers,
+`MongoHelper` calls and Bot API requests running inside it add child spans.
+The current span lives in a context variable, so tasks created while an
+update is being handled (trade confirmations on `trade_executor`) carry the
+trace with them, and a trace is only finished once its last span has ended.
+
+Sampling is decided at the end, when the whole trace is known: a trace is
+kept with probability `TRACE.SAMPLE_RATE`, and always when it was slower than
+`TRACE.SLOW_THRESHOLD_MS` or one of its spans failed. Kept traces are queued
+and written by `tracer.run()` in batches, either as one OTLP/JSON
+`ExportTraceServiceRequest` per line to `TRACE.EXPORT_PATH`, or POSTed to an
+OTLP/HTTP collector at `TRACE.OTLP_ENDPOINT`.
+
+Outside an update `span()` returns a shared no-op scope, so instrumented code
+costs one context variable read when nothing is being traced.
+
+    with tracer.span("mongo find_one", collection="users"):
+        ...
+"""
+import asyncio
+import json
+import random
+import time
+from collections import deque
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+import aiohttp
+from app.utils.config import settings
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+STATUS_ERROR = 2
+MAX_QUEUED_TRACES = 1000
+MAX_SPANS_PER_TRACE = 500
+
+
+class _Trace:
+    __slots__ = ("spans", "open", "failed", "dropped")
+
+    def __init__(self):
+        self.spans: List["Span"] = []
+        self.open = 0
+        self.failed = False
+        self.dropped = 0
+
+
+class Span:
+    __slots__ = ("trace", "trace_id", "span_id", "parent_id", "name", "kind",
+                 "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: _Trace, trace_id: str, parent_id: str, name: str, kind: int,
+                 attributes: Dict[str, Any]):
+        self.trace = trace
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.end_ns = 0
+        self.start_ns = time.time_ns()
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def fail(self, error: BaseException) -> None:
+        self.error = f"{type(error).__name__}: {error}"
+        self.trace.failed = True
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class _NoopScope:
+    """Returned when there is no trace to attach to."""
+
+    __slots__ = ()
+    span = None
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopScope()
+
+
+class _SpanScope:
+    """Makes `span` current for the enclosed block and ends it on exit."""
+
+    __slots__ = ("tracer", "span", "token")
+
+    def __init__(self, tracer: "Tracer", span: Span):
+        self.tracer = tracer
+        self.span = span
+        self.token = None
+
+    def __enter__(self) -> Span:
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self.token)
+        if exc is not None and not isinstance(exc, asyncio.CancelledError):
+            self.span.fail(exc)
+        self.tracer.end(self.span)
+        return False
+
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        encoded = {"boolValue": value}
+    elif isinstance(value, int):
+        encoded = {"intValue": str(value)}  # int64 travels as a string in OTLP/JSON
+    elif isinstance(value, float):
+        encoded = {"doubleValue": value}
+    else:
+        encoded = {"stringValue": str(value)}
+    return {"key": key, "value": encoded}
+
+
+def _otlp_span(span: Span) -> Dict[str, Any]:
+    encoded = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [_attribute(k, v) for k, v in span.attributes.items() if v is not None],
+    }
+    if span.parent_id:
+        encoded["parentSpanId"] = span.parent_id
+    if span.error:
+        encoded["status"] = {"code": STATUS_ERROR, "message": span.error}
+    return encoded
+
+
+class Tracer:
+    def __init__(self, service_name: str = "telegram-trading-bot"):
+        self.service_name = service_name
+        self.enabled = settings.TRACE.ENABLED
+        self.sample_rate = settings.TRACE.SAMPLE_RATE
+        self.slow_threshold_ns = settings.TRACE.SLOW_THRESHOLD_MS * 1_000_000
+        self._queue: Deque[List[Span]] = deque(maxlen=MAX_QUEUED_TRACES)
+
+    @staticmethod
+    def current() -> Optional[Span]:
+        return _current.get()
+
+    def trace(self, name: str, kind: int = KIND_SERVER, **attributes) -> Any:
+        """Open a new trace whose root span is current for the enclosed block."""
+        if not self.enabled:
+            return _NOOP
+        span = Span(_Trace(), f"{random.getrandbits(128):032x}", "", name, kind, attributes)
+        span.trace.open = 1
+        span.trace.spans.append(span)
+        return _SpanScope(self, span)
+
+    def start_span(self, name: str, kind: int = KIND_INTERNAL, **attributes) -> Optional[Span]:
+        """
+        Start a child of the current span without making it current; end it
+        with `end()`. Returns None outside a trace.
+        """
+        parent = _current.get()
+        if parent is None:
+            return None
+        trace = parent.trace
+        span = Span(trace, parent.trace_id, parent.span_id, name, kind, attributes)
+        trace.open += 1
+        if len(trace.spans) < MAX_SPANS_PER_TRACE:
+            trace.spans.append(span)
+        else:
+            trace.dropped += 1
+        return span
+
+    def span(self, name: str, kind: int = KIND_INTERNAL, **attributes) -> Any:
+        """Child span of the current one, current for the enclosed block."""
+        if _current.get() is None:
+            return _NOOP
+        return _SpanScope(self, self.start_span(name, kind, **attributes))
+
+    def activate(self, span: Optional[Span]) -> Any:
+        """Make a span from `start_span` current for the enclosed block, ending it on exit."""
+        return _NOOP if span is None else _SpanScope(self, span)
+
+    def end(self, span: Optional[Span]) -> None:
+        if span is None or span.end_ns:
+            return
+        span.end_ns = time.time_ns()
+        trace = span.trace
+        trace.open -= 1
+        if trace.open == 0:
+            self._finish(trace)
+
+    def _finish(self, trace: _Trace) -> None:
+        root = trace.spans[0]
+        duration = max(s.end_ns for s in trace.spans) - root.start_ns
+        if trace.failed or duration >= self.slow_threshold_ns or random.random() < self.sample_rate:
+            if trace.dropped:
+                root.set("trace.dropped_spans", trace.dropped)
+            self._queue.append(trace.spans)
+
+    def _export_request(self, traces: List[List[Span]]) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_attribute("service.name", self.service_name)]},
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [_otlp_span(span) for spans in traces for span in spans],
+                }],
+            }]
+        }
+
+    def _append_line(self, line: str) -> None:
+        path = Path(settings.TRACE.EXPORT_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    async def flush(self, http: Optional[aiohttp.ClientSession] = None) -> int:
+        """Export every queued trace; returns how many were written."""
+        if not self._queue:
+            return 0
+        traces = list(self._queue)
+        self._queue.clear()
+        body = json.dumps(self._export_request(traces), separators=(",", ":"))
+        endpoint = settings.TRACE.OTLP_ENDPOINT
+        if endpoint:
+            async with http.post(endpoint, data=body, headers={"Content-Type": "application/json"}) as response:
+                if response.status >= 400:
+                    logger.warning("Trace collector rejected %s traces: HTTP %s", len(traces), response.status)
+        else:
+            await asyncio.to_thread(self._append_line, body)
+        return len(traces)
+
+    async def run(self) -> None:
+        """Background loop exporting sampled traces every `TRACE.EXPORT_INTERVAL` seconds."""
+        if not self.enabled:
+            return
+        target = settings.TRACE.OTLP_ENDPOINT or settings.TRACE.EXPORT_PATH
+        logger.info("Tracing started (sample rate %s, exporting to %s)", self.sample_rate, target)
+        timeout = aiohttp.ClientTimeout(total=10)
+        async with aiohttp.ClientSession(timeout=timeout) as http:
+            try:
+                while True:
+                    await asyncio.sleep(settings.TRACE.EXPORT_INTERVAL)
+                    try:
+                        await self.flush(http)
+                    except Exception as e:
+                        logger.error("Trace export failed: %s", e)
+            finally:
+                try:
+                    await self.flush(http)
+                except Exception as e:
+                    logger.error("Final trace export failed: %s", e)
+
+
+tracer = Tracer()
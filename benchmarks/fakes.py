@@ -0,0 +1,80 @@
+"""
+In-process stand-ins used by the load-test harness.
+
+- `RecordingSession`: an aiogram session that never touches the network and
+  records every Bot API call it would have made.
+- `FlowCountingDatabase`: the in-memory Mongo backend
+  (app/db/mongo/memory.py), counting operations per flow as well.
+"""
+import asyncio
+import contextvars
+import time
+from collections import Counter, defaultdict
+from typing import Any, AsyncGenerator, Dict, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import Chat, InputFile, Message
+
+from app.db.mongo.memory import InMemoryDatabase
+
+# Which flow the current task is driving; used to attribute Mongo ops and API calls
+current_flow: contextvars.ContextVar[str] = contextvars.ContextVar("current_flow", default="other")
+
+
+class RecordingSession(BaseSession):
+    """Bot session that answers every method locally and records it."""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.calls_by_flow: Dict[str, Counter] = defaultdict(Counter)
+        self._message_id = 0
+        self.uploaded_bytes = 0
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        name = type(method).__name__
+        self.calls[name] += 1
+        self.calls_by_flow[current_flow.get()][name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for value in vars(method).values():
+            if isinstance(value, InputFile):
+                # Pull the upload through like the real session would
+                async for chunk in value.read(bot):
+                    self.uploaded_bytes += len(chunk)
+
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is not None and name.startswith(("Send", "Edit", "Copy", "Forward")):
+            message_id = getattr(method, "message_id", None)
+            if message_id is None:
+                self._message_id += 1
+                message_id = self._message_id
+            return Message(
+                message_id=message_id,
+                date=int(time.time()),
+                chat=Chat(id=chat_id, type="private"),
+                text=getattr(method, "text", None),
+            ).as_(bot)
+        return True
+
+    async def stream_content(self, url: str, headers=None, timeout: int = 30, chunk_size: int = 65536,
+                             raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+class FlowCountingDatabase(InMemoryDatabase):
+    """In-memory backend that also attributes each operation to the flow driving it."""
+
+    def __init__(self):
+        super().__init__()
+        self.ops_by_flow: Dict[str, Counter] = defaultdict(Counter)
+
+    def record(self, op: str) -> None:
+        super().record(op)
+        self.ops_by_flow[current_flow.get()][op] += 1
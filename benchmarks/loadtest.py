@@ -0,0 +1,231 @@
+"""
+Synthetic load test that drives the real dispatcher in-process.
+
+Every simulated user is an approved account with a funded wallet. Users run
+randomly chosen flows (start, buy, sell, open/close position, closed
+positions, transactions, wallet) concurrently; each step is fed straight into
+`Dispatcher.feed_update` with a recording Bot session and an in-memory Mongo
+stand-in, so the numbers reflect the bot's own code path only.
+
+Usage:
+    python -m benchmarks.loadtest --users 200 --rounds 5
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import time
+from collections import defaultdict
+from itertools import count
+from typing import Dict, List
+
+# Collection names normally come from .env; make sure they resolve without it
+for _name, _value in {
+    "USERS": "users",
+    "WALLETS": "wallets",
+    "TRANSACTIONS": "transactions",
+    "INVENTORY": "inventory",
+    "ORDER_TRANSACTIONS": "order_transactions",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+import app.db.mongo.mongodb as mongodb
+import app.services.price.price_service as price_service
+from app.telegram.dispatcher import setup_dispatcher
+from app.telegram.middlewares import RequestTracingMiddleware
+from app.utils.background import trade_executor
+from app.utils.config import settings
+from benchmarks.fakes import FlowCountingDatabase, RecordingSession, current_flow
+
+BOT_TOKEN = "123456:LOADTEST"
+PRICE = 2000.0
+
+# flow name -> list of steps; a step is ("text", value) or ("callback", data)
+FLOWS: Dict[str, List[tuple]] = {
+    "start": [("text", "hi")],
+    "buy": [("text", "buy gold"), ("text", "1.5"), ("callback", "buy:current_price"), ("callback", "confirm:BUY_EXECUTE")],
+    "sell": [("text", "sell gold"), ("text", "0.5"), ("callback", "sell:current_price"), ("callback", "confirm:SELL_EXECUTE")],
+    "close_position": [("text", "open positions"), ("text", "1"), ("text", "1")],
+    "closed_positions": [("text", "closed positions")],
+    "transactions": [("text", "transactions"), ("callback", "tx_time_today")],
+    "wallet": [("text", "wallet")],
+}
+
+FLOW_WEIGHTS = {
+    "start": 1,
+    "buy": 3,
+    "sell": 2,
+    "close_position": 2,
+    "closed_positions": 1,
+    "transactions": 1,
+    "wallet": 2,
+}
+
+
+class SimulatedUser:
+    _update_ids = count(1)
+
+    def __init__(self, telegram_id: int):
+        self.user = User(id=telegram_id, is_bot=False, first_name=f"load{telegram_id}")
+        self.chat = Chat(id=telegram_id, type="private")
+        self.last_bot_message_id = 1
+        self.message_ids = count(1)
+
+    def message(self, text: str) -> Update:
+        return Update(
+            update_id=next(self._update_ids),
+            message=Message(
+                message_id=next(self.message_ids),
+                date=int(time.time()),
+                chat=self.chat,
+                from_user=self.user,
+                text=text,
+            ),
+        )
+
+    def callback(self, data: str) -> Update:
+        return Update(
+            update_id=next(self._update_ids),
+            callback_query=CallbackQuery(
+                id=str(next(self._update_ids)),
+                from_user=self.user,
+                chat_instance=str(self.chat.id),
+                data=data,
+                message=Message(
+                    message_id=self.last_bot_message_id,
+                    date=int(time.time()),
+                    chat=self.chat,
+                    text="",
+                ),
+            ),
+        )
+
+
+async def seed(db: FlowCountingDatabase, users: int, first_id: int) -> List[SimulatedUser]:
+    simulated = []
+    now = int(time.time())
+    for i in range(users):
+        telegram_id = first_id + i
+        await db[settings.DB_TABLE.USERS].insert_one({
+            "uuid": f"user-{telegram_id}",
+            "telegram_id": telegram_id,
+            "first_name": f"load{telegram_id}",
+            "phone_number": f"+1555{telegram_id:07d}",
+            "status": "APPROVED",
+            "created_at": now,
+        })
+        await db[settings.DB_TABLE.WALLETS].insert_one({
+            "uuid": f"wallet-{telegram_id}",
+            "user_id": f"user-{telegram_id}",
+            "balance": 1_000_000.0,
+            "status": "ACTIVE",
+            "currency": "USD",
+            "created_at": now,
+            "updated_at": now,
+        })
+        simulated.append(SimulatedUser(telegram_id))
+    db.ops.clear()
+    db.ops_by_flow.clear()
+    return simulated
+
+
+async def run_user(dp: Dispatcher, bot: Bot, user: SimulatedUser, rounds: int, think_time: float,
+                   latencies: Dict[str, List[float]], updates: Dict[str, int]) -> None:
+    names = list(FLOW_WEIGHTS)
+    weights = [FLOW_WEIGHTS[n] for n in names]
+    for _ in range(rounds):
+        flow = random.choices(names, weights)[0]
+        token = current_flow.set(flow)
+        try:
+            for kind, value in FLOWS[flow]:
+                update = user.message(value) if kind == "text" else user.callback(value)
+                started = time.perf_counter()
+                await dp.feed_update(bot, update)
+                latencies[flow].append(time.perf_counter() - started)
+                updates[flow] += 1
+                if think_time:
+                    await asyncio.sleep(random.uniform(0, think_time))
+        finally:
+            current_flow.reset(token)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def report(latencies, updates, db: FlowCountingDatabase, session: RecordingSession, wall: float) -> str:
+    lines = [
+        f"{'flow':<18}{'updates':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'mongo/upd':>11}{'api/upd':>9}",
+    ]
+    for flow in sorted(latencies):
+        values = latencies[flow]
+        n = updates[flow]
+        mongo_ops = sum(db.ops_by_flow[flow].values())
+        api_calls = sum(session.calls_by_flow[flow].values())
+        lines.append(
+            f"{flow:<18}{n:>9}"
+            f"{percentile(values, 50) * 1000:>10.2f}{percentile(values, 95) * 1000:>10.2f}"
+            f"{percentile(values, 99) * 1000:>10.2f}{max(values) * 1000:>10.2f}"
+            f"{mongo_ops / n:>11.2f}{api_calls / n:>9.2f}"
+        )
+    total = sum(updates.values())
+    all_values = [v for values in latencies.values() for v in values]
+    lines.append("")
+    lines.append(
+        f"total: {total} updates in {wall:.2f}s ({total / wall:.0f} upd/s), "
+        f"p50 {statistics.median(all_values) * 1000:.2f} ms, p99 {percentile(all_values, 99) * 1000:.2f} ms"
+    )
+    lines.append(f"mongo ops: {dict(db.ops)}")
+    lines.append(f"bot api calls: {dict(session.calls)}")
+    return "\n".join(lines)
+
+
+async def main(args) -> None:
+    random.seed(args.seed)
+    db = FlowCountingDatabase()
+    mongodb.use_database(db)
+    price_service._latest_gold_price = PRICE
+
+    session = RecordingSession(latency=args.api_latency_ms / 1000)
+    bot = Bot(token=BOT_TOKEN, session=session)
+    bot.session.middleware(RequestTracingMiddleware())
+    dp = setup_dispatcher()
+
+    users = await seed(db, args.users, first_id=10_000)
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    updates: Dict[str, int] = defaultdict(int)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        run_user(dp, bot, user, args.rounds, args.think_time, latencies, updates) for user in users
+    ))
+    # Trades confirmed near the end may still be running in the background
+    await trade_executor.drain(timeout=60)
+    wall = time.perf_counter() - started
+    print(report(latencies, updates, db, session, wall))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="In-process Telegram load test")
+    parser.add_argument("--users", type=int, default=100, help="concurrent simulated users")
+    parser.add_argument("--rounds", type=int, default=5, help="flows each user runs")
+    parser.add_argument("--think-time", type=float, default=0.0, help="max random pause between steps (s)")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="simulated Bot API latency")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--log-level", default="warning")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    cli_args = parse_args()
+    logging.disable(getattr(logging, cli_args.log_level.upper()) - 1)
+    asyncio.run(main(cli_args))
@@ -0,0 +1,87 @@
+"""
+Micro-benchmark of the slotted records (app/models/records.py) against the
+Pydantic models they mirror.
+
+For each model it times building a document from keyword arguments and
+dumping it to a dict, the insert path.
+
+Usage:
+    python -m benchmarks.models --number 50000
+"""
+import argparse
+import timeit
+from typing import Any, Dict, List, Tuple
+
+from app.models.records import (
+    PositionLotRecord,
+    TransactionRecord,
+    UserLinkRecord,
+    WalletLedgerEntryRecord,
+    WalletRecord,
+)
+
+UUID = "0b6a3f4e-8a53-4a5e-9a55-5f1f0f0a2c11"
+
+SAMPLES: List[Tuple[type, Dict[str, Any]]] = [
+    (TransactionRecord, {
+        "uuid": UUID, "user_id": UUID,
+        "buy_at": 1760000000, "buy_grams": 1.5, "buy_price": 2000.0, "buy_price_type": "MARKET",
+        "total_buy_amount": 3000.0, "sell_at": 0, "sell_grams": 0, "sell_price": 0, "sell_price_type": "",
+        "total_sell_amount": 0, "status": "OPEN", "updated_at": 1760000000, "pnl": 0,
+    }),
+    (UserLinkRecord, {
+        "uuid": UUID, "telegram_id": 123456789, "username": "trader", "first_name": "Load",
+        "last_name": None, "created_at": 1760000000, "link_code": "a1b2c3d4", "status": "APPROVED",
+        "phone_number": None,
+    }),
+    (WalletRecord, {
+        "uuid": UUID, "user_id": UUID, "currency": "USD", "created_at": 1760000000, "updated_at": 1760000000,
+    }),
+    (WalletLedgerEntryRecord, {
+        "uuid": UUID, "wallet_id": UUID, "user_id": UUID, "seq": 42, "kind": "CLOSE",
+        "amount": 3015.0, "balance_after": 10015.0, "reference": UUID, "created_at": 1760000000,
+    }),
+    (PositionLotRecord, {
+        "uuid": UUID, "side": "BUY", "grams": 1.5, "price": 2000.0, "opened_at": 1760000000,
+    }),
+]
+
+
+def per_call_us(func, number: int, repeat: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+def bench(record_cls: type, kwargs: Dict[str, Any], number: int, repeat: int) -> Dict[str, float]:
+    model = record_cls.MODEL
+    doc = model(**kwargs).model_dump()
+    assert record_cls(**kwargs).to_doc() == {k: getattr(v, "value", v) for k, v in doc.items()}, \
+        f"{record_cls.__name__} does not produce the same document as {model.__name__}"
+    return {
+        "pydantic_encode": per_call_us(lambda: model(**kwargs).model_dump(), number, repeat),
+        "record_encode": per_call_us(lambda: record_cls(**kwargs).to_doc(), number, repeat),
+    }
+
+
+def main(args) -> None:
+    header = f"{'model':<20} {'pydantic':>11} {'record':>11} {'speedup':>8}"
+    print(f"µs per document, best of {args.repeat} x {args.number}")
+    print(header)
+    print("-" * len(header))
+    for record_cls, kwargs in SAMPLES:
+        r = bench(record_cls, kwargs, args.number, args.repeat)
+        print(
+            f"{record_cls.MODEL.__name__:<20} "
+            f"{r['pydantic_encode']:>11.2f} {r['record_encode']:>11.2f} "
+            f"{r['pydantic_encode'] / r['record_encode']:>7.1f}x"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Slotted records vs Pydantic models")
+    parser.add_argument("--number", type=int, default=20000, help="calls per timing run")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs; the best is reported")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_args())
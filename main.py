@@ -1,23 +1,42 @@
 # --- app/main.py ---
 
+# Imported first so the startup report covers every import below
+from app.utils.startup import startup
+
+from app.utils.config import settings
+startup.mark("settings")
+
 import asyncio
-from fastapi import FastAPI, HTTPException
+import hmac
+import time
+from fastapi import Depends, FastAPI, Header, HTTPException, Query
+from fastapi.responses import Response
 from contextlib import asynccontextmanager
 
 from app.utils.logging import get_logger, setup_logging
-from app.utils.config import settings
+from app.utils.metrics import CONTENT_TYPE, registry
+from app.utils.profiler import ProfilerBusy, profiler
+from app.utils.loop_monitor import loop_monitor
 from app.telegram.bot import start_bot_polling
-from app.services.price.price_service import _websocket_price_updater
+from app.telegram.sharding import start_sharded_polling
+from app.services.price.price_service import _websocket_price_updater, add_price_listener, remove_price_listener
+from app.services.price.tick_store import tick_store
+from app.services.positions.mark_to_market import mark_to_market
+from app.services.positions.exposure import exposure
 from app.db.mongo.mongodb import (
     connect_to_mongodb,
     close_mongodb_connection,
+    ensure_unique_indexes,
     initialize_collections,
     get_database,
 )
 
+startup.mark("imports")
+
 # Setup logging
 setup_logging()
 logger = get_logger(__name__)
+startup.mark("logging")
 
 # Global state for health endpoint
 app_state = {
@@ -26,20 +45,59 @@ app_state = {
     "bot_running": False,
 }
 
+RISK_REFRESH_SECONDS = 30
+
+async def refresh_risk_views() -> None:
+    """Sharded mode: periodically rebuild mark-to-market and exposure from the open positions in Mongo."""
+    while True:
+        await asyncio.sleep(RISK_REFRESH_SECONDS)
+        try:
+            await mark_to_market.load()
+            await exposure.load()
+        except Exception as e:
+            logger.error("Failed to refresh mark-to-market and exposure: %s", e)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting FastAPI bot app...")
+    startup.mark("server_start")
+
+    # The bot, the API and the price feed share this loop; watch for anything blocking it
+    lag_monitor = asyncio.create_task(loop_monitor.run()) if settings.LOOP_MONITOR.ENABLED else None
 
     # Connect to MongoDB
     try:
         await connect_to_mongodb()
-        await initialize_collections()
         app_state["mongo_connected"] = True
         logger.info("MongoDB connected")
     except Exception as e:
         app_state["mongo_connected"] = False
         logger.critical(f"MongoDB connection failed: {str(e)}")
         raise
+    startup.mark("mongo_connect")
+
+    # Upserts and ledger appends depend on the unique indices, so they must exist before updates are served
+    await ensure_unique_indexes()
+    startup.mark("unique_indexes")
+
+    # The other indices only speed up reads; creating them is idempotent, keep it off the critical path
+    index_init = asyncio.create_task(startup.background("index_init", initialize_collections()))
+
+    # Load open positions for platform-wide mark-to-market and exposure, revalued on every tick
+    try:
+        await mark_to_market.load()
+        await exposure.load()
+    except Exception as e:
+        logger.error("Failed to load open positions for mark-to-market: %s", e)
+    add_price_listener(mark_to_market.on_price)
+    add_price_listener(exposure.on_price)
+    startup.mark("positions_load")
+
+    # Record every tick for charts and backtests; the listener only buffers, the writer flushes
+    tick_writer = None
+    if settings.TICKS.ENABLED:
+        add_price_listener(tick_store.on_price)
+        tick_writer = asyncio.create_task(tick_store.run())
 
     # Start price updater background task
     price_updater = asyncio.create_task(_websocket_price_updater())
@@ -48,20 +106,40 @@ async def lifespan(app: FastAPI):
 
     # Start telegram bot polling if enabled
     telegram_bot = None
+    risk_refresh = None
     if settings.TELEGRAM.BOT_MODE == "polling":
         telegram_bot = asyncio.create_task(start_bot_polling())
         app_state["bot_running"] = True
         logger.info("Telegram bot polling started")
+    elif settings.TELEGRAM.BOT_MODE == "sharded":
+        telegram_bot = asyncio.create_task(start_sharded_polling())
+        # Trades now execute in the worker processes; rebuild the risk views from Mongo instead
+        risk_refresh = asyncio.create_task(refresh_risk_views())
+        app_state["bot_running"] = True
+        logger.info("Telegram bot polling started with %s worker processes", settings.TELEGRAM.WORKERS)
 
     # Yield control to run the application
     yield
 
     # Shutdown: Cancel background tasks and close DB
     logger.info("Shutting down app...")
+    index_init.cancel()
+    if lag_monitor:
+        lag_monitor.cancel()
+    if risk_refresh:
+        risk_refresh.cancel()
     if telegram_bot:
         telegram_bot.cancel()
+        # Let the bot drain background trades (and, when sharded, stop its workers)
+        await asyncio.gather(telegram_bot, return_exceptions=True)
         app_state["bot_running"] = False
     price_updater.cancel()
+    remove_price_listener(mark_to_market.on_price)
+    remove_price_listener(exposure.on_price)
+    if tick_writer:
+        remove_price_listener(tick_store.on_price)
+        tick_writer.cancel()
+        await asyncio.gather(tick_writer, return_exceptions=True)
     app_state["price_updater_running"] = False
     await close_mongodb_connection()
     app_state["mongo_connected"] = False
@@ -107,6 +185,41 @@ async def health_check():
     logger.info(f'Telegram bot checkup report : {report}')
     return report
 
+def require_admin(x_admin_token: str = Header("")):
+    token = settings.ADMIN.API_TOKEN
+    if not token or not hmac.compare_digest(x_admin_token.encode(), token.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+# House exposure against customers, maintained in memory; lists customer ids, so admin only
+@app.get("/risk/exposure", dependencies=[Depends(require_admin)])
+async def risk_exposure(top: int = Query(10, ge=0, le=100)):
+    return exposure.snapshot(top_n=top)
+
+# Prometheus scrape endpoint
+@app.get("/metrics")
+async def metrics():
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
+# Sample every thread's stack and download them as collapsed stacks for a flamegraph
+@app.get("/admin/profile", dependencies=[Depends(require_admin)])
+async def admin_profile(
+    seconds: float = Query(10, gt=0),
+    hz: int = Query(100, ge=1, le=1000),
+):
+    if seconds > settings.ADMIN.PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be at most {settings.ADMIN.PROFILE_MAX_SECONDS}")
+    logger.info("Profiling for %ss at %s Hz", seconds, hz)
+    try:
+        collapsed = await asyncio.to_thread(profiler.sample, seconds, hz)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    filename = f"profile-{time.strftime('%Y%m%d-%H%M%S')}.collapsed"
+    return Response(
+        content=collapsed,
+        media_type="text/plain; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
 @app.get("/")
 async def root():
     return {"status": "ok"}